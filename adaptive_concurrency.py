@@ -0,0 +1,109 @@
+"""
+自适应并发模块 - 加性增、乘性减（AIMD）控制同时进行的 GitHub 请求数：
+延迟稳定时逐步增加并发，触发限流时减半并按 Retry-After 暂停所有请求
+"""
+import threading
+import time
+from contextlib import contextmanager
+from config import ADAPTIVE_INITIAL_CONCURRENCY, ADAPTIVE_DECREASE_FACTOR, ADAPTIVE_LATENCY_TOLERANCE
+
+
+class AIMDController:
+    """AIMD 并发控制器"""
+    
+    # 延迟的快/慢指数加权移动平均平滑系数，快均值明显高于慢均值说明服务端开始拥塞
+    FAST_ALPHA = 0.3
+    SLOW_ALPHA = 0.05
+    
+    def __init__(self, max_limit: int, initial_limit: int = ADAPTIVE_INITIAL_CONCURRENCY,
+                 min_limit: int = 1,
+                 decrease_factor: float = ADAPTIVE_DECREASE_FACTOR,
+                 latency_tolerance: float = ADAPTIVE_LATENCY_TOLERANCE):
+        """
+        初始化并发控制器
+        
+        Args:
+            max_limit: 并发上限
+            initial_limit: 初始并发数
+            min_limit: 并发下限
+            decrease_factor: 触发限流时并发数乘以的系数
+            latency_tolerance: 近期延迟超过长期延迟的倍数后不再增加并发
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max(self.min_limit, min(initial_limit, self.max_limit)))
+        self.throttle_count = 0
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._fast_latency = None
+        self._slow_latency = None
+        self._cond = threading.Condition()
+    
+    @property
+    def current_limit(self) -> int:
+        """当前允许的并发请求数"""
+        return int(self.limit)
+    
+    def acquire(self):
+        """等待一个请求名额（限流暂停期间所有请求都会等待）"""
+        with self._cond:
+            while True:
+                wait_seconds = self._cooldown_until - time.time()
+                if wait_seconds <= 0 and self._in_flight < int(self.limit):
+                    break
+                self._cond.wait(timeout=wait_seconds if wait_seconds > 0 else None)
+            self._in_flight += 1
+    
+    def release(self):
+        """归还请求名额"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+    
+    @contextmanager
+    def slot(self):
+        """占用一个请求名额执行代码块"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def on_success(self, latency: float):
+        """
+        记录一次成功的请求，延迟稳定时加性增加并发（每个并发窗口 +1）
+        
+        Args:
+            latency: 请求耗时（秒）
+        """
+        with self._cond:
+            if self._fast_latency is None:
+                self._fast_latency = self._slow_latency = latency
+            else:
+                self._fast_latency += self.FAST_ALPHA * (latency - self._fast_latency)
+                self._slow_latency += self.SLOW_ALPHA * (latency - self._slow_latency)
+            
+            if self._fast_latency <= self._slow_latency * self.latency_tolerance:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+    
+    def on_throttle(self, retry_after: float) -> bool:
+        """
+        记录一次限流，乘性减少并发并暂停所有请求
+        
+        Args:
+            retry_after: 服务端要求等待的时间（秒）
+            
+        Returns:
+            是否降低了并发数（同一暂停期内的多个限流响应只降低一次）
+        """
+        with self._cond:
+            now = time.time()
+            decreased = now >= self._cooldown_until
+            if decreased:
+                self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                self.throttle_count += 1
+            self._cooldown_until = max(self._cooldown_until, now + retry_after)
+            return decreased
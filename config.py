@@ -14,6 +14,13 @@ GITHUB_TOKEN = os.getenv('GITHUB_TOKEN', '')
 SCAN_INTERVAL_HOURS = int(os.getenv('SCAN_INTERVAL_HOURS', 24))
 OUTPUT_DIR = os.getenv('OUTPUT_DIR', './scan_reports')
 
+# 报告格式（逗号分隔）: text 为文本报告，jsonl 为逐行的发现流，sarif 为 SARIF 2.1.0，
+# summary 为按置信度/仓库/规则汇总的 .summary.json（与文本报告同名，每次扫描一个文件）
+REPORT_FORMAT = os.getenv('REPORT_FORMAT', 'text')
+
+# 报告按仓库的扫描顺序写入：先完成的仓库最多缓冲多少个等待前面的仓库（超出后跳过仍未完成的仓库）
+REPORT_ORDER_WINDOW = int(os.getenv('REPORT_ORDER_WINDOW', 50))
+
 # AI相关的敏感信息模式
 SENSITIVE_PATTERNS = [
     # OpenAI API密钥格式
@@ -130,3 +137,167 @@ EXCLUDED_DIRS = [
 # GitHub API速率限制
 MAX_REPOS_PER_SEARCH = 100
 SEARCH_DELAY_SECONDS = 2
+API_PAGE_SIZE = 100  # 列表接口每页数量（GitHub 最大支持 100）
+
+# 并发扫描的仓库数（扫描耗时主要在网络等待上，适当并发可显著提升吞吐）
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 4))
+
+# ===== 扫描流水线 =====
+# 各阶段之间的有界队列容量（队列满时上游阻塞，内存占用保持平稳）
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 200))
+
+# 各阶段并发数：准入（列出文件树）、检测；获取阶段（下载文件内容）的并发数为 --workers（SCAN_WORKERS）
+ADMIT_WORKERS = int(os.getenv('ADMIT_WORKERS', 2))
+DETECT_WORKERS = int(os.getenv('DETECT_WORKERS', 2))
+
+# ===== 文件优先级与单仓库预算 =====
+# 高优先级文件（按文件名匹配，最可能包含密钥，优先扫描）
+HIGH_PRIORITY_FILE_PATTERNS = [
+    '.env', '.env.*', '*.env',
+    'config.*', 'settings.*',
+    '*.ipynb',
+    'secrets.*', 'credentials.*',
+]
+
+# 中优先级文件扩展名（常见配置/脚本文件）
+MEDIUM_PRIORITY_EXTENSIONS = [
+    '.py', '.js', '.ts', '.json', '.yaml', '.yml',
+    '.toml', '.ini', '.cfg', '.conf', '.sh',
+]
+
+# 低优先级目录（测试夹具、第三方/vendored代码，最后扫描）
+LOW_PRIORITY_DIRS = [
+    'test', 'tests', 'fixtures', '__fixtures__', 'testdata', 'test_data',
+    'vendor', 'vendors', 'third_party', 'thirdparty', 'external',
+]
+
+# 单仓库扫描预算（0 表示不限制，默认不限制）：设置后超出预算的低优先级文件不再扫描，仓库记为部分扫描
+MAX_FILES_PER_REPO = int(os.getenv('MAX_FILES_PER_REPO', 0))
+MAX_BYTES_PER_REPO = int(os.getenv('MAX_BYTES_PER_REPO', 0))
+
+# 单个文件大小上限，超过的文件直接跳过（GitHub 内容接口最大支持 1MB）
+MAX_FILE_SIZE_BYTES = int(os.getenv('MAX_FILE_SIZE_BYTES', 1024 * 1024))
+
+# ===== 扫描检查点 =====
+# 检查点目录（不随扫描历史提交；工作流通过 Actions 缓存在同一任务的下次运行中恢复，配合 --resume 继续）
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', './scan_checkpoints')
+
+# 检查点状态文件的最短保存间隔（秒），发现结果会立即追加写入
+CHECKPOINT_SAVE_INTERVAL_SECONDS = int(os.getenv('CHECKPOINT_SAVE_INTERVAL_SECONDS', 30))
+
+# ===== 时间预算 =====
+# 单个仓库的硬性时限（秒），超时后跳过该仓库剩余文件（0 表示只受整体超时限制）
+MAX_REPO_SECONDS = int(os.getenv('MAX_REPO_SECONDS', 600))
+
+# 为生成报告、保存历史等收尾工作预留的时间（秒），不用于扫描新仓库
+TIME_BUDGET_RESERVE_SECONDS = int(os.getenv('TIME_BUDGET_RESERVE_SECONDS', 60))
+
+# ===== 分片扫描 =====
+# 各分片的扫描历史和发现片段目录（由 merge 命令合并）
+SHARD_FRAGMENT_DIR = os.getenv('SHARD_FRAGMENT_DIR', './scan_history/fragments')
+
+# ===== 常驻服务与任务队列 =====
+# 任务队列数据库（本地状态，不随扫描历史提交）
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', './scan_jobs/jobs.db')
+
+# 任务最多尝试次数（含首次执行），失败后按指数退避重新排队
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_BACKOFF_SECONDS = int(os.getenv('JOB_RETRY_BACKOFF_SECONDS', 60))
+
+# 队列为空时的轮询间隔（秒）
+JOB_POLL_INTERVAL_SECONDS = int(os.getenv('JOB_POLL_INTERVAL_SECONDS', 5))
+
+# 本地 HTTP 入队接口端口（0 表示不启动）
+JOB_HTTP_PORT = int(os.getenv('JOB_HTTP_PORT', 0))
+
+# ===== 运行指标 =====
+# 指标输出目录（metrics.json 摘要和 Prometheus textfile scanner.prom）
+METRICS_DIR = os.getenv('METRICS_DIR', './scan_metrics')
+
+# ===== 性能剖析（--profile） =====
+# 剖析结果输出目录
+PROFILE_DIR = os.getenv('PROFILE_DIR', './scan_profiles')
+
+# 调用栈采样间隔（秒）
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_SECONDS', 0.005))
+
+# ===== 优雅关闭 =====
+# 收到 SIGTERM/SIGINT 后等待正在扫描的仓库结束的最长时间（秒），之后生成部分报告
+SHUTDOWN_GRACE_SECONDS = int(os.getenv('SHUTDOWN_GRACE_SECONDS', 20))
+
+# ===== 仓库优先级 =====
+# 仓库排序窗口：惰性枚举时最多缓冲的仓库数，窗口内按新鲜度和泄露可能性排序（0 表示保持 API 返回顺序）
+REPO_PRIORITY_WINDOW = int(os.getenv('REPO_PRIORITY_WINDOW', 200))
+
+# 初始排序窗口：枚举到这么多仓库就开始扫描，之后窗口逐步增大到 REPO_PRIORITY_WINDOW
+REPO_PRIORITY_INITIAL_WINDOW = int(os.getenv('REPO_PRIORITY_INITIAL_WINDOW', 10))
+
+# 新鲜度半衰期（天）：最近推送的仓库中泄露的密钥最可能仍然有效
+REPO_FRESHNESS_HALF_LIFE_DAYS = float(os.getenv('REPO_FRESHNESS_HALF_LIFE_DAYS', 30))
+
+# ===== 自适应并发 =====
+# 获取类请求（文件树、文件内容）的初始并发数，之后在并发上限内自动调整
+ADAPTIVE_INITIAL_CONCURRENCY = int(os.getenv('ADAPTIVE_INITIAL_CONCURRENCY', 2))
+
+# 获取类请求的并发上限（0 表示等于发起这些请求的线程数，即 --workers 加 ADMIT_WORKERS）；
+# 设得比线程数小可以在不减少线程的情况下限制对 GitHub 的压力，比线程数大则不会生效
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv('ADAPTIVE_MAX_CONCURRENCY', 0))
+
+# 触发限流（429、Retry-After、二级速率限制 403）时并发数乘以的系数
+ADAPTIVE_DECREASE_FACTOR = float(os.getenv('ADAPTIVE_DECREASE_FACTOR', 0.5))
+
+# 近期平均延迟超过长期平均延迟的倍数后不再增加并发
+ADAPTIVE_LATENCY_TOLERANCE = float(os.getenv('ADAPTIVE_LATENCY_TOLERANCE', 2.0))
+
+# 二级速率限制没有给出 Retry-After 时的等待时间（秒，GitHub 建议至少等待一分钟）
+SECONDARY_RATE_LIMIT_WAIT_SECONDS = int(os.getenv('SECONDARY_RATE_LIMIT_WAIT_SECONDS', 60))
+
+# 单个请求被限流后的最多重试次数，以及愿意等待的最长时间（秒），超过后该仓库推迟到下次扫描
+THROTTLE_MAX_RETRIES = int(os.getenv('THROTTLE_MAX_RETRIES', 2))
+THROTTLE_MAX_WAIT_SECONDS = int(os.getenv('THROTTLE_MAX_WAIT_SECONDS', 120))
+
+# ===== 扫描历史存储 =====
+# 扫描历史后端: sharded（scan_history/shards/ 下按仓库名哈希前缀分片的小文件，按需加载、只重写有变化的分片，
+# 提交到仓库后并发运行的工作流可以按行合并）、sqlite（按仓库名索引，单条读写与历史规模无关）、
+# journal（JSON 快照 + 追加写入的日志）或 json（旧版本格式，每次写入重写整个文件）。
+# sharded 后端只在还没有分片时从旧版本的 scan_history/scanned_repos.json 导入一次，之后不再更新该文件，
+# 它只是导入来源，不反映最新的扫描历史。
+# 成员索引（scanned_repos.idx，mmap 加载的布隆过滤器 + 排序哈希数组）只用于 json 和 journal 后端，它们需要解析整个文件
+# 才能查询；sharded 后端判断是否已扫描时只加载仓库所在的一个分片，sqlite 后端按仓库名查询，都不使用也不生成成员索引
+HISTORY_BACKEND = os.getenv('HISTORY_BACKEND', 'sharded')
+
+# sqlite 后端在每次扫描结束时导出 JSON 副本（scan_history/scanned_repos.json，随仓库提交）
+HISTORY_JSON_EXPORT = os.getenv('HISTORY_JSON_EXPORT', 'true').lower() == 'true'
+
+# journal 后端：每累积多少条记录或间隔多少秒把日志刷盘（fsync）一次
+HISTORY_JOURNAL_FLUSH_EVERY = int(os.getenv('HISTORY_JOURNAL_FLUSH_EVERY', 50))
+HISTORY_JOURNAL_FLUSH_SECONDS = float(os.getenv('HISTORY_JOURNAL_FLUSH_SECONDS', 5))
+
+# journal 后端：日志超过该大小（字节）时立即压缩为新快照（扫描结束时总会压缩）
+HISTORY_JOURNAL_COMPACT_BYTES = int(os.getenv('HISTORY_JOURNAL_COMPACT_BYTES', 4 * 1024 * 1024))
+
+# sharded 后端：分片文件名使用的仓库名哈希前缀长度（十六进制位数，2 位即 256 个分片；已有分片时沿用其长度）
+HISTORY_SHARD_PREFIX_LEN = int(os.getenv('HISTORY_SHARD_PREFIX_LEN', 2))
+
+# 扫描历史中按天统计的扫描次数/新仓库数/发现数最多保留的天数（用于趋势看板）
+HISTORY_STATS_DAYS = int(os.getenv('HISTORY_STATS_DAYS', 90))
+
+# ===== 变更感知的重新扫描 =====
+# 已扫描的仓库只在上次扫描后有新推送时重新扫描；超过该天数未扫描的仓库即使没有新推送也重新扫描（0 表示不强制）
+RESCAN_MAX_AGE_DAYS = float(os.getenv('RESCAN_MAX_AGE_DAYS', 0))
+
+# ===== 密钥指纹索引 =====
+# 跨仓库记录已报告过的密钥（只保存加盐 HMAC-SHA256 指纹，不保存明文），同一密钥出现在其他仓库/文件时不再重复报告
+# （JSON Lines，每行一个指纹，随扫描历史提交，并发运行的工作流按行合并）
+SECRET_FINGERPRINT_FILE = os.getenv('SECRET_FINGERPRINT_FILE', './scan_history/secret_fingerprints.jsonl')
+
+# 指纹的 HMAC 盐（CI 中必须通过仓库 secret 提供，未设置时扫描直接失败）；
+# 本地运行未设置时使用本地盐文件，不存在则随机生成（不随仓库提交）
+SECRET_FINGERPRINT_SALT = os.getenv('SECRET_FINGERPRINT_SALT', '')
+SECRET_FINGERPRINT_SALT_FILE = os.getenv('SECRET_FINGERPRINT_SALT_FILE', './scan_history/fingerprint_salt')
+
+# 每个指纹最多记录的出现位置数（超出后只累计次数）
+SECRET_FINGERPRINT_MAX_LOCATIONS = int(os.getenv('SECRET_FINGERPRINT_MAX_LOCATIONS', 100))
+
+# 已报告过的密钥超过该天数后再次出现时重新报告（0 表示只报告一次）
+SECRET_FINGERPRINT_REREPORT_DAYS = float(os.getenv('SECRET_FINGERPRINT_REREPORT_DAYS', 0))
@@ -0,0 +1,285 @@
+"""
+密钥指纹索引 - 以加盐 HMAC-SHA256 指纹跨仓库记录已发现的密钥（首次发现的仓库/树 SHA、所有出现位置、
+上次报告时间），同一密钥复制到其他仓库或文件时不再重复报告；索引中不保存任何密钥明文
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+from config import (
+    SECRET_FINGERPRINT_FILE, SECRET_FINGERPRINT_SALT, SECRET_FINGERPRINT_SALT_FILE,
+    SECRET_FINGERPRINT_MAX_LOCATIONS, SECRET_FINGERPRINT_REREPORT_DAYS
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只保证进程内的线程安全
+    fcntl = None
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _load_salt(salt: str, salt_file: Path) -> bytes:
+    """
+    读取指纹盐：优先使用配置的盐，其次读取本地盐文件，都没有时随机生成并保存到盐文件
+    
+    Args:
+        salt: 配置的盐（环境变量 SECRET_FINGERPRINT_SALT）
+        salt_file: 本地盐文件路径
+        
+    Returns:
+        盐
+        
+    Raises:
+        ValueError: 在 GitHub Actions 中运行且没有配置盐（每次运行的盐都不同，索引永远无法匹配）
+    """
+    if salt:
+        return salt.encode('utf-8')
+    try:
+        with open(salt_file, 'r', encoding='utf-8') as f:
+            stored = f.read().strip()
+        if stored:
+            return stored.encode('utf-8')
+    except FileNotFoundError:
+        pass
+    
+    # CI 运行器上生成的盐不会保留，下次运行时与提交的索引不一致，所有已报告过的密钥都会被重复报告
+    if os.getenv('GITHUB_ACTIONS') == 'true':
+        raise ValueError("在 GitHub Actions 中运行但未设置 SECRET_FINGERPRINT_SALT，"
+                         "请添加同名的仓库 secret（或使用 --report-known-secrets 不使用指纹索引）")
+    
+    stored = secrets.token_hex(32)
+    salt_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(salt_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(stored + "\n")
+    print(f"🔑 未设置 SECRET_FINGERPRINT_SALT，已生成本地指纹盐: {salt_file}（CI 中请通过 secret 提供固定的盐）")
+    return stored.encode('utf-8')
+
+
+class SecretFingerprintIndex:
+    """
+    密钥指纹索引（JSON Lines 文件，扫描结束时在跨进程锁内与其他进程的修改合并后保存）。
+    第一行是盐的校验值，之后每行一个指纹并按指纹排序；并发运行的扫描提交索引时由 git 按行合并
+    （merge=union），同一指纹合并出多行时读取时合并为一条记录
+    """
+    
+    def __init__(self, index_file: str = SECRET_FINGERPRINT_FILE,
+                 salt: str = SECRET_FINGERPRINT_SALT,
+                 salt_file: str = SECRET_FINGERPRINT_SALT_FILE,
+                 max_locations: int = SECRET_FINGERPRINT_MAX_LOCATIONS,
+                 rereport_days: float = SECRET_FINGERPRINT_REREPORT_DAYS):
+        """
+        初始化密钥指纹索引
+        
+        Args:
+            index_file: 索引文件路径
+            salt: HMAC 盐（为空时使用本地盐文件）
+            salt_file: 本地盐文件路径
+            max_locations: 每个指纹最多记录的出现位置数
+            rereport_days: 已报告过的密钥超过该天数后再次出现时重新报告（0 表示只报告一次）
+        """
+        self.index_file = Path(index_file)
+        self.max_locations = max_locations
+        self.rereport_days = rereport_days
+        self._key = _load_salt(salt, Path(salt_file))
+        # 盐的校验值：盐变化后旧指纹全部失效，不能与新指纹混在一起
+        self._salt_check = hmac.new(self._key, b'secret-fingerprint-index', hashlib.sha256).hexdigest()[:16]
+        self._lock_file = self.index_file.with_suffix('.lock')
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self.enabled = True
+        self._entries = self._load()
+    
+    @property
+    def count(self) -> int:
+        """索引中的密钥数"""
+        return len(self._entries)
+    
+    def fingerprint(self, secret: str) -> str:
+        """
+        计算密钥的指纹
+        
+        Args:
+            secret: 密钥明文
+            
+        Returns:
+            十六进制的 HMAC-SHA256 指纹
+        """
+        return hmac.new(self._key, secret.encode('utf-8'), hashlib.sha256).hexdigest()
+    
+    def record(self, finding: Dict, commit: Optional[str] = None) -> bool:
+        """
+        记录一个发现的出现位置（并把指纹写入发现，供机器可读报告关联同一密钥），判断是否需要报告
+        
+        Args:
+            finding: 检测结果（包含 secret、repo_name、file_path、line_number）
+            commit: 发现时默认分支的根目录树 SHA（未知时为 None）
+            
+        Returns:
+            True 如果是新密钥（或已超过重新报告间隔）需要报告，False 表示已报告过的重复密钥
+        """
+        if not self.enabled:
+            return True
+        
+        fingerprint = self.fingerprint(finding['secret'])
+        finding['fingerprint'] = fingerprint
+        now = datetime.now().strftime(_TIME_FORMAT)
+        location = {
+            "repo": finding.get('repo_name', ''),
+            "file_path": finding.get('file_path', ''),
+            "line_number": finding.get('line_number'),
+            "commit": commit,
+            "seen_at": now,
+        }
+        
+        with self._lock:
+            self._dirty.add(fingerprint)
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                self._entries[fingerprint] = {
+                    "pattern": finding.get('pattern', ''),
+                    "first_seen_repo": location["repo"],
+                    "first_seen_commit": commit,
+                    "first_seen_at": now,
+                    "last_seen_at": now,
+                    "last_reported_at": now,
+                    "location_count": 1,
+                    "locations": [location],
+                }
+                return True
+            
+            entry["last_seen_at"] = now
+            self._add_location(entry, location)
+            if self._should_rereport(entry):
+                entry["last_reported_at"] = now
+                return True
+            return False
+    
+    def flush(self):
+        """保存本次运行的修改（在跨进程锁内重新读取索引文件，合并其他进程写入的指纹）"""
+        if not self.enabled or not self._dirty:
+            return
+        with self._lock, self._file_lock():
+            merged = self._load()
+            if not self.enabled:
+                return
+            for fingerprint in self._dirty:
+                entry = self._entries[fingerprint]
+                other = merged.get(fingerprint)
+                merged[fingerprint] = entry if other is None else self._merge_entries(other, entry)
+            
+            # 第一行在盐不变时始终相同，不会在合并时产生重复
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.index_file.with_suffix(self.index_file.suffix + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"version": 2, "salt_check": self._salt_check}) + '\n')
+                for fingerprint in sorted(merged):
+                    record = {"fingerprint": fingerprint, "entry": merged[fingerprint]}
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            tmp_file.replace(self.index_file)
+            self._entries = merged
+            self._dirty.clear()
+    
+    def _load(self) -> Dict[str, Dict]:
+        """
+        读取索引文件
+        
+        Returns:
+            指纹 -> 记录，文件不存在时为空；盐与索引不一致时停用索引
+        """
+        salt_checks = set()
+        entries = {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️  {self.index_file} 中有无法解析的记录，已忽略")
+                        continue
+                    if "salt_check" in record:
+                        salt_checks.add(record["salt_check"])
+                        continue
+                    fingerprint, entry = record["fingerprint"], record["entry"]
+                    # git 合并留下的同一指纹的多行，合并为一条记录
+                    other = entries.get(fingerprint)
+                    entries[fingerprint] = entry if other is None else self._merge_entries(other, entry)
+        except FileNotFoundError:
+            return {}
+        except (OSError, KeyError, TypeError) as e:
+            print(f"⚠️  读取密钥指纹索引失败: {e}，本次不使用指纹索引")
+            self.enabled = False
+            return {}
+        
+        if (salt_checks or entries) and salt_checks != {self._salt_check}:
+            print(f"⚠️  指纹盐与索引 {self.index_file} 不一致，本次不使用指纹索引（所有发现都会报告）")
+            self.enabled = False
+            return {}
+        return entries
+    
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的建议锁（fcntl.flock）"""
+        if fcntl is None:
+            yield
+            return
+        self._lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_file, 'a') as lock_fd:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+    
+    def _add_location(self, entry: Dict, location: Dict):
+        """记录出现位置（同一仓库的同一文件只保留最新一次），超出上限后只累计次数"""
+        locations = entry["locations"]
+        for i, existing in enumerate(locations):
+            if existing["repo"] == location["repo"] and existing["file_path"] == location["file_path"]:
+                locations[i] = location
+                return
+        entry["location_count"] += 1
+        if len(locations) < self.max_locations:
+            locations.append(location)
+    
+    def _should_rereport(self, entry: Dict) -> bool:
+        """已报告过的密钥是否超过了重新报告间隔"""
+        if self.rereport_days <= 0:
+            return False
+        last_reported = datetime.strptime(entry["last_reported_at"], _TIME_FORMAT)
+        return datetime.now() - last_reported >= timedelta(days=self.rereport_days)
+    
+    def _merge_entries(self, other: Dict, entry: Dict) -> Dict:
+        """
+        合并同一指纹在两个进程中的记录
+        
+        Args:
+            other: 索引文件中（其他进程写入）的记录
+            entry: 本进程的记录
+            
+        Returns:
+            合并后的记录：首次发现取较早的一方，时间取较晚的一方，出现位置取并集
+        """
+        first = other if other["first_seen_at"] <= entry["first_seen_at"] else entry
+        merged = dict(first)
+        merged["last_seen_at"] = max(other["last_seen_at"], entry["last_seen_at"])
+        merged["last_reported_at"] = max(other["last_reported_at"], entry["last_reported_at"])
+        
+        locations = {(location["repo"], location["file_path"]): location for location in other["locations"]}
+        for location in entry["locations"]:
+            key = (location["repo"], location["file_path"])
+            if key not in locations or locations[key]["seen_at"] < location["seen_at"]:
+                locations[key] = location
+        merged["locations"] = sorted(locations.values(), key=lambda location: location["seen_at"])[:self.max_locations]
+        merged["location_count"] = max(other["location_count"], entry["location_count"], len(locations))
+        return merged
@@ -1,39 +1,182 @@
 """
 GitHub仓库扫描模块
 """
+import base64
 import time
 import re
-from datetime import datetime
-from typing import List, Dict, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, List, Dict, Optional, Iterator, Tuple
 from github import Github, GithubException
-from config import GITHUB_TOKEN, AI_SEARCH_KEYWORDS, MAX_REPOS_PER_SEARCH, SEARCH_DELAY_SECONDS
+from config import (
+    GITHUB_TOKEN, AI_SEARCH_KEYWORDS, MAX_REPOS_PER_SEARCH, SEARCH_DELAY_SECONDS, API_PAGE_SIZE,
+    SCAN_WORKERS, SECONDARY_RATE_LIMIT_WAIT_SECONDS, THROTTLE_MAX_RETRIES, THROTTLE_MAX_WAIT_SECONDS
+)
+from adaptive_concurrency import AIMDController
+from metrics import metrics
+
+
+class GitHubThrottledError(Exception):
+    """请求被 GitHub 限流且重试后仍未成功（与真正的无权访问区分，仓库应推迟而不是记为已扫描）"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_throttle_delay(e: GithubException) -> Optional[float]:
+    """
+    判断请求失败是否为限流（429、Retry-After、速率限制耗尽、二级速率限制/滥用检测 403）
+    
+    Args:
+        e: GitHub 异常
+        
+    Returns:
+        建议等待的时间（秒），不是限流（例如真正的 403 无权访问）时返回 None
+    """
+    if e.status not in (403, 429):
+        return None
+    
+    headers = {key.lower(): value for key, value in (e.headers or {}).items()}
+    if 'retry-after' in headers:
+        try:
+            return max(0.0, float(headers['retry-after']))
+        except ValueError:
+            return float(SECONDARY_RATE_LIMIT_WAIT_SECONDS)
+    if headers.get('x-ratelimit-remaining') == '0':
+        try:
+            return max(0.0, float(headers['x-ratelimit-reset']) - time.time())
+        except (KeyError, ValueError):
+            return float(SECONDARY_RATE_LIMIT_WAIT_SECONDS)
+    
+    message = e.data.get('message', '') if isinstance(e.data, dict) else str(e.data)
+    if e.status == 429 or 'rate limit' in message.lower() or 'abuse' in message.lower():
+        return float(SECONDARY_RATE_LIMIT_WAIT_SECONDS)
+    return None
 
 
 class GitHubScanner:
     """GitHub仓库扫描器"""
     
-    def __init__(self, token: str = GITHUB_TOKEN):
+    def __init__(self, token: str = GITHUB_TOKEN, max_concurrency: int = SCAN_WORKERS):
         """
         初始化GitHub扫描器
         
         Args:
             token: GitHub Personal Access Token
+            max_concurrency: 同时进行的获取类请求（文件树、文件内容）上限
         """
         if not token:
             raise ValueError("GitHub Token is required. Please set GITHUB_TOKEN in .env file")
         
+        self.token = token
+        # PyGithub 的连接对象不是线程安全的，每个线程使用独立的客户端
+        self._local = threading.local()
+        # 线程退出时归还的客户端，由后续线程复用，保持 HTTP 连接（常驻服务在多个任务间复用）
+        self._idle_clients = []
+        self._clients_lock = threading.Lock()
+        # 速率限制检查在所有线程间共享，同一时间只有一个线程探测或等待
+        self._rate_limit_lock = threading.Lock()
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None
+        # 获取类请求的并发数在上限内自适应调整，触发限流时减半
+        self.concurrency = AIMDController(max_concurrency)
+    
+    @property
+    def github(self) -> Github:
+        """当前线程的 GitHub 客户端"""
+        client = getattr(self._local, 'github', None)
+        if client is None:
+            with self._clients_lock:
+                client = self._idle_clients.pop() if self._idle_clients else None
+            if client is None:
+                client = self._create_client()
+            self._local.github = client
+        return client
+    
+    def release_client(self):
+        """当前线程即将退出，归还其客户端供其他线程复用"""
+        client = getattr(self._local, 'github', None)
+        if client is not None:
+            self._local.github = None
+            with self._clients_lock:
+                self._idle_clients.append(client)
+    
+    def _create_client(self) -> Github:
+        """创建 GitHub 客户端"""
         # 配置超时和重试参数，避免长时间等待
-        self.github = Github(
-            token,
+        return Github(
+            self.token,
             timeout=30,  # 设置30秒超时
-            retry=None   # 禁用自动重试，我们自己处理
+            retry=None,  # 禁用自动重试，我们自己处理
+            per_page=API_PAGE_SIZE  # 每页返回数量，减少分页请求次数
         )
-        self.rate_limit_remaining = None
-        self.rate_limit_reset = None
         
+    @contextmanager
+    def _track_api(self, endpoint: str):
+        """
+        统计一次 API 调用的次数、耗时和错误
+        
+        Args:
+            endpoint: 接口名称
+        """
+        metrics.inc('github_api_calls_total', endpoint=endpoint)
+        start = time.time()
+        try:
+            yield
+        except GithubException as e:
+            metrics.inc('github_api_errors_total', endpoint=endpoint, status=e.status)
+            raise
+        finally:
+            metrics.observe('github_api_seconds', time.time() - start, endpoint=endpoint)
+    
+    def _call_fetch_api(self, endpoint: str, request: Callable):
+        """
+        在自适应并发控制下执行一次获取类请求，被限流时降低并发、等待后重试
+        
+        Args:
+            endpoint: 接口名称
+            request: 发起请求的函数
+            
+        Returns:
+            请求结果
+            
+        Raises:
+            GitHubThrottledError: 重试后仍被限流，或要求等待的时间过长
+            GithubException: 其他请求错误（包括真正的 403 无权访问）
+        """
+        for attempt in range(THROTTLE_MAX_RETRIES + 1):
+            with self.concurrency.slot():
+                start = time.time()
+                try:
+                    with self._track_api(endpoint):
+                        result = request()
+                except GithubException as e:
+                    retry_after = get_throttle_delay(e)
+                    if retry_after is None:
+                        raise
+                    throttle_error = e
+                else:
+                    self.concurrency.on_success(time.time() - start)
+                    metrics.set_gauge('fetch_concurrency_limit', self.concurrency.current_limit)
+                    return result
+            
+            # 被限流：降低并发并暂停所有获取请求，等待时间过长时不再重试
+            metrics.inc('github_throttled_total', endpoint=endpoint)
+            if self.concurrency.on_throttle(min(retry_after, THROTTLE_MAX_WAIT_SECONDS)):
+                print(f"🚦 触发 GitHub 限流 ({throttle_error.status})，并发数降至 "
+                      f"{self.concurrency.current_limit}，暂停 {min(retry_after, THROTTLE_MAX_WAIT_SECONDS):.0f} 秒")
+            metrics.set_gauge('fetch_concurrency_limit', self.concurrency.current_limit)
+            if retry_after > THROTTLE_MAX_WAIT_SECONDS:
+                break
+        
+        raise GitHubThrottledError(f"{endpoint} 请求被限流: {throttle_error}", retry_after)
+    
     def get_rate_limit_info(self) -> Dict:
         """获取API速率限制信息"""
-        rate_limit = self.github.get_rate_limit()
+        with self._track_api('rate_limit'):
+            rate_limit = self.github.get_rate_limit()
         core = rate_limit.core
         
         return {
@@ -43,73 +186,123 @@ class GitHubScanner:
         }
     
     def wait_for_rate_limit(self):
-        """等待速率限制重置"""
-        info = self.get_rate_limit_info()
-        if info['remaining'] < 10:
-            # info['reset'] 是 datetime 对象，需要和 datetime.now() 比较
-            wait_time = (info['reset'] - datetime.now()).total_seconds() + 10
-            print(f"⚠️  API速率限制即将耗尽，等待 {wait_time:.0f} 秒...")
-            time.sleep(max(0, wait_time))
+        """
+        速率限制即将耗尽时等待重置。剩余次数取自本线程客户端最近一次响应的速率限制头，
+        不额外发起请求（本线程还没有发出过请求时 PyGithub 会查询一次）；
+        只有需要等待时才持锁，其他线程会等待正在等待重置的线程
+        """
+        remaining, limit = self.github.rate_limiting
+        reset_time = self.github.rate_limiting_resettime
+        self.rate_limit_remaining = remaining
+        self.rate_limit_reset = datetime.fromtimestamp(reset_time, timezone.utc)
+        metrics.set_gauge('github_rate_limit_remaining', remaining)
+        metrics.set_gauge('github_rate_limit_limit', limit)
+        if remaining >= 10:
+            return
+        
+        with self._rate_limit_lock:
+            # 等锁期间其他线程可能已经等到了重置，重置时间已过时不再等待
+            wait_time = reset_time - time.time()
+            if wait_time > 0:
+                print(f"⚠️  API速率限制即将耗尽，等待 {wait_time + 10:.0f} 秒...")
+                time.sleep(wait_time + 10)
     
-    def get_user_repos(self, username: str) -> List[Dict]:
+    def get_user_repos(self, username: str, skip_filter=None) -> Iterator[Dict]:
         """
-        获取指定用户的所有公开仓库
+        获取指定用户的所有公开仓库（按页惰性获取，边获取边返回）
         
         Args:
             username: GitHub用户名
+            skip_filter: 可选的过滤函数，接受仓库信息（含 full_name 和 pushed_at），返回True表示跳过该仓库
             
-        Returns:
-            仓库信息列表
+        Yields:
+            仓库信息
+            
+        Raises:
+            GithubException: 获取用户或翻页失败（由调用方决定重试或失败，不当作枚举完毕）
         """
-        try:
+        with self._track_api('users'):
             user = self.github.get_user(username)
-            repos = []
-            
-            for repo in user.get_repos():
-                if not repo.private:
-                    repos.append({
-                        'name': repo.name,
-                        'full_name': repo.full_name,
-                        'url': repo.html_url,
-                        'clone_url': repo.clone_url,
-                        'description': repo.description,
-                        'updated_at': repo.updated_at,
-                    })
-            
-            return repos
-        except GithubException as e:
-            print(f"❌ 获取用户仓库失败: {e}")
-            return []
+        yield from self._iter_repos(user.get_repos(), skip_filter)
     
-    def get_org_repos(self, org_name: str) -> List[Dict]:
+    def get_org_repos(self, org_name: str, skip_filter=None) -> Iterator[Dict]:
         """
-        获取指定组织的所有公开仓库
+        获取指定组织的所有公开仓库（按页惰性获取，边获取边返回）
         
         Args:
             org_name: GitHub组织名
+            skip_filter: 可选的过滤函数，接受仓库信息（含 full_name 和 pushed_at），返回True表示跳过该仓库
             
-        Returns:
-            仓库信息列表
+        Yields:
+            仓库信息
+            
+        Raises:
+            GithubException: 获取组织或翻页失败（由调用方决定重试或失败，不当作枚举完毕）
         """
-        try:
+        with self._track_api('orgs'):
             org = self.github.get_organization(org_name)
-            repos = []
-            
-            for repo in org.get_repos():
-                if not repo.private:
-                    repos.append({
-                        'name': repo.name,
-                        'full_name': repo.full_name,
-                        'url': repo.html_url,
-                        'clone_url': repo.clone_url,
-                        'description': repo.description,
-                        'updated_at': repo.updated_at,
-                    })
+        yield from self._iter_repos(org.get_repos(), skip_filter)
+    
+    def _iter_repos(self, repos, skip_filter=None) -> Iterator[Dict]:
+        """
+        遍历仓库分页结果，预先过滤 fork、归档、空仓库和已扫描的仓库
+        
+        Args:
+            repos: PyGithub 分页仓库列表
+            skip_filter: 可选的过滤函数，接受仓库信息（含 full_name 和 pushed_at），返回True表示跳过该仓库
             
-            return repos
-        except GithubException as e:
-            print(f"❌ 获取组织仓库失败: {e}")
-            return []
+        Yields:
+            仓库信息
+        """
+        total_count = 0
+        skipped = {'fork': 0, 'archived': 0, 'empty': 0, 'scanned': 0}
+        
+        for repo in repos:
+            if repo.private:
+                continue
+            total_count += 1
+            
+            if repo.fork:
+                skipped['fork'] += 1
+            elif repo.archived:
+                skipped['archived'] += 1
+            elif repo.size == 0:
+                skipped['empty'] += 1
+            else:
+                repo_info = self._repo_to_dict(repo)
+                if skip_filter and skip_filter(repo_info):
+                    skipped['scanned'] += 1
+                else:
+                    yield repo_info
+        
+        skipped_count = sum(skipped.values())
+        print(f"📦 共找到 {total_count} 个公开仓库")
+        if skipped_count > 0:
+            print(f"⏭️  预过滤 {skipped_count} 个仓库 (fork: {skipped['fork']}, 归档: {skipped['archived']}, "
+                  f"空仓库: {skipped['empty']}, 已扫描: {skipped['scanned']})")
+    
+    def _repo_to_dict(self, repo) -> Dict:
+        """
+        将 PyGithub 仓库对象转换为仓库信息字典
+        
+        Args:
+            repo: PyGithub 仓库对象
+            
+        Returns:
+            仓库信息字典
+        """
+        return {
+            'name': repo.name,
+            'full_name': repo.full_name,
+            'url': repo.html_url,
+            'clone_url': repo.clone_url,
+            'description': repo.description,
+            'updated_at': repo.updated_at,
+            'pushed_at': repo.pushed_at,
+            'size': repo.size,
+            'fork': repo.fork,
+            'default_branch': repo.default_branch,
+        }
     
     def search_ai_repos(self, max_repos: int = MAX_REPOS_PER_SEARCH, skip_filter=None) -> List[Dict]:
         """
@@ -117,13 +310,14 @@ class GitHubScanner:
         
         Args:
             max_repos: 最大返回仓库数量
-            skip_filter: 可选的过滤函数，接受仓库全名，返回True表示跳过该仓库
+            skip_filter: 可选的过滤函数，接受仓库信息（含 full_name 和 pushed_at），返回True表示跳过该仓库
             
         Returns:
-            仓库信息列表
+            仓库信息列表（search_hits 为代码搜索命中的文件路径和 blob SHA）
         """
         all_repos = []
         seen_repos = set()
+        repos_by_name = {}
         skipped_count = 0
         
         for keyword in AI_SEARCH_KEYWORDS:
@@ -133,6 +327,7 @@ class GitHubScanner:
                 
                 # 搜索代码
                 query = f'{keyword} in:file language:python'
+                metrics.inc('github_api_calls_total', endpoint='search_code')
                 results = self.github.search_code(query, order='desc')
                 
                 # 从代码搜索结果中提取仓库
@@ -143,6 +338,13 @@ class GitHubScanner:
                     
                     repo = code.repository
                     
+                    # 已收录的仓库再次命中其他文件时记录命中文件，用于仓库排序
+                    if repo.full_name in repos_by_name:
+                        hits = repos_by_name[repo.full_name]['search_hits']
+                        if all(hit['path'] != code.path for hit in hits):
+                            hits.append({'path': code.path, 'sha': code.sha})
+                        continue
+                    
                     # 跳过私有仓库和已经见过的仓库
                     if repo.private or repo.full_name in seen_repos:
                         continue
@@ -150,20 +352,16 @@ class GitHubScanner:
                     seen_repos.add(repo.full_name)
                     
                     # 如果提供了过滤函数，检查是否应该跳过
-                    if skip_filter and skip_filter(repo.full_name):
+                    repo_info = self._repo_to_dict(repo)
+                    if skip_filter and skip_filter(repo_info):
                         skipped_count += 1
                         print(f"  ⏭️  跳过已扫描: {repo.full_name}")
                         continue  # 不计数，继续找下一个
                     
                     # 添加到结果列表
-                    all_repos.append({
-                        'name': repo.name,
-                        'full_name': repo.full_name,
-                        'url': repo.html_url,
-                        'clone_url': repo.clone_url,
-                        'description': repo.description,
-                        'updated_at': repo.updated_at,
-                    })
+                    repo_info['search_hits'] = [{'path': code.path, 'sha': code.sha}]
+                    repos_by_name[repo.full_name] = repo_info
+                    all_repos.append(repo_info)
                 
                 # 延迟以避免触发速率限制
                 time.sleep(SEARCH_DELAY_SECONDS)
@@ -191,10 +389,53 @@ class GitHubScanner:
             
         Returns:
             文件信息列表
+            
+        Raises:
+            GitHubThrottledError: 请求被限流
+        """
+        return self.get_repo_tree(repo_full_name, path)[0]
+    
+    def get_repo_tree(self, repo_full_name: str, path: str = "") -> Tuple[List[Dict], Optional[str]]:
+        """
+        获取仓库中的文件列表和默认分支的根目录树 SHA
+        
+        优先使用 Git Tree 接口一次性获取整棵文件树（包含路径和大小），
+        文件树被截断时回退到按目录递归获取。根目录树 SHA 只随默认分支的内容变化，
+        用于判断有新推送（例如推送到其他分支）的仓库是否真的需要重新扫描
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            path: 文件路径
+            
+        Returns:
+            (文件信息列表, 根目录树 SHA)，按子目录获取或获取失败时树 SHA 为 None
+            
+        Raises:
+            GitHubThrottledError: 请求被限流
         """
+        tree_sha = None
         try:
-            repo = self.github.get_repo(repo_full_name)
-            contents = repo.get_contents(path)
+            repo = self._call_fetch_api('repos', lambda: self.github.get_repo(repo_full_name))
+            
+            if not path:
+                tree = self._call_fetch_api(
+                    'git_trees',
+                    lambda: repo.get_git_tree(repo.default_branch, recursive=True)
+                )
+                tree_sha = tree.sha
+                if not tree.raw_data.get('truncated'):
+                    return [
+                        {
+                            'path': element.path,
+                            'name': element.path.split('/')[-1],
+                            'size': element.size or 0,
+                            'sha': element.sha,
+                        }
+                        for element in tree.tree
+                        if element.type == "blob"
+                    ], tree_sha
+            
+            contents = self._call_fetch_api('contents', lambda: repo.get_contents(path))
             
             files = []
             for content in contents:
@@ -205,18 +446,53 @@ class GitHubScanner:
                     files.append({
                         'path': content.path,
                         'name': content.name,
+                        'size': content.size or 0,
                         'download_url': content.download_url,
                         'sha': content.sha,
                     })
             
-            return files
+            return files, tree_sha
         except GithubException as e:
             # 403 错误直接跳过，不等待
             if e.status == 403:
-                print(f"  ⏭️  跳过: 无权访问 (403 Forbidden)")
+                print(f"  ⏭️  跳过 {repo_full_name}: 无权访问 (403 Forbidden)")
+            elif e.status == 409:
+                # 空仓库没有文件树
+                pass
             else:
                 print(f"⚠️  获取文件列表失败: {e}")
-            return []
+            return [], None
+    
+    def get_blob_content(self, repo_full_name: str, blob_sha: str) -> Optional[str]:
+        """
+        按 blob SHA 获取文件内容（文件树和代码搜索结果都给出了文件的 SHA，只需一次请求，也不受按路径获取的 1 MB 限制）
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            blob_sha: 文件的 blob SHA
+            
+        Returns:
+            文件内容（文本）
+            
+        Raises:
+            GitHubThrottledError: 请求被限流
+        """
+        try:
+            # 懒加载的仓库对象不会发起请求
+            repo = self.github.get_repo(repo_full_name, lazy=True)
+            blob = self._call_fetch_api('git_blobs', lambda: repo.get_git_blob(blob_sha))
+            
+            data = base64.b64decode(blob.content) if blob.encoding == 'base64' else blob.content.encode('utf-8')
+            metrics.inc('bytes_fetched_total', len(data))
+            try:
+                return data.decode('utf-8')
+            except UnicodeDecodeError:
+                return None
+        except GithubException as e:
+            # 403 错误直接跳过，不打印错误
+            if e.status == 403:
+                pass  # 静默跳过
+            return None
     
     def get_file_content(self, repo_full_name: str, file_path: str) -> Optional[str]:
         """
@@ -228,14 +504,20 @@ class GitHubScanner:
             
         Returns:
             文件内容（文本）
+            
+        Raises:
+            GitHubThrottledError: 请求被限流
         """
         try:
-            repo = self.github.get_repo(repo_full_name)
-            content = repo.get_contents(file_path)
+            # 懒加载的仓库对象不会发起请求
+            repo = self.github.get_repo(repo_full_name, lazy=True)
+            content = self._call_fetch_api('contents', lambda: repo.get_contents(file_path))
             
             # 解码内容
+            data = content.decoded_content
+            metrics.inc('bytes_fetched_total', len(data))
             try:
-                return content.decoded_content.decode('utf-8')
+                return data.decode('utf-8')
             except UnicodeDecodeError:
                 # 如果是二进制文件，返回None
                 return None
@@ -0,0 +1,858 @@
+"""
+扫描历史存储后端 - json（兼容旧版本，每次写入重写整个文件）、journal（JSON 快照 + 追加写入的日志，
+批量刷盘、定期压缩）、sqlite（WAL 模式，按仓库名索引，单条记录的读写与历史规模无关，
+并可导出 JSON 副本提交到仓库）和 sharded（按仓库名哈希前缀分成许多小文件，按需加载，
+只重写有变化的分片，适合提交到仓库并由 git 按行合并）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from config import (
+    HISTORY_JOURNAL_FLUSH_EVERY, HISTORY_JOURNAL_FLUSH_SECONDS, HISTORY_JOURNAL_COMPACT_BYTES,
+    HISTORY_SHARD_PREFIX_LEN
+)
+
+# 支持的存储后端
+HISTORY_BACKENDS = ('json', 'journal', 'sqlite', 'sharded')
+
+
+class HistoryBackend:
+    """扫描历史存储后端接口：仓库全名到扫描信息的映射，外加少量元数据"""
+    
+    def get(self, repo_full_name: str) -> Optional[Dict]:
+        """获取仓库的扫描信息，未扫描过时返回 None"""
+        raise NotImplementedError
+    
+    def put(self, repo_full_name: str, info: Dict):
+        """写入仓库的扫描信息"""
+        raise NotImplementedError
+    
+    def put_many(self, items: Iterable[Tuple[str, Dict]]):
+        """批量写入仓库的扫描信息"""
+        for repo_full_name, info in items:
+            self.put(repo_full_name, info)
+    
+    def delete(self, repo_full_name: str) -> bool:
+        """删除仓库的扫描信息，返回仓库是否存在"""
+        raise NotImplementedError
+    
+    def contains(self, repo_full_name: str) -> bool:
+        """仓库是否有扫描记录"""
+        return self.get(repo_full_name) is not None
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """遍历所有 (仓库全名, 扫描信息)"""
+        raise NotImplementedError
+    
+    def names(self) -> Iterator[str]:
+        """遍历所有仓库全名"""
+        for repo_full_name, _ in self.items():
+            yield repo_full_name
+    
+    def count(self) -> int:
+        """仓库记录数"""
+        raise NotImplementedError
+    
+    def get_meta(self, key: str, default=None):
+        """读取元数据"""
+        raise NotImplementedError
+    
+    def set_meta(self, key: str, value):
+        """写入元数据（随下一次写入一起保存）"""
+        raise NotImplementedError
+    
+    def clear(self):
+        """清空所有记录"""
+        raise NotImplementedError
+    
+    def flush(self):
+        """把缓冲的写入保存到磁盘"""
+        pass
+    
+    def reload_if_changed(self) -> bool:
+        """其他进程修改过存储时重新加载（在跨进程锁内调用），返回是否重新加载"""
+        return False
+    
+    def sync(self):
+        """让本进程的写入对其他进程可见（在释放跨进程锁之前调用）"""
+        pass
+    
+    def close(self):
+        """保存并释放资源"""
+        self.flush()
+
+
+def _stamp(path: Path) -> Tuple[int, int]:
+    """文件（或目录）的大小和修改时间，不存在时为 (0, 0)"""
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except FileNotFoundError:
+        return 0, 0
+
+
+class JsonHistoryBackend(HistoryBackend):
+    """JSON 文件后端（旧版本格式），每次写入都重写整个文件"""
+    
+    def __init__(self, history_file: Path):
+        """
+        初始化 JSON 后端
+        
+        Args:
+            history_file: 历史记录文件路径
+        """
+        self.history_file = Path(history_file)
+        self.history = self._load_history()
+        self._stamp = _stamp(self.history_file)
+        self._meta_dirty = False
+    
+    def _load_history(self) -> Dict:
+        """
+        从文件加载扫描历史
+        
+        Returns:
+            历史记录字典
+        """
+        if self.history_file.exists():
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️  加载扫描历史失败: {e}，将创建新历史记录")
+                return {"repos": {}, "total_scanned": 0, "last_updated": None}
+        else:
+            return {"repos": {}, "total_scanned": 0, "last_updated": None}
+    
+    def _save_history(self):
+        """保存扫描历史到文件（先写临时文件再替换，其他进程不会读到写了一半的文件）"""
+        try:
+            self.history["total_scanned"] = len(self.history["repos"])
+            tmp_file = self.history_file.with_suffix(self.history_file.suffix + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, indent=2, ensure_ascii=False)
+            tmp_file.replace(self.history_file)
+            self._stamp = _stamp(self.history_file)
+            self._meta_dirty = False
+        except Exception as e:
+            print(f"⚠️  保存扫描历史失败: {e}")
+    
+    def get(self, repo_full_name: str) -> Optional[Dict]:
+        return self.history["repos"].get(repo_full_name)
+    
+    def put(self, repo_full_name: str, info: Dict):
+        self.history["repos"][repo_full_name] = info
+        self._save_history()
+    
+    def put_many(self, items: Iterable[Tuple[str, Dict]]):
+        for repo_full_name, info in items:
+            self.history["repos"][repo_full_name] = info
+        self._save_history()
+    
+    def delete(self, repo_full_name: str) -> bool:
+        if repo_full_name not in self.history["repos"]:
+            return False
+        del self.history["repos"][repo_full_name]
+        self._save_history()
+        return True
+    
+    def contains(self, repo_full_name: str) -> bool:
+        return repo_full_name in self.history["repos"]
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        return iter(list(self.history["repos"].items()))
+    
+    def count(self) -> int:
+        return len(self.history["repos"])
+    
+    def get_meta(self, key: str, default=None):
+        return self.history.get(key, default)
+    
+    def set_meta(self, key: str, value):
+        self.history[key] = value
+        self._meta_dirty = True
+    
+    def clear(self):
+        self.history = {"repos": {}, "total_scanned": 0, "last_updated": None}
+        self._save_history()
+    
+    def flush(self):
+        self._save_history()
+    
+    def reload_if_changed(self) -> bool:
+        # 每次操作结束时写入都已保存，文件变化只可能来自其他进程
+        if _stamp(self.history_file) == self._stamp:
+            return False
+        self.history = self._load_history()
+        self._stamp = _stamp(self.history_file)
+        return True
+    
+    def sync(self):
+        if self._meta_dirty:
+            self._save_history()
+
+
+class JournalHistoryBackend(JsonHistoryBackend):
+    """
+    日志后端：快照与 json 后端格式相同，每次写入只向日志追加一行，
+    按条数或时间批量刷盘（fsync），加载时回放快照和日志，压缩时把日志合并为新快照
+    """
+    
+    def __init__(self, history_file: Path,
+                 flush_every: int = HISTORY_JOURNAL_FLUSH_EVERY,
+                 flush_seconds: float = HISTORY_JOURNAL_FLUSH_SECONDS,
+                 compact_bytes: int = HISTORY_JOURNAL_COMPACT_BYTES):
+        """
+        初始化日志后端
+        
+        Args:
+            history_file: 快照文件路径（日志文件位于同一目录，扩展名为 .journal）
+            flush_every: 累积多少条记录后刷盘
+            flush_seconds: 距离上次刷盘超过多少秒后刷盘
+            compact_bytes: 日志超过多少字节后压缩为新快照
+        """
+        super().__init__(history_file)
+        self.journal_file = self.history_file.with_suffix('.journal')
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.compact_bytes = compact_bytes
+        self._pending = []
+        self._dirty_meta = {}
+        self._last_flush = time.time()
+        self._replay_journal()
+        self._stamp = self._files_stamp()
+    
+    def _files_stamp(self) -> Tuple:
+        """快照和日志文件的状态戳"""
+        return _stamp(self.history_file) + _stamp(self.journal_file)
+    
+    def _replay_journal(self, quiet: bool = False):
+        """
+        在快照的基础上回放日志（崩溃时写了一半的最后一行会被忽略）
+        
+        Args:
+            quiet: 是否不打印回放的记录数
+        """
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, 'rb') as f:
+            data = f.read()
+        
+        # 截掉崩溃时写了一半的最后一行，避免之后追加的记录接在它后面
+        if data and not data.endswith(b'\n'):
+            data = data[:data.rfind(b'\n') + 1]
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(len(data))
+            print(f"⚠️  扫描历史日志的最后一条记录不完整，已丢弃")
+        
+        replayed = 0
+        for line in data.decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"⚠️  扫描历史日志中有无法解析的记录，已忽略")
+                continue
+            self._apply(record)
+            replayed += 1
+        if replayed > 0 and not quiet:
+            print(f"📜 已回放 {replayed} 条扫描历史日志")
+    
+    def _apply(self, record: Dict):
+        """把一条日志记录应用到内存中的历史"""
+        if "put" in record:
+            self.history["repos"][record["put"]] = record["info"]
+        elif "del" in record:
+            self.history["repos"].pop(record["del"], None)
+        elif "meta" in record:
+            self.history.update(record["meta"])
+        elif "clear" in record:
+            self.history["repos"] = {}
+    
+    def _append(self, record: Dict):
+        """追加一条日志记录，达到条数或时间阈值时刷盘"""
+        self._apply(record)
+        self._pending.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        if len(self._pending) >= self.flush_every or time.time() - self._last_flush >= self.flush_seconds:
+            self._flush_journal()
+    
+    def _flush_journal(self, fsync: bool = True):
+        """
+        把缓冲的日志记录写入磁盘，日志过大时压缩
+        
+        Args:
+            fsync: 是否刷盘（否则只写入操作系统缓存，其他进程已经可以读到）
+        """
+        if self._dirty_meta:
+            self._pending.append(json.dumps({"meta": self._dirty_meta}, ensure_ascii=False, separators=(',', ':')))
+            self._dirty_meta = {}
+        if self._pending:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(self._pending) + '\n')
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+            self._pending = []
+        if fsync:
+            self._last_flush = time.time()
+        
+        if self.journal_file.exists() and self.journal_file.stat().st_size >= self.compact_bytes:
+            self.compact()
+        self._stamp = self._files_stamp()
+    
+    def compact(self):
+        """把当前历史写成新快照（先写临时文件再替换），然后清空日志"""
+        # 缓冲中的记录已经应用到内存，会随快照一起写入
+        self._pending = []
+        self._dirty_meta = {}
+        self.history["total_scanned"] = len(self.history["repos"])
+        tmp_file = self.history_file.with_suffix(self.history_file.suffix + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.history, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp_file.replace(self.history_file)
+        # 替换快照后、清空日志前崩溃也没有关系：日志记录可以重复回放
+        if self.journal_file.exists():
+            self.journal_file.unlink()
+        self._stamp = self._files_stamp()
+    
+    def put(self, repo_full_name: str, info: Dict):
+        self._append({"put": repo_full_name, "info": info})
+    
+    def put_many(self, items: Iterable[Tuple[str, Dict]]):
+        for repo_full_name, info in items:
+            self._append({"put": repo_full_name, "info": info})
+    
+    def delete(self, repo_full_name: str) -> bool:
+        if repo_full_name not in self.history["repos"]:
+            return False
+        self._append({"del": repo_full_name})
+        return True
+    
+    def set_meta(self, key: str, value):
+        # 元数据随下一次刷盘写入一行，不必每次写入都记录
+        self.history[key] = value
+        self._dirty_meta[key] = value
+    
+    def clear(self):
+        self._append({"clear": True})
+    
+    def flush(self):
+        # 扫描结束时压缩为新快照，提交到仓库的只有快照中变化的行
+        self.compact()
+    
+    def reload_if_changed(self) -> bool:
+        # 每次操作结束时缓冲的记录都已写入日志，文件变化只可能来自其他进程
+        if self._files_stamp() == self._stamp:
+            return False
+        self.history = self._load_history()
+        self._replay_journal(quiet=True)
+        self._stamp = self._files_stamp()
+        return True
+    
+    def sync(self):
+        # 写入日志但不刷盘，刷盘仍按条数或时间批量进行
+        self._flush_journal(fsync=False)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    last_scan TEXT,
+    findings_count INTEGER NOT NULL DEFAULT 0,
+    info TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_repos_last_scan ON repos (last_scan);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 更新已有记录时保留其 id，导出的 JSON 副本中仓库顺序与旧版本一致（按首次扫描的先后）
+_SQLITE_UPSERT = (
+    "INSERT INTO repos (name, last_scan, findings_count, info) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET last_scan = excluded.last_scan, "
+    "findings_count = excluded.findings_count, info = excluded.info"
+)
+
+
+class SqliteHistoryBackend(HistoryBackend):
+    """SQLite 后端（WAL 模式），可选在 flush 时导出旧版本格式的 JSON 副本"""
+    
+    def __init__(self, db_path: Path, export_file: Optional[Path] = None):
+        """
+        初始化 SQLite 后端
+        
+        Args:
+            db_path: 数据库文件路径
+            export_file: flush 时导出的 JSON 副本路径（None 表示不导出）
+        """
+        self.db_path = Path(db_path)
+        self.export_file = Path(export_file) if export_file is not None else None
+        # 多个扫描线程共用一个连接
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # 多个扫描进程可以共用一个数据库，写入冲突时等待而不是立即失败
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(_SQLITE_SCHEMA)
+        self._dirty = False
+        self._data_version = self._read_data_version()
+    
+    def _read_data_version(self) -> int:
+        """其他连接每次提交后都会变化的数据版本号"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+    
+    def get(self, repo_full_name: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT info FROM repos WHERE name = ?", (repo_full_name,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def put(self, repo_full_name: str, info: Dict):
+        self.put_many([(repo_full_name, info)])
+    
+    def put_many(self, items: Iterable[Tuple[str, Dict]]):
+        rows = [
+            (repo_full_name, info.get("last_scan"), info.get("findings_count", 0), json.dumps(info, ensure_ascii=False))
+            for repo_full_name, info in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_SQLITE_UPSERT, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._dirty = True
+    
+    def delete(self, repo_full_name: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM repos WHERE name = ?", (repo_full_name,))
+            self._dirty = True
+            return cursor.rowcount > 0
+    
+    def contains(self, repo_full_name: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM repos WHERE name = ?", (repo_full_name,)).fetchone() is not None
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        # 分批读取，遍历过程中不长时间持有锁
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, name, info FROM repos WHERE id > ? ORDER BY id LIMIT 1000", (last_id,)
+                ).fetchall()
+            if not rows:
+                return
+            for row_id, repo_full_name, info in rows:
+                yield repo_full_name, json.loads(info)
+            last_id = rows[-1][0]
+    
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+    
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+    
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM repos")
+            self._dirty = True
+    
+    def flush(self):
+        if self.export_file is not None and (self._dirty or not self.export_file.exists()):
+            self.export_json(self.export_file)
+    
+    def reload_if_changed(self) -> bool:
+        # 数据都在数据库中，不需要重新加载；其他进程写入过时 JSON 副本也需要重新导出
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        self._dirty = True
+        return True
+    
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+    
+    def import_json(self, json_file: Path) -> int:
+        """
+        导入旧版本的 JSON 历史记录，同一仓库以最后扫描时间较新的记录为准
+        
+        Args:
+            json_file: JSON 历史记录文件
+            
+        Returns:
+            导入的仓库记录数
+        """
+        with open(json_file, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        repos = history.get("repos", {})
+        
+        rows = [
+            (repo_full_name, info.get("last_scan"), info.get("findings_count", 0), json.dumps(info, ensure_ascii=False))
+            for repo_full_name, info in repos.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_SQLITE_UPSERT + " WHERE excluded.last_scan > repos.last_scan", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        last_updated = history.get("last_updated")
+        if last_updated and last_updated > (self.get_meta("last_updated") or ""):
+            self.set_meta("last_updated", last_updated)
+        # 导入的记录没有计入增量维护的扫描统计，下次查询时重新统计
+        self.set_meta("stats", None)
+        return len(rows)
+    
+    def export_json(self, json_file: Path):
+        """
+        以旧版本格式导出 JSON 副本（逐条写入，先写临时文件再替换）
+        
+        Args:
+            json_file: 导出文件路径
+        """
+        json_file = Path(json_file)
+        tmp_file = json_file.with_suffix(json_file.suffix + '.tmp')
+        count = 0
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write('{\n  "repos": {')
+            for repo_full_name, info in self.items():
+                entry = json.dumps(info, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+                f.write(f'{"," if count else ""}\n    {json.dumps(repo_full_name, ensure_ascii=False)}: {entry}')
+                count += 1
+            f.write('\n  },\n' if count else '},\n')
+            f.write(f'  "total_scanned": {count},\n')
+            f.write(f'  "last_updated": {json.dumps(self.get_meta("last_updated"))}\n}}')
+        tmp_file.replace(json_file)
+        self._dirty = False
+        self.set_meta("json_mtime", json_file.stat().st_mtime)
+
+
+class ShardedHistoryBackend(HistoryBackend):
+    """
+    分片后端：按仓库名哈希前缀把记录分到 <分片目录>/<前缀>.jsonl，每行一个仓库并按仓库名排序，
+    只加载用到的分片、只重写有变化的分片。并发运行的扫描提交历史时由 git 按行合并
+    （merge=union），同一仓库合并出多行时以最后扫描时间较新的一行为准
+    """
+    
+    META_FILE = '_meta.jsonl'
+    
+    def __init__(self, shard_dir: Path, prefix_len: int = HISTORY_SHARD_PREFIX_LEN):
+        """
+        初始化分片后端
+        
+        Args:
+            shard_dir: 分片目录
+            prefix_len: 分片文件名使用的哈希前缀长度（十六进制位数，目录中已有分片时沿用其长度）
+        """
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        existing = self._shard_files()
+        self.prefix_len = len(existing[0].stem) if existing else prefix_len
+        # 多个扫描线程会并发读写
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._dirty = set()
+        self._meta = None
+        self._meta_dirty = False
+        self._stamp = _stamp(self.shard_dir)
+    
+    def _shard_files(self):
+        """目录中已有的分片文件（按前缀排序）"""
+        return sorted(path for path in self.shard_dir.glob('*.jsonl') if path.name != self.META_FILE)
+    
+    def _prefix(self, repo_full_name: str) -> str:
+        """仓库所在分片的哈希前缀"""
+        return hashlib.sha1(repo_full_name.encode('utf-8')).hexdigest()[:self.prefix_len]
+    
+    def _read_lines(self, path: Path) -> Iterator[Dict]:
+        """读取 JSON Lines 文件，跳过无法解析的行（例如合并冲突的残留）"""
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    print(f"⚠️  {path} 中有无法解析的记录，已忽略")
+    
+    def _write_lines(self, path: Path, records: Iterable[Dict]):
+        """写入 JSON Lines 文件（先写临时文件再替换）"""
+        tmp_file = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        tmp_file.replace(path)
+    
+    def _load_shard(self, prefix: str) -> Dict[str, Dict]:
+        """
+        加载分片（已加载的直接返回）
+        
+        Args:
+            prefix: 分片的哈希前缀
+            
+        Returns:
+            仓库全名到扫描信息的映射
+        """
+        shard = self._shards.get(prefix)
+        if shard is not None:
+            return shard
+        
+        shard = {}
+        merged = False
+        for record in self._read_lines(self.shard_dir / f"{prefix}.jsonl"):
+            repo_full_name, info = record["repo"], record["info"]
+            existing = shard.get(repo_full_name)
+            if existing is not None:
+                merged = True
+                if existing.get("last_scan", "") > info.get("last_scan", ""):
+                    continue
+            shard[repo_full_name] = info
+        self._shards[prefix] = shard
+        # git 合并留下的重复行在下次写入时整理（读取时不持有跨进程锁）
+        if merged:
+            self._dirty.add(prefix)
+        return shard
+    
+    def _write_shard(self, prefix: str):
+        """重写一个分片（按仓库名排序，分片为空时删除文件）"""
+        path = self.shard_dir / f"{prefix}.jsonl"
+        shard = self._shards[prefix]
+        self._dirty.discard(prefix)
+        if not shard:
+            if path.exists():
+                path.unlink()
+            return
+        self._write_lines(path, ({"repo": name, "info": shard[name]} for name in sorted(shard)))
+    
+    def _load_meta(self) -> Dict:
+        """
+        加载元数据：同一键合并出多行时取较大的值（例如较新的更新时间），
+        无法比较的值（例如扫描统计）丢弃，由使用方重新计算
+        """
+        if self._meta is None:
+            meta = {}
+            conflicts = set()
+            for record in self._read_lines(self.shard_dir / self.META_FILE):
+                key, value = record["key"], record["value"]
+                if key in meta and meta[key] != value:
+                    try:
+                        value = max(meta[key], value)
+                    except TypeError:
+                        conflicts.add(key)
+                meta[key] = value
+            for key in conflicts:
+                del meta[key]
+            self._meta = meta
+        return self._meta
+    
+    def get(self, repo_full_name: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load_shard(self._prefix(repo_full_name)).get(repo_full_name)
+    
+    def put(self, repo_full_name: str, info: Dict):
+        self.put_many([(repo_full_name, info)])
+    
+    def put_many(self, items: Iterable[Tuple[str, Dict]]):
+        with self._lock:
+            dirty = set()
+            for repo_full_name, info in items:
+                prefix = self._prefix(repo_full_name)
+                self._load_shard(prefix)[repo_full_name] = info
+                dirty.add(prefix)
+            for prefix in sorted(dirty):
+                self._write_shard(prefix)
+    
+    def delete(self, repo_full_name: str) -> bool:
+        with self._lock:
+            prefix = self._prefix(repo_full_name)
+            shard = self._load_shard(prefix)
+            if repo_full_name not in shard:
+                return False
+            del shard[repo_full_name]
+            self._write_shard(prefix)
+            return True
+    
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        for path in self._shard_files():
+            with self._lock:
+                shard = dict(self._load_shard(path.stem))
+            for repo_full_name in sorted(shard):
+                yield repo_full_name, shard[repo_full_name]
+    
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(self._load_shard(path.stem)) for path in self._shard_files())
+    
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            return self._load_meta().get(key, default)
+    
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._load_meta()[key] = value
+            self._meta_dirty = True
+    
+    def clear(self):
+        with self._lock:
+            for path in self._shard_files():
+                path.unlink()
+            self._shards = {}
+            self._dirty = set()
+            self.flush()
+    
+    def flush(self):
+        self.sync()
+    
+    def reload_if_changed(self) -> bool:
+        # 任何进程替换或删除分片都会改变目录的修改时间，此时丢弃缓存的分片，按需重新加载
+        with self._lock:
+            if _stamp(self.shard_dir) == self._stamp:
+                return False
+            self._shards = {}
+            self._dirty = set()
+            self._meta = None
+            self._meta_dirty = False
+            self._stamp = _stamp(self.shard_dir)
+            return True
+    
+    def sync(self):
+        with self._lock:
+            for prefix in sorted(self._dirty):
+                self._write_shard(prefix)
+            if self._meta_dirty:
+                meta = self._meta
+                self._write_lines(self.shard_dir / self.META_FILE,
+                                  ({"key": key, "value": meta[key]} for key in sorted(meta)))
+                self._meta_dirty = False
+            self._stamp = _stamp(self.shard_dir)
+    
+    def import_json(self, json_file: Path) -> int:
+        """
+        导入旧版本的 JSON 历史记录，同一仓库以最后扫描时间较新的记录为准
+        
+        Args:
+            json_file: JSON 历史记录文件
+            
+        Returns:
+            导入的仓库记录数
+        """
+        with open(json_file, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        repos = history.get("repos", {})
+        
+        with self._lock:
+            newer = []
+            for repo_full_name, info in repos.items():
+                existing = self.get(repo_full_name)
+                if existing is None or info.get("last_scan", "") > existing.get("last_scan", ""):
+                    newer.append((repo_full_name, info))
+            self.put_many(newer)
+            
+            last_updated = history.get("last_updated")
+            if last_updated and last_updated > (self.get_meta("last_updated") or ""):
+                self.set_meta("last_updated", last_updated)
+            # 导入的记录没有计入增量维护的扫描统计，下次查询时重新统计
+            self.set_meta("stats", None)
+            self.flush()
+        return len(repos)
+
+
+def backend_files(kind: str, history_file: Path) -> Tuple[Path, ...]:
+    """
+    后端保存记录的文件（用于判断成员索引是否过期）
+    
+    Args:
+        kind: 后端类型 (json/journal/sqlite/sharded)
+        history_file: JSON 历史记录文件路径
+        
+    Returns:
+        文件路径元组
+    """
+    history_file = Path(history_file)
+    if kind == 'journal':
+        return history_file, history_file.with_suffix('.journal')
+    if kind == 'sqlite':
+        return history_file.with_suffix('.db'),
+    if kind == 'sharded':
+        return history_file.parent / 'shards',
+    return history_file,
+
+
+def open_history_backend(kind: str, history_file: Path, export_json: bool = True) -> HistoryBackend:
+    """
+    打开扫描历史存储后端
+    
+    sqlite 后端的数据库与 JSON 文件位于同一目录（扩展名为 .db）；
+    JSON 文件比数据库中记录的版本更新时（例如首次切换后端，或拉取了其他机器提交的历史），
+    先把 JSON 中的记录导入数据库。sharded 后端的分片位于同一目录的 shards 子目录，
+    还没有任何分片时先导入 JSON 文件中的记录
+    
+    Args:
+        kind: 后端类型 (json/journal/sqlite/sharded)
+        history_file: JSON 历史记录文件路径
+        export_json: sqlite 后端是否在 flush 时导出 JSON 副本
+        
+    Returns:
+        存储后端
+        
+    Raises:
+        ValueError: 后端类型不支持
+    """
+    history_file = Path(history_file)
+    if kind == 'json':
+        return JsonHistoryBackend(history_file)
+    if kind == 'journal':
+        return JournalHistoryBackend(history_file)
+    if kind == 'sharded':
+        backend = ShardedHistoryBackend(history_file.parent / 'shards')
+        if history_file.exists() and not backend._shard_files():
+            try:
+                imported = backend.import_json(history_file)
+                print(f"📥 已从 {history_file} 导入 {imported} 条扫描历史到 {backend.shard_dir}"
+                      f"（之后只更新分片，{history_file.name} 不再更新）")
+            except Exception as e:
+                print(f"⚠️  导入扫描历史失败: {e}")
+        return backend
+    if kind != 'sqlite':
+        raise ValueError(f"不支持的扫描历史后端: {kind}（可选: {', '.join(HISTORY_BACKENDS)}）")
+    
+    backend = SqliteHistoryBackend(history_file.with_suffix('.db'), history_file if export_json else None)
+    if history_file.exists() and history_file.stat().st_mtime > backend.get_meta("json_mtime", 0):
+        try:
+            imported = backend.import_json(history_file)
+            backend.set_meta("json_mtime", history_file.stat().st_mtime)
+            print(f"📥 已从 {history_file} 导入 {imported} 条扫描历史到 {backend.db_path}")
+        except Exception as e:
+            print(f"⚠️  导入扫描历史失败: {e}")
+    return backend
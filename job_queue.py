@@ -0,0 +1,236 @@
+"""
+扫描任务队列模块 - 基于 SQLite 的持久化任务队列，支持优先级、失败重试和排队任务去重
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config import JOB_QUEUE_DB, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS
+
+# 支持的任务类型
+JOB_KINDS = ('user', 'org', 'repo', 'auto')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL DEFAULT '',
+    options TEXT NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    report_path TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, id);
+-- 同一目标在排队或运行中只保留一个任务
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_target
+    ON jobs (kind, target) WHERE status IN ('queued', 'running');
+"""
+
+
+class JobQueue:
+    """持久化扫描任务队列"""
+    
+    def __init__(self, db_path: str = JOB_QUEUE_DB, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """
+        初始化任务队列
+        
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_attempts: 任务最多尝试次数（含首次执行）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        # 服务主循环和 HTTP 入队线程共用一个连接
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def enqueue(self, kind: str, target: str = "", priority: int = 0,
+                options: Optional[Dict] = None) -> Tuple[int, bool]:
+        """
+        添加扫描任务，同一目标已在排队时不重复添加（优先级取较高者）
+        
+        Args:
+            kind: 任务类型 (user/org/repo/auto)
+            target: 扫描目标（用户名、组织名或仓库全名，auto 任务为空）
+            priority: 优先级，数值越大越先执行
+            options: 任务参数（例如 auto 任务的 max_repos）
+            
+        Returns:
+            (任务ID, 是否新建)
+            
+        Raises:
+            ValueError: 任务类型不支持或缺少扫描目标
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"不支持的任务类型: {kind}")
+        if kind != 'auto' and not target:
+            raise ValueError(f"{kind} 任务需要指定扫描目标")
+        
+        now = self._now()
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (kind, target, options, priority, max_attempts, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kind, target, json.dumps(options or {}), priority, self.max_attempts, now, now)
+                )
+                return cursor.lastrowid, True
+            except sqlite3.IntegrityError:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE kind = ? AND target = ? AND status IN ('queued', 'running')",
+                    (kind, target)
+                ).fetchone()
+                self._conn.execute(
+                    "UPDATE jobs SET priority = MAX(priority, ?), updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (priority, now, row['id'])
+                )
+                return row['id'], False
+    
+    def claim(self) -> Optional[Dict]:
+        """
+        取出优先级最高的可执行任务并标记为运行中
+        
+        Returns:
+            任务信息，没有可执行任务时返回 None
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (time.time(),)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (self._now(), row['id'])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        job = self._row_to_dict(row)
+        job['attempts'] += 1
+        return job
+    
+    def complete(self, job_id: int, report_path: Optional[str] = None):
+        """
+        标记任务完成
+        
+        Args:
+            job_id: 任务ID
+            report_path: 报告文件路径
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', report_path = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (report_path, self._now(), job_id)
+            )
+    
+    def fail(self, job_id: int, error: str) -> bool:
+        """
+        标记任务执行失败，未超过最多尝试次数时延迟后重新排队
+        
+        Args:
+            job_id: 任务ID
+            error: 错误信息
+            
+        Returns:
+            是否会重试
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            retry = row is not None and row['attempts'] < row['max_attempts']
+            if retry:
+                # 指数退避
+                delay = JOB_RETRY_BACKOFF_SECONDS * (2 ** (row['attempts'] - 1))
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', not_before = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (time.time() + delay, error, self._now(), job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                    (error, self._now(), job_id)
+                )
+            return retry
+    
+    def release(self, job_id: int):
+        """
+        把被中断（例如服务关闭）而未执行完的任务放回队列，不计入尝试次数
+        
+        Args:
+            job_id: 任务ID
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (self._now(), job_id)
+            )
+    
+    def requeue_stale(self) -> int:
+        """
+        服务启动时把上次异常退出时仍在运行的任务重新排队
+        
+        Returns:
+            重新排队的任务数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (self._now(),)
+            )
+            return cursor.rowcount
+    
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """
+        列出任务（最新的在前）
+        
+        Args:
+            status: 只列出指定状态的任务
+            limit: 最多返回数量
+            
+        Returns:
+            任务信息列表
+        """
+        with self._lock:
+            if status:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+    
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        """数据库行转换为任务信息字典"""
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+    
+    def _now(self) -> str:
+        """当前时间字符串"""
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
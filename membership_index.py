@@ -0,0 +1,245 @@
+"""
+已扫描仓库成员索引 - 布隆过滤器 + 排序的 64 位仓库名哈希数组（附带上次扫描时的推送时间和扫描时间），
+通过 mmap 加载，无需解析完整的扫描历史即可判断仓库是否已扫描、之后是否有新的推送
+"""
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+# 文件头: 魔数, 版本, 历史文件状态戳 (4 个整数), 布隆过滤器位数, 哈希函数个数, 仓库数
+_HEADER = struct.Struct('<4sI4QQQQ')
+_MAGIC = b'AKMI'
+_VERSION = 2
+
+
+def name_hash(repo_full_name: str) -> int:
+    """
+    计算仓库全名的 64 位哈希（blake2b，与进程和 Python 哈希随机化无关）
+    
+    Args:
+        repo_full_name: 仓库全名 (owner/repo)
+        
+    Returns:
+        64 位无符号整数
+    """
+    digest = hashlib.blake2b(repo_full_name.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def file_stamp(*paths: Path) -> Tuple[int, ...]:
+    """
+    计算历史文件的状态戳（大小和修改时间），用于判断索引是否过期
+    
+    Args:
+        *paths: 历史文件路径（最多两个，例如快照和日志）
+        
+    Returns:
+        4 个整数组成的状态戳，不存在的文件记为 0
+    """
+    stamp = []
+    for path in paths[:2]:
+        try:
+            stat = os.stat(path)
+            stamp.extend((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.extend((0, 0))
+    stamp.extend([0] * (4 - len(stamp)))
+    return tuple(stamp)
+
+
+class MembershipIndex:
+    """仓库成员索引：布隆过滤器快速排除未扫描的仓库，排序哈希数组二分查找确认，
+    与哈希数组平行的两个数组记录上次扫描时的推送时间和扫描时间（Unix 时间戳，0 表示未知）"""
+    
+    # 每个仓库占用的布隆过滤器位数和哈希函数个数（误判率约 1%，误判由哈希数组确认）
+    BITS_PER_ITEM = 10
+    NUM_HASHES = 7
+    
+    def __init__(self, stamp: Tuple[int, ...], bloom, hashes, pushed, scanned, bloom_bits: int, num_hashes: int):
+        """
+        初始化成员索引（请使用 build 或 load 创建）
+        
+        Args:
+            stamp: 构建索引时历史文件的状态戳
+            bloom: 布隆过滤器位图（bytes 或内存映射的视图）
+            hashes: 排序的 64 位哈希数组（array('Q') 或内存映射的视图）
+            pushed: 各仓库上次扫描时的推送时间
+            scanned: 各仓库的上次扫描时间
+            bloom_bits: 布隆过滤器位数
+            num_hashes: 哈希函数个数
+        """
+        self.stamp = tuple(stamp)
+        self._bloom = bloom
+        self._hashes = hashes
+        self._pushed = pushed
+        self._scanned = scanned
+        self._bloom_bits = bloom_bits
+        self._num_hashes = num_hashes
+        # 加载后新标记的仓库: 仓库全名 -> (推送时间, 扫描时间)
+        self._added = {}
+        self._mmap = None
+        self._view = None
+        self._columns = None
+    
+    @property
+    def count(self) -> int:
+        """索引中的仓库数"""
+        return len(self._hashes) + len(self._added)
+    
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, int, int]], stamp: Tuple[int, ...]) -> 'MembershipIndex':
+        """
+        从扫描记录构建索引
+        
+        Args:
+            entries: (仓库全名, 推送时间, 扫描时间) 迭代器
+            stamp: 历史文件的状态戳
+            
+        Returns:
+            成员索引
+        """
+        return cls._from_hashes({name_hash(name): (pushed, scanned) for name, pushed, scanned in entries}, stamp)
+    
+    @classmethod
+    def _from_hashes(cls, values: Dict[int, Tuple[int, int]], stamp: Tuple[int, ...]) -> 'MembershipIndex':
+        """从仓库名哈希到 (推送时间, 扫描时间) 的映射构建索引"""
+        keys = sorted(values)
+        hashes = array('Q', keys)
+        pushed = array('Q', (values[key][0] for key in keys))
+        scanned = array('Q', (values[key][1] for key in keys))
+        # 位数向上取整到 64 的倍数，保证哈希数组在文件中 8 字节对齐
+        bloom_bits = max(64, (len(hashes) * cls.BITS_PER_ITEM + 63) // 64 * 64)
+        bloom = bytearray(bloom_bits // 8)
+        for value in hashes:
+            for position in cls._positions(value, bloom_bits, cls.NUM_HASHES):
+                bloom[position >> 3] |= 1 << (position & 7)
+        return cls(stamp, bytes(bloom), hashes, pushed, scanned, bloom_bits, cls.NUM_HASHES)
+    
+    @classmethod
+    def load(cls, index_file: Path) -> Optional['MembershipIndex']:
+        """
+        通过 mmap 加载索引文件
+        
+        Args:
+            index_file: 索引文件路径
+            
+        Returns:
+            成员索引，文件不存在或格式不正确时返回 None
+        """
+        try:
+            with open(index_file, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        
+        view = memoryview(mapped)
+        try:
+            magic, version, *rest = _HEADER.unpack_from(view)
+            stamp, (bloom_bits, num_hashes, count) = rest[:4], rest[4:]
+            bloom_end = _HEADER.size + bloom_bits // 8
+            if magic != _MAGIC or version != _VERSION or len(view) != bloom_end + count * 24:
+                raise ValueError("索引文件格式不正确")
+        except (struct.error, ValueError):
+            view.release()
+            mapped.close()
+            return None
+        
+        columns = view[bloom_end:].cast('Q')
+        index = cls(stamp, view[_HEADER.size:bloom_end], columns[:count], columns[count:2 * count],
+                    columns[2 * count:], bloom_bits, num_hashes)
+        index._columns = columns
+        index._mmap = mapped
+        index._view = view
+        return index
+    
+    def save(self, index_file: Path):
+        """
+        保存索引文件（先写临时文件再替换）
+        
+        Args:
+            index_file: 索引文件路径
+        """
+        index_file = Path(index_file)
+        index = self
+        if self._added:
+            values = dict(zip(self._hashes, zip(self._pushed, self._scanned)))
+            values.update((name_hash(name), stamps) for name, stamps in self._added.items())
+            index = self._from_hashes(values, self.stamp)
+        
+        tmp_file = index_file.with_suffix(index_file.suffix + '.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, *index.stamp, index._bloom_bits, index._num_hashes,
+                                 len(index._hashes)))
+            f.write(index._bloom)
+            for column in (index._hashes, index._pushed, index._scanned):
+                f.write(column.tobytes() if isinstance(column, array) else bytes(column))
+        tmp_file.replace(index_file)
+    
+    def contains(self, repo_full_name: str) -> bool:
+        """
+        仓库是否在索引中
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            
+        Returns:
+            True 如果已扫描
+        """
+        return self.lookup(repo_full_name) is not None
+    
+    def lookup(self, repo_full_name: str) -> Optional[Tuple[int, int]]:
+        """
+        查询仓库上次扫描时的推送时间和扫描时间
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            
+        Returns:
+            (推送时间, 扫描时间) Unix 时间戳，未扫描过时返回 None
+        """
+        stamps = self._added.get(repo_full_name)
+        if stamps is not None:
+            return stamps
+        value = name_hash(repo_full_name)
+        for position in self._positions(value, self._bloom_bits, self._num_hashes):
+            if not self._bloom[position >> 3] & (1 << (position & 7)):
+                return None
+        i = bisect.bisect_left(self._hashes, value)
+        if i < len(self._hashes) and self._hashes[i] == value:
+            return self._pushed[i], self._scanned[i]
+        return None
+    
+    def add(self, repo_full_name: str, pushed: int = 0, scanned: int = 0):
+        """
+        加入新标记为已扫描的仓库
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            pushed: 扫描时的推送时间（Unix 时间戳，0 表示未知）
+            scanned: 扫描时间（Unix 时间戳）
+        """
+        self._added[repo_full_name] = (pushed, scanned)
+    
+    def close(self):
+        """释放内存映射"""
+        if self._mmap is not None:
+            self._bloom.release()
+            self._hashes.release()
+            self._pushed.release()
+            self._scanned.release()
+            self._columns.release()
+            self._view.release()
+            self._mmap.close()
+            self._mmap = None
+    
+    @staticmethod
+    def _positions(value: int, bloom_bits: int, num_hashes: int):
+        """由 64 位哈希的高低两半通过双重哈希得到各哈希函数的位置"""
+        low, high = value & 0xFFFFFFFF, value >> 32
+        for i in range(num_hashes):
+            yield (low + i * high) % bloom_bits
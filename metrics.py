@@ -0,0 +1,188 @@
+"""
+运行指标模块 - 线程安全的计数器/仪表/耗时统计，
+扫描结束时输出 JSON 摘要和 Prometheus 文本格式（node_exporter textfile）
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from config import METRICS_DIR
+
+# Prometheus 指标名前缀
+_PREFIX = "aikey_scanner_"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+    
+    def reset(self):
+        """清空所有指标（每次扫描开始时调用）"""
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timings = {}
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        计数器累加
+        
+        Args:
+            name: 指标名
+            value: 增量
+            **labels: 标签
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        设置仪表当前值
+        
+        Args:
+            name: 指标名
+            value: 当前值
+            **labels: 标签
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+    
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        记录一次耗时
+        
+        Args:
+            name: 指标名
+            seconds: 耗时（秒）
+            **labels: 标签
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        统计代码块耗时
+        
+        Args:
+            name: 指标名
+            **labels: 标签
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+    
+    def snapshot(self) -> Dict:
+        """
+        获取所有指标的快照
+        
+        Returns:
+            {"counters": {...}, "gauges": {...}, "timings": {...}}，
+            每个指标名对应一个 [{"labels": {...}, ...}] 列表
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {key: list(value) for key, value in self._timings.items()}
+        
+        result = {"counters": {}, "gauges": {}, "timings": {}}
+        for (name, labels), value in sorted(counters.items()):
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), value in sorted(gauges.items()):
+            result["gauges"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), (count, total, maximum) in sorted(timings.items()):
+            result["timings"].setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": count,
+                "sum_seconds": round(total, 6),
+                "max_seconds": round(maximum, 6),
+            })
+        return result
+    
+    def write(self, output_dir: str = METRICS_DIR, summary: Optional[Dict] = None) -> Tuple[str, str]:
+        """
+        输出 JSON 摘要和 Prometheus 文本文件
+        
+        Args:
+            output_dir: 输出目录
+            summary: 附加到 JSON 中的扫描摘要（报告路径、发现数量等）
+            
+        Returns:
+            (JSON 文件路径, Prometheus 文件路径)
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = self.snapshot()
+        
+        json_path = output_dir / "metrics.json"
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "summary": summary or {},
+                **snapshot,
+            }, f, indent=2, ensure_ascii=False)
+        
+        # 先写临时文件再替换，避免 node_exporter 读到写了一半的文件
+        prom_path = output_dir / "scanner.prom"
+        tmp_path = output_dir / "scanner.prom.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self._format_prometheus(snapshot))
+        tmp_path.replace(prom_path)
+        
+        return str(json_path), str(prom_path)
+    
+    def _format_prometheus(self, snapshot: Dict) -> str:
+        """把快照格式化为 Prometheus 文本格式"""
+        lines = []
+        for name, samples in snapshot["counters"].items():
+            lines.append(f"# TYPE {_PREFIX}{name} counter")
+            for sample in samples:
+                lines.append(f"{_PREFIX}{name}{self._format_labels(sample['labels'])} {sample['value']}")
+        for name, samples in snapshot["gauges"].items():
+            lines.append(f"# TYPE {_PREFIX}{name} gauge")
+            for sample in samples:
+                lines.append(f"{_PREFIX}{name}{self._format_labels(sample['labels'])} {sample['value']}")
+        for name, samples in snapshot["timings"].items():
+            lines.append(f"# TYPE {_PREFIX}{name} summary")
+            for sample in samples:
+                labels = self._format_labels(sample['labels'])
+                lines.append(f"{_PREFIX}{name}_count{labels} {sample['count']}")
+                lines.append(f"{_PREFIX}{name}_sum{labels} {sample['sum_seconds']}")
+        return "\n".join(lines) + "\n"
+    
+    def _format_labels(self, labels: Dict) -> str:
+        """格式化 Prometheus 标签（转义反斜杠、引号和换行）"""
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+    
+    def _key(self, name: str, labels: Dict) -> Tuple:
+        """指标名和标签组成的键"""
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
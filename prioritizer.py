@@ -0,0 +1,206 @@
+"""
+扫描优先级模块 - 按泄露可能性对文件排序，并应用单仓库扫描预算；
+按新鲜度和泄露可能性对待扫描仓库排序
+"""
+import fnmatch
+import heapq
+import math
+import os
+from datetime import datetime, timezone
+from typing import List, Dict, Tuple, Iterable, Iterator, Optional, Set
+from config import (
+    HIGH_PRIORITY_FILE_PATTERNS, MEDIUM_PRIORITY_EXTENSIONS, LOW_PRIORITY_DIRS,
+    MAX_FILES_PER_REPO, MAX_BYTES_PER_REPO, MAX_FILE_SIZE_BYTES,
+    REPO_PRIORITY_WINDOW, REPO_PRIORITY_INITIAL_WINDOW, REPO_FRESHNESS_HALF_LIFE_DAYS
+)
+
+
+class FilePrioritizer:
+    """文件优先级排序器"""
+    
+    # 优先级分层，数值越小越先扫描
+    TIER_HIGH = 0
+    TIER_MEDIUM = 1
+    TIER_NORMAL = 2
+    TIER_LOW = 3
+    
+    def __init__(self,
+                 max_files: int = MAX_FILES_PER_REPO,
+                 max_bytes: int = MAX_BYTES_PER_REPO,
+                 max_file_size: int = MAX_FILE_SIZE_BYTES):
+        """
+        初始化文件优先级排序器
+        
+        Args:
+            max_files: 单仓库最多扫描的文件数（0 表示不限制）
+            max_bytes: 单仓库最多扫描的字节数（0 表示不限制）
+            max_file_size: 单个文件大小上限（0 表示不限制）
+        """
+        self.high_patterns = HIGH_PRIORITY_FILE_PATTERNS
+        self.medium_extensions = MEDIUM_PRIORITY_EXTENSIONS
+        self.low_dirs = set(LOW_PRIORITY_DIRS)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+    
+    def get_tier(self, file_path: str) -> int:
+        """
+        计算文件的优先级层级
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            优先级层级（越小越优先）
+        """
+        path_parts = file_path.lower().split('/')
+        file_name = path_parts[-1]
+        
+        # 测试夹具和 vendored 代码最后扫描
+        if any(part in self.low_dirs for part in path_parts[:-1]):
+            return self.TIER_LOW
+        
+        for pattern in self.high_patterns:
+            if fnmatch.fnmatch(file_name, pattern):
+                return self.TIER_HIGH
+        
+        if os.path.splitext(file_name)[1] in self.medium_extensions:
+            return self.TIER_MEDIUM
+        
+        return self.TIER_NORMAL
+    
+    def prioritize(self, files: List[Dict], first_paths: Optional[Set[str]] = None) -> List[Dict]:
+        """
+        按泄露可能性对文件排序（同层级内小文件优先）
+        
+        Args:
+            files: 文件信息列表（需包含 path，可选 size）
+            first_paths: 排在最前面的文件路径（例如代码搜索命中的文件）
+            
+        Returns:
+            排序后的文件列表
+        """
+        first_paths = first_paths or set()
+        return sorted(
+            files,
+            key=lambda f: (f['path'] not in first_paths, self.get_tier(f['path']), f.get('size') or 0, f['path'])
+        )
+    
+    def apply_budget(self, files: List[Dict]) -> Tuple[List[Dict], int, int]:
+        """
+        按预算截取文件列表，预算耗尽后停止
+        
+        Args:
+            files: 已排序的文件信息列表
+            
+        Returns:
+            (预算内的文件列表, 因预算耗尽被跳过的文件数量, 因超过单文件大小上限被跳过的文件数量)；
+            超过单文件大小上限的文件总是跳过，不计入预算，也不使仓库成为部分扫描
+        """
+        # 单个文件过大，直接跳过
+        scannable = [
+            file_info for file_info in files
+            if not (self.max_file_size and (file_info.get('size') or 0) > self.max_file_size)
+        ]
+        
+        selected = []
+        total_bytes = 0
+        for file_info in scannable:
+            size = file_info.get('size') or 0
+            if self.max_files and len(selected) >= self.max_files:
+                break
+            if self.max_bytes and total_bytes + size > self.max_bytes:
+                break
+            
+            selected.append(file_info)
+            total_bytes += size
+        
+        return selected, len(scannable) - len(selected), len(files) - len(scannable)
+
+
+class RepoPrioritizer:
+    """仓库优先级排序器：最近推送、体积小、非 fork、搜索命中高危文件的仓库先扫描"""
+    
+    # 各项得分权重
+    FRESHNESS_WEIGHT = 3.0
+    HIGH_RISK_HIT_WEIGHT = 2.0
+    FORK_PENALTY = 1.0
+    SIZE_WEIGHT = 0.25
+    
+    def __init__(self,
+                 window: int = REPO_PRIORITY_WINDOW,
+                 half_life_days: float = REPO_FRESHNESS_HALF_LIFE_DAYS,
+                 initial_window: int = REPO_PRIORITY_INITIAL_WINDOW):
+        """
+        初始化仓库优先级排序器
+        
+        Args:
+            window: 排序窗口大小，惰性枚举时最多缓冲的仓库数（0 表示保持原顺序）
+            half_life_days: 新鲜度半衰期（天）
+            initial_window: 惰性枚举时的初始窗口大小，之后逐步增大到 window
+        """
+        self.window = window
+        self.initial_window = initial_window
+        self.half_life_days = half_life_days
+        self.file_prioritizer = FilePrioritizer()
+    
+    def score(self, repo: Dict) -> float:
+        """
+        计算仓库的扫描优先级得分
+        
+        Args:
+            repo: 仓库信息（可选 pushed_at/updated_at、size、fork、search_hits）
+            
+        Returns:
+            得分（越大越先扫描）
+        """
+        score = 0.0
+        
+        # 新鲜度：最近推送的仓库中泄露的密钥最可能仍然有效，每过一个半衰期得分减半
+        last_active = repo.get('pushed_at') or repo.get('updated_at')
+        if isinstance(last_active, datetime):
+            if last_active.tzinfo is None:
+                last_active = last_active.replace(tzinfo=timezone.utc)
+            age_days = max(0.0, (datetime.now(timezone.utc) - last_active).total_seconds() / 86400)
+            score += self.FRESHNESS_WEIGHT * 0.5 ** (age_days / self.half_life_days)
+        
+        # 代码搜索命中了 .env、config.* 等高危文件
+        for hit in repo.get('search_hits', []):
+            if self.file_prioritizer.get_tier(hit['path']) == FilePrioritizer.TIER_HIGH:
+                score += self.HIGH_RISK_HIT_WEIGHT
+                break
+        
+        if repo.get('fork'):
+            score -= self.FORK_PENALTY
+        
+        # 体积越大扫描越慢（size 单位为 KB）
+        score -= self.SIZE_WEIGHT * math.log10(1 + (repo.get('size') or 0))
+        
+        return score
+    
+    def order(self, repos: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        按得分从高到低输出仓库；在滑动窗口内排序，窗口从 initial_window 开始逐步增大到 window，
+        惰性枚举到前几个仓库就能开始扫描，不必等待枚举出整个窗口
+        
+        Args:
+            repos: 仓库信息迭代器
+            
+        Yields:
+            仓库信息
+        """
+        if self.window <= 0:
+            yield from repos
+            return
+        
+        heap = []
+        capacity = max(1, min(self.initial_window, self.window))
+        for seq, repo in enumerate(repos):
+            heapq.heappush(heap, (-self.score(repo), seq, repo))
+            if len(heap) >= capacity:
+                yield heapq.heappop(heap)[2]
+                # 每输出一个仓库窗口增大 1，之后每枚举两个仓库输出一个，直到达到 window
+                capacity = min(self.window, capacity + 1)
+        
+        while heap:
+            yield heapq.heappop(heap)[2]
@@ -0,0 +1,180 @@
+"""
+性能剖析模块 - 用 cProfile（覆盖所有扫描线程）、栈采样和 tracemalloc 剖析一次扫描，
+输出各阶段耗时、火焰图折叠栈和内存分配热点
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+from config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_SECONDS
+
+# 扫描各阶段对应的函数 (阶段, 所在文件, 函数名)；同名函数（例如各历史后端的 flush）按文件区分
+PROFILE_STAGES = [
+    ('枚举文件', 'github_scanner.py', 'get_repo_tree'),
+    ('获取内容', 'github_scanner.py', 'get_blob_content'),
+    ('获取内容', 'github_scanner.py', 'get_file_content'),
+    ('检测密钥', 'secret_detector.py', 'detect_secrets_in_text'),
+    ('记录历史', 'scan_history.py', 'mark_as_scanned'),
+    ('历史落盘', 'scan_history.py', 'flush'),
+    ('写入报告', 'report_generator.py', 'add_repo_findings'),
+]
+
+
+class ScanProfiler:
+    """扫描性能剖析器"""
+    
+    def __init__(self, output_dir: str = PROFILE_DIR,
+                 sample_interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS):
+        """
+        初始化性能剖析器
+        
+        Args:
+            output_dir: 剖析结果输出目录
+            sample_interval: 栈采样间隔（秒）
+        """
+        self.output_dir = Path(output_dir)
+        self.sample_interval = sample_interval
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._sample_count = 0
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._start_time = None
+    
+    def start(self):
+        """开始剖析（在主线程中调用）"""
+        self._start_time = time.time()
+        tracemalloc.start(10)
+        
+        # 主线程直接启用 cProfile；之后创建的线程在第一次回调时各自启用一个 cProfile
+        main_profile = cProfile.Profile()
+        self._profiles.append(main_profile)
+        threading.setprofile(self._thread_profile_hook)
+        main_profile.enable()
+        
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        print(f"🔬 性能剖析已开启（采样间隔 {self.sample_interval * 1000:.0f}ms）")
+    
+    def stop(self) -> str:
+        """
+        停止剖析并输出结果
+        
+        Returns:
+            剖析结果目录
+        """
+        self._profiles[0].disable()
+        threading.setprofile(None)
+        self._stop_event.set()
+        self._sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        elapsed = time.time() - self._start_time
+        
+        run_dir = self.output_dir / datetime.now().strftime("profile_%Y%m%d_%H%M%S")
+        run_dir.mkdir(parents=True, exist_ok=True)
+        
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(str(run_dir / "profile.pstats"))
+        
+        with open(run_dir / "stacks.collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        
+        with open(run_dir / "summary.txt", 'w', encoding='utf-8') as f:
+            f.write(self._format_summary(stats, snapshot, elapsed, len(profiles)))
+        
+        print(f"🔬 性能剖析结果已保存至: {run_dir}")
+        print(f"   火焰图: flamegraph.pl {run_dir / 'stacks.collapsed'} > flame.svg")
+        return str(run_dir)
+    
+    def _thread_profile_hook(self, frame, event, arg):
+        """新线程的第一次 profile 回调：为该线程创建并启用独立的 cProfile"""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        # enable() 会替换当前线程的 profile 回调，此函数之后不再被调用
+        profile.enable()
+    
+    def _sample_loop(self):
+        """定期采样所有线程的调用栈，生成火焰图折叠栈"""
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.sample_interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                # 同一阶段的多个工作线程合并显示（fetch-0、fetch-1 → fetch）
+                thread_name = thread_names.get(thread_id, str(thread_id)).rsplit('-', 1)[0]
+                stack.append(thread_name)
+                self._stacks[';'.join(reversed(stack))] += 1
+            self._sample_count += 1
+    
+    def _stage_samples(self) -> Dict[str, int]:
+        """统计调用栈中包含各阶段函数的采样数"""
+        counts = {}
+        for _, file_name, function_name in PROFILE_STAGES:
+            marker = f";{function_name} ({file_name})"
+            counts[(file_name, function_name)] = sum(count for stack, count in self._stacks.items() if marker in stack)
+        return counts
+    
+    def _format_summary(self, stats: pstats.Stats, snapshot, elapsed: float, thread_count: int) -> str:
+        """
+        生成剖析摘要
+        
+        Args:
+            stats: 合并后的 cProfile 统计
+            snapshot: tracemalloc 快照
+            elapsed: 剖析总耗时（秒）
+            thread_count: 被剖析的线程数
+            
+        Returns:
+            摘要文本
+        """
+        lines: List[str] = []
+        lines.append(f"剖析耗时: {elapsed:.1f} 秒，线程数: {thread_count}，采样次数: {self._sample_count}")
+        lines.append("")
+        
+        # 各阶段: cProfile 累计耗时为所有线程之和，采样数反映该阶段在墙钟时间内的线程占用
+        lines.append("各阶段耗时（累计耗时为所有线程之和）:")
+        lines.append(f"  {'阶段':<8} {'函数':<26} {'调用次数':>10} {'累计耗时(s)':>12} {'栈采样数':>10}")
+        stage_samples = self._stage_samples()
+        for stage_name, file_name, function_name in PROFILE_STAGES:
+            calls, cumtime = 0, 0.0
+            for (filename, lineno, name), stat in stats.stats.items():
+                if name == function_name and os.path.basename(filename) == file_name:
+                    calls += stat[1]
+                    cumtime += stat[3]
+            lines.append(f"  {stage_name:<8} {function_name:<26} {calls:>10} {cumtime:>12.3f} "
+                         f"{stage_samples[(file_name, function_name)]:>10}")
+        lines.append("")
+        
+        lines.append("累计耗时最高的函数:")
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(25)
+        lines.append(stream.getvalue())
+        
+        lines.append("内存分配热点:")
+        for stat in snapshot.statistics('lineno')[:20]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size / 1024:>10.1f} KiB {stat.count:>8} 次  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,345 @@
+"""
+机器可读的报告格式 - 与文本报告同时输出的 JSONL 发现流、SARIF 文件和 .summary.json 汇总，
+供 CI、告警 Issue 和 SIEM 直接读取，无需解析文本报告
+"""
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import quote
+from scan_checkpoint import redact_finding
+
+# 支持的报告格式（text 为原有的文本报告）
+REPORT_FORMATS = ('text', 'jsonl', 'sarif', 'summary')
+
+_SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+_SARIF_LEVELS = {'high': 'error', 'medium': 'warning', 'low': 'note'}
+
+
+def parse_report_formats(spec: str) -> List[str]:
+    """
+    解析报告格式参数
+    
+    Args:
+        spec: 逗号分隔的格式列表，例如 text,jsonl,sarif,summary
+        
+    Returns:
+        去重后的格式列表
+        
+    Raises:
+        ValueError: 包含不支持的格式或为空
+    """
+    formats = []
+    for name in spec.split(','):
+        name = name.strip().lower()
+        if not name or name in formats:
+            continue
+        if name not in REPORT_FORMATS:
+            raise ValueError(f"不支持的报告格式: {name}（可选: {', '.join(REPORT_FORMATS)}）")
+        formats.append(name)
+    if not formats:
+        raise ValueError("请至少指定一种报告格式")
+    return formats
+
+
+def rule_id(pattern: str) -> str:
+    """
+    检测规则的稳定 ID（由正则表达式的哈希得到，规则顺序变化时不变）
+    
+    Args:
+        pattern: 检测规则的正则表达式
+        
+    Returns:
+        规则 ID，例如 secret-3f2a9c1b
+    """
+    return 'secret-' + hashlib.sha1(pattern.encode('utf-8')).hexdigest()[:8]
+
+
+def _plain(label: str) -> str:
+    """去掉报告生成器描述文字开头的 emoji"""
+    return label.split(' ', 1)[-1]
+
+
+def _utc(value: datetime) -> str:
+    """本地时间转换为 SARIF 使用的 UTC 时间字符串"""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class JsonlFindingsWriter:
+    """JSONL 发现流：每个发现一行（隐藏密钥明文），随扫描进度追加"""
+    
+    def __init__(self, report, path: str):
+        """
+        初始化 JSONL 写入器
+        
+        Args:
+            report: 所属的流式报告写入器（提供格式化方法和统计）
+            path: 输出文件路径
+        """
+        self.report = report
+        self.path = path
+        self._file = None
+    
+    def open(self):
+        """创建输出文件"""
+        self._file = open(self.path, 'w', encoding='utf-8')
+    
+    def add_repo_findings(self, repo_url: str, findings: List[Dict]):
+        """
+        追加一个仓库的发现
+        
+        Args:
+            repo_url: 仓库URL
+            findings: 该仓库的发现列表
+        """
+        generator = self.report.generator
+        for finding in findings:
+            record = redact_finding(finding)
+            record['repo_url'] = repo_url
+            record['rule_id'] = rule_id(finding.get('pattern', ''))
+            record['secret_type'] = _plain(generator._identify_secret_type(finding.get('secret', '')))
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+    
+    def close(self, report_time: datetime, interrupted: Optional[Dict] = None):
+        """
+        关闭输出文件
+        
+        Args:
+            report_time: 扫描结束时间
+            interrupted: 扫描被中断时的进度信息
+        """
+        self._file.close()
+
+
+class SarifWriter:
+    """SARIF 2.1.0 文件：结果随扫描进度追加，结束时写入规则列表和运行信息（之后才是完整的 JSON）"""
+    
+    def __init__(self, report, path: str):
+        """
+        初始化 SARIF 写入器
+        
+        Args:
+            report: 所属的流式报告写入器（提供格式化方法和统计）
+            path: 输出文件路径
+        """
+        self.report = report
+        self.path = path
+        self._file = None
+        self._result_count = 0
+        self._rules = {}
+    
+    def open(self):
+        """创建输出文件并写入结果数组之前的部分"""
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(f'{{"$schema": "{_SARIF_SCHEMA}", "version": "2.1.0", "runs": [{{"results": [\n')
+    
+    def add_repo_findings(self, repo_url: str, findings: List[Dict]):
+        """
+        追加一个仓库的发现
+        
+        Args:
+            repo_url: 仓库URL
+            findings: 该仓库的发现列表
+        """
+        generator = self.report.generator
+        for finding in findings:
+            pattern = finding.get('pattern', '')
+            rule = rule_id(pattern)
+            if rule not in self._rules:
+                self._rules[rule] = pattern
+            
+            secret = finding.get('secret', '')
+            confidence = finding.get('confidence', 'low')
+            region = {"startLine": finding['line_number']} if finding.get('line_number') else {}
+            result = {
+                "ruleId": rule,
+                "level": _SARIF_LEVELS.get(confidence, 'note'),
+                "message": {
+                    "text": f"{_plain(generator._identify_secret_type(secret))}: {generator._mask_secret(secret)}"
+                },
+                "locations": [{
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": f"{repo_url}/blob/HEAD/{quote(finding.get('file_path', ''))}"},
+                        "region": region,
+                    }
+                }],
+                "properties": {
+                    "repository": finding.get('repo_name', ''),
+                    "confidence": confidence,
+                },
+            }
+            if finding.get('fingerprint'):
+                result["partialFingerprints"] = {"secretFingerprint/v1": finding['fingerprint']}
+            
+            separator = ",\n" if self._result_count else ""
+            self._file.write(separator + json.dumps(result, ensure_ascii=False))
+            self._result_count += 1
+        self._file.flush()
+    
+    def close(self, report_time: datetime, interrupted: Optional[Dict] = None):
+        """
+        写入规则列表和运行信息并关闭文件
+        
+        Args:
+            report_time: 扫描结束时间
+            interrupted: 扫描被中断时的进度信息
+        """
+        generator = self.report.generator
+        rules = [
+            {
+                "id": rule,
+                "name": rule,
+                "shortDescription": {"text": _plain(generator._explain_pattern(pattern))},
+                "properties": {"pattern": pattern},
+            }
+            for rule, pattern in sorted(self._rules.items())
+        ]
+        tail = {
+            "tool": {
+                "driver": {
+                    "name": "InCloud GitHub Scanner",
+                    "rules": rules,
+                }
+            },
+            "invocations": [{
+                "executionSuccessful": interrupted is None,
+                "startTimeUtc": _utc(self.report.scan_start_time),
+                "endTimeUtc": _utc(report_time),
+            }],
+        }
+        # 结果数组之后补上 run 的其余字段
+        self._file.write("\n], " + json.dumps(tail, ensure_ascii=False)[1:] + "]}\n")
+        self._file.close()
+
+
+class SummaryWriter:
+    """
+    .summary.json 汇总：按置信度、仓库和规则统计的发现数，扫描结束时写入。
+    每次扫描一个文件（与文本报告同名），扫描异常结束时没有汇总，不会误读以前扫描的结果
+    """
+    
+    def __init__(self, report, path: str):
+        """
+        初始化汇总写入器
+        
+        Args:
+            report: 所属的流式报告写入器（提供格式化方法和统计）
+            path: 输出文件路径
+        """
+        self.report = report
+        self.path = path
+        self._by_repo = {}
+        self._by_rule = Counter()
+    
+    def open(self):
+        """汇总在扫描结束时一次写入，开始时无需创建文件"""
+    
+    def add_repo_findings(self, repo_url: str, findings: List[Dict]):
+        """
+        累计一个仓库的发现数
+        
+        Args:
+            repo_url: 仓库URL
+            findings: 该仓库的发现列表
+        """
+        confidences = Counter(finding.get('confidence', 'low') for finding in findings)
+        # 同一仓库可能分多次写入（例如命中引导模式先检查命中的文件再扫描整个仓库）
+        repo = self._by_repo.setdefault(repo_url, {
+            "repo": findings[0].get('repo_name') or repo_url,
+            "repo_url": repo_url,
+            "findings": 0,
+            "high": 0,
+            "medium": 0,
+        })
+        repo["findings"] += len(findings)
+        repo["high"] += confidences['high']
+        repo["medium"] += confidences['medium']
+        self._by_rule.update(finding.get('pattern', '') for finding in findings)
+    
+    def close(self, report_time: datetime, interrupted: Optional[Dict] = None):
+        """
+        写入汇总文件
+        
+        Args:
+            report_time: 扫描结束时间
+            interrupted: 扫描被中断时的进度信息
+        """
+        report = self.report
+        generator = report.generator
+        summary = {
+            "scan_type": report.scan_type,
+            "start_time": report.scan_start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            "end_time": report_time.strftime('%Y-%m-%d %H:%M:%S'),
+            "duration_seconds": round((report_time - report.scan_start_time).total_seconds(), 1),
+            "interrupted": interrupted is not None,
+            "repos_pending": len(interrupted.get("pending", [])) if interrupted is not None else 0,
+            "total_findings": report.total,
+            "high_confidence": report.high_count,
+            "medium_confidence": report.medium_count,
+            "by_confidence": dict(report.confidence_counts),
+            "repos_with_findings": report.repo_count,
+            "by_repo": sorted(self._by_repo.values(), key=lambda item: (-item["findings"], item["repo"])),
+            "by_rule": [
+                {
+                    "rule_id": rule_id(pattern),
+                    "description": _plain(generator._explain_pattern(pattern)),
+                    "findings": count,
+                }
+                for pattern, count in self._by_rule.most_common()
+            ],
+            "reports": {name: path for name, path in report.paths.items() if name != 'summary'},
+        }
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
+
+
+# 各机器可读格式的写入器和文件扩展名（与文本报告同名）
+FORMAT_WRITERS = {
+    'jsonl': (JsonlFindingsWriter, '.jsonl'),
+    'sarif': (SarifWriter, '.sarif'),
+    'summary': (SummaryWriter, '.summary.json'),
+}
+
+
+def summary_markdown(summary: Dict, max_repos: int = 20) -> str:
+    """
+    把结果汇总转换为 Markdown（用于 CI 的步骤摘要和告警 Issue）
+    
+    Args:
+        summary: .summary.json 的内容
+        max_repos: 最多列出的仓库数
+        
+    Returns:
+        Markdown 文本
+    """
+    lines = [
+        f"- 📦 总问题数: {summary['total_findings']}"
+        f"（🔴 {summary['high_confidence']} 高危, 🟡 {summary['medium_confidence']} 中危）",
+        f"- 📁 涉及仓库: {summary['repos_with_findings']} 个",
+    ]
+    if summary['interrupted']:
+        lines.append(f"- ⚠️ 扫描被中断，{summary['repos_pending']} 个仓库待下次扫描")
+    
+    if summary['by_repo']:
+        lines += ["", f"### 📦 涉及仓库（前 {max_repos} 个）", "", "| 仓库 | 问题数 | 高危 | 中危 |", "|---|---|---|---|"]
+        for repo in summary['by_repo'][:max_repos]:
+            lines.append(f"| [{repo['repo']}]({repo['repo_url']}) | {repo['findings']} | {repo['high']} | {repo['medium']} |")
+    if summary['by_rule']:
+        lines += ["", "### 🎯 检测规则", "", "| 规则 | 问题数 |", "|---|---|"]
+        for rule in summary['by_rule']:
+            lines.append(f"| {rule['description']} | {rule['findings']} |")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    # CI 中输出步骤摘要: python report_formats.py scan_reports/scan_report_<时间>.summary.json >> $GITHUB_STEP_SUMMARY
+    import sys
+    if len(sys.argv) != 2:
+        sys.exit("用法: python report_formats.py <扫描器输出的 .summary.json 路径>")
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        print(summary_markdown(json.load(f)), end='')
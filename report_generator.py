@@ -2,22 +2,27 @@
 报告生成模块
 """
 import os
+import threading
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict
-from config import OUTPUT_DIR
+from typing import List, Dict, Optional
+from config import OUTPUT_DIR, REPORT_FORMAT, REPORT_ORDER_WINDOW
+from report_formats import FORMAT_WRITERS, parse_report_formats
 
 
 class ReportGenerator:
     """扫描报告生成器"""
     
-    def __init__(self, output_dir: str = OUTPUT_DIR):
+    def __init__(self, output_dir: str = OUTPUT_DIR, formats: Optional[List[str]] = None):
         """
         初始化报告生成器
         
         Args:
             output_dir: 输出目录
+            formats: 输出的报告格式 (text/jsonl/sarif/summary)，默认为配置的 REPORT_FORMAT
         """
         self.output_dir = output_dir
+        self.formats = list(formats) if formats else parse_report_formats(REPORT_FORMAT)
         self._ensure_output_dir()
     
     def _ensure_output_dir(self):
@@ -25,85 +30,82 @@ class ReportGenerator:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
+    def create_writer(self, scan_start_time: datetime, scan_type: str = "auto") -> 'StreamingReportWriter':
+        """
+        创建流式报告写入器（扫描过程中每完成一个仓库写入一段）
+        
+        Args:
+            scan_start_time: 扫描开始时间
+            scan_type: 扫描类型 (user/org/auto)
+            
+        Returns:
+            报告写入器（调用 open 后才创建报告文件）
+        """
+        return StreamingReportWriter(self, scan_start_time, scan_type, self.formats)
+    
     def generate_report(self, 
                        scan_results: List[Dict], 
                        scan_start_time: datetime,
-                       scan_type: str = "auto") -> str:
+                       scan_type: str = "auto",
+                       interrupted: Optional[Dict] = None) -> str:
         """
-        生成扫描报告
+        根据完整的扫描结果生成扫描报告
         
         Args:
             scan_results: 扫描结果列表
             scan_start_time: 扫描开始时间
             scan_type: 扫描类型 (user/org/auto)
-            
+            interrupted: 扫描被中断时的进度信息 {"completed": [...], "pending": [...]}，
+                         报告中会列出已完成和待扫描的仓库
+                         
         Returns:
             报告文件路径
         """
-        report_time = datetime.now()
-        timestamp = report_time.strftime("%Y%m%d_%H%M%S")
-        filename = f"scan_report_{timestamp}.txt"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            # 写入报告头
-            f.write("╔" + "═" * 78 + "╗\n")
-            f.write("║" + " " * 78 + "║\n")
-            f.write("║" + "          🔒 InCloud GitHub 云上扫描器 - AI API Key 扫描报告".ljust(78) + "║\n")
-            f.write("║" + " " * 78 + "║\n")
-            f.write("╚" + "═" * 78 + "╝\n\n")
-            
-            # 扫描耗时
-            duration = (report_time - scan_start_time).total_seconds()
-            duration_str = f"{int(duration // 60)}分{int(duration % 60)}秒" if duration >= 60 else f"{int(duration)}秒"
-            
-            # 写入扫描信息
-            f.write("📋 扫描信息\n")
-            f.write("━" * 80 + "\n")
-            f.write(f"  🎯 扫描类型:     {self._format_scan_type(scan_type)}\n")
-            f.write(f"  ⏱️  开始时间:     {scan_start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"  ⏱️  结束时间:     {report_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"  ⏳ 扫描耗时:     {duration_str}\n")
-            
-            # 快速总览
-            high_count = sum(1 for r in scan_results if r.get('confidence') == 'high')
-            medium_count = sum(1 for r in scan_results if r.get('confidence') == 'medium')
-            repos_count = len(set(r.get('repo_url') for r in scan_results)) if scan_results else 0
-            
-            status_emoji = "🔴" if high_count > 0 else "🟡" if medium_count > 0 else "✅"
-            f.write(f"  {status_emoji} 发现问题数:   {len(scan_results)} 个")
-            if len(scan_results) > 0:
-                f.write(f" (🔴 {high_count} 高危, 🟡 {medium_count} 中危)")
-            f.write("\n")
-            f.write(f"  📦 涉及仓库数:   {repos_count} 个\n")
-            f.write("\n")
-            
-            # 如果没有发现问题
-            if not scan_results:
-                f.write("✅ 未发现敏感信息泄露！\n")
-                f.write("\n扫描完成，一切正常。\n")
-            else:
-                # 按仓库分组
-                results_by_repo = self._group_by_repo(scan_results)
-                
-                # 写入每个仓库的发现
-                for repo_url, findings in results_by_repo.items():
-                    self._write_repo_findings(f, repo_url, findings)
-                
-                # 写入统计信息
-                self._write_statistics(f, scan_results)
+        writer = self.create_writer(scan_start_time, scan_type)
+        writer.open()
+        writer.add_findings(scan_results)
+        return writer.close(interrupted=interrupted)
+    
+    def _new_report_stem(self, report_time: datetime) -> str:
+        """
+        生成新报告文件的路径（不含扩展名，各格式的报告共用）
+        
+        Args:
+            report_time: 报告创建时间
             
-            # 写入报告尾
-            f.write("\n╔" + "═" * 78 + "╗\n")
-            f.write("║" + " " * 78 + "║\n")
-            f.write("║" + "                 ✅ 报告生成完成 - 请及时处理发现的问题".ljust(78) + "║\n")
-            f.write("║" + " " * 78 + "║\n")
-            f.write("║" + f"  生成时间: {report_time.strftime('%Y年%m月%d日 %H:%M:%S')}".ljust(78) + "║\n")
-            f.write("║" + f"  报告位置: {filepath}".ljust(78) + "║\n")
-            f.write("║" + " " * 78 + "║\n")
-            f.write("╚" + "═" * 78 + "╝\n")
-        
-        return filepath
+        Returns:
+            不与已有报告重名的文件路径前缀
+        """
+        timestamp = report_time.strftime("%Y%m%d_%H%M%S")
+        stem = os.path.join(self.output_dir, f"scan_report_{timestamp}")
+        # 常驻服务连续执行的任务可能在同一秒内结束，避免覆盖之前的报告
+        suffix = 1
+        extensions = ['.txt'] + [extension for _, extension in FORMAT_WRITERS.values()]
+        while any(os.path.exists(stem + extension) for extension in extensions):
+            stem = os.path.join(self.output_dir, f"scan_report_{timestamp}_{suffix}")
+            suffix += 1
+        return stem
+    
+    def _write_interrupted_info(self, f, interrupted: Dict):
+        """
+        写入扫描中断信息
+        
+        Args:
+            f: 文件对象
+            interrupted: {"completed": 已完成的仓库列表, "pending": 待扫描的仓库列表}
+        """
+        completed = interrupted.get("completed", [])
+        pending = interrupted.get("pending", [])
+        
+        f.write("⚠️  扫描被中断 - 这是一份部分报告\n")
+        f.write("━" * 80 + "\n")
+        f.write(f"  ✅ 本次已完成:   {len(completed)} 个仓库\n")
+        for repo_name in completed:
+            f.write(f"     • {repo_name}\n")
+        f.write(f"  ⏸️  待扫描:       {len(pending)} 个仓库（使用 --resume 继续）\n")
+        for repo_name in pending:
+            f.write(f"     • {repo_name}\n")
+        f.write("\n")
     
     def _group_by_repo(self, scan_results: List[Dict]) -> Dict[str, List[Dict]]:
         """
@@ -130,6 +132,7 @@ class ReportGenerator:
             'user': '👤 指定用户扫描',
             'org': '🏢 指定组织扫描',
             'single': '📦 单个仓库扫描',
+            'merge': '🧩 分片扫描汇总',
         }
         for key, value in type_map.items():
             if scan_type.startswith(key):
@@ -320,13 +323,17 @@ class ReportGenerator:
         # 显示前4个和后4个字符
         return f"{secret[:4]}{'*' * (len(secret) - 8)}{secret[-4:]}"
     
-    def _write_statistics(self, f, scan_results: List[Dict]):
+    def _write_statistics(self, f, confidence_counts: Dict[str, int], repo_count: int, file_count: int,
+                          secret_types: Dict[str, int]):
         """
         写入统计信息
         
         Args:
             f: 文件对象
-            scan_results: 扫描结果列表
+            confidence_counts: 各置信度的发现数
+            repo_count: 涉及的仓库数
+            file_count: 涉及的文件数
+            secret_types: 各密钥类型的发现数
         """
         f.write("\n╔" + "═" * 78 + "╗\n")
         f.write("║" + " " * 78 + "║\n")
@@ -335,19 +342,9 @@ class ReportGenerator:
         f.write("╚" + "═" * 78 + "╝\n\n")
         
         # 按置信度统计
-        confidence_counts = {
-            'high': 0,
-            'medium': 0,
-            'low': 0
-        }
-        
-        for result in scan_results:
-            confidence = result.get('confidence', 'low')
-            confidence_counts[confidence] = confidence_counts.get(confidence, 0) + 1
-        
         f.write("┌─ 风险等级分布\n")
         f.write("│\n")
-        total = len(scan_results)
+        total = sum(confidence_counts.values())
         high_pct = (confidence_counts['high'] / total * 100) if total > 0 else 0
         medium_pct = (confidence_counts['medium'] / total * 100) if total > 0 else 0
         low_pct = (confidence_counts['low'] / total * 100) if total > 0 else 0
@@ -363,21 +360,14 @@ class ReportGenerator:
         f.write("└" + "─" * 78 + "\n\n")
         
         # 按仓库统计
-        repos = set(r.get('repo_url') for r in scan_results)
         f.write("┌─ 影响范围\n")
         f.write("│\n")
-        f.write(f"│  📦 涉及仓库: {len(repos)} 个\n")
-        f.write(f"│  📄 涉及文件: {len(set(r.get('file_path') for r in scan_results))} 个\n")
+        f.write(f"│  📦 涉及仓库: {repo_count} 个\n")
+        f.write(f"│  📄 涉及文件: {file_count} 个\n")
         f.write("│\n")
         f.write("└" + "─" * 78 + "\n\n")
         
         # 按密钥类型统计
-        secret_types = {}
-        for result in scan_results:
-            secret = result.get('secret', '')
-            stype = self._identify_secret_type(secret)
-            secret_types[stype] = secret_types.get(stype, 0) + 1
-        
         if secret_types:
             f.write("┌─ 密钥类型分布\n")
             f.write("│\n")
@@ -457,3 +447,240 @@ class ReportGenerator:
 {'━' * 80}
 """
         return summary
+
+
+class StreamingReportWriter:
+    """流式报告写入器：扫描开始时写入报告头，每完成一个仓库追加该仓库的发现，
+    结束时写入汇总和统计信息；统计只维护计数器和涉及仓库的集合，内存占用与发现总数无关。
+    带序号的仓库按序号顺序写入（提前完成的仓库在排序窗口内等待），报告中的仓库顺序与线程调度无关。
+    文本报告之外的格式（JSONL/SARIF/summary）由 report_formats 中的写入器同步输出"""
+    
+    def __init__(self, generator: ReportGenerator, scan_start_time: datetime, scan_type: str = "auto",
+                 formats: Optional[List[str]] = None, order_window: int = REPORT_ORDER_WINDOW):
+        """
+        初始化报告写入器（请使用 ReportGenerator.create_writer 创建）
+        
+        Args:
+            generator: 报告生成器（提供输出目录和格式化方法）
+            scan_start_time: 扫描开始时间
+            scan_type: 扫描类型 (user/org/auto)
+            formats: 输出的报告格式，默认只输出文本报告
+            order_window: 等待前面仓库完成时最多缓冲的仓库数，超出后跳过仍未完成的序号
+        """
+        self.generator = generator
+        self.scan_start_time = scan_start_time
+        self.scan_type = scan_type
+        self.formats = list(formats) if formats else ['text']
+        self.filepath = None
+        self.paths = {}
+        self.total = 0
+        self.confidence_counts = {'high': 0, 'medium': 0, 'low': 0}
+        self.file_count = 0
+        self.secret_types = Counter()
+        self.order_window = max(0, order_window)
+        self._file = None
+        self._outputs = []
+        self._opened = False
+        self._next_seq = 1
+        self._waiting = {}
+        # 同一仓库可能分多次写入（例如命中引导模式先检查命中的文件再扫描整个仓库），按 URL 去重计数
+        self._repo_urls = set()
+        self._lock = threading.Lock()
+    
+    @property
+    def repo_count(self) -> int:
+        """涉及的仓库数"""
+        return len(self._repo_urls)
+    
+    @property
+    def high_count(self) -> int:
+        """高危发现数"""
+        return self.confidence_counts['high']
+    
+    @property
+    def medium_count(self) -> int:
+        """中危发现数"""
+        return self.confidence_counts['medium']
+    
+    def open(self) -> str:
+        """
+        创建报告文件并写入报告头
+        
+        Returns:
+            报告文件路径（未输出文本报告时为第一种格式的文件路径）
+        """
+        stem = self.generator._new_report_stem(self.scan_start_time)
+        for name in self.formats:
+            if name == 'text':
+                self.paths[name] = stem + '.txt'
+                self._open_text()
+                continue
+            writer_class, extension = FORMAT_WRITERS[name]
+            self.paths[name] = stem + extension
+            output = writer_class(self, self.paths[name])
+            output.open()
+            self._outputs.append(output)
+        self.filepath = self.paths.get('text', self.paths[self.formats[0]])
+        self._opened = True
+        return self.filepath
+    
+    def _open_text(self):
+        """创建文本报告文件并写入报告头"""
+        self._file = open(self.paths['text'], 'w', encoding='utf-8')
+        f = self._file
+        
+        # 写入报告头
+        f.write("╔" + "═" * 78 + "╗\n")
+        f.write("║" + " " * 78 + "║\n")
+        f.write("║" + "          🔒 InCloud GitHub 云上扫描器 - AI API Key 扫描报告".ljust(78) + "║\n")
+        f.write("║" + " " * 78 + "║\n")
+        f.write("╚" + "═" * 78 + "╝\n\n")
+        
+        # 写入扫描信息（结果汇总在报告末尾，扫描过程中文件始终是一份有效的部分报告）
+        f.write("📋 扫描信息\n")
+        f.write("━" * 80 + "\n")
+        f.write(f"  🎯 扫描类型:     {self.generator._format_scan_type(self.scan_type)}\n")
+        f.write(f"  ⏱️  开始时间:     {self.scan_start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write("\n")
+        f.flush()
+    
+    def add_repo_findings(self, repo_url: str, findings: List[Dict], seq: Optional[int] = None):
+        """
+        追加一个仓库的发现并更新统计计数
+        
+        Args:
+            repo_url: 仓库URL
+            findings: 该仓库的发现列表（为空时不写入）
+            seq: 仓库序号（从 1 开始），给出时按序号顺序写入；没有发现的仓库也应提交序号
+        """
+        with self._lock:
+            # 关闭后（例如关闭超时时仍在运行的输出阶段）不再写入，发现仍保存在检查点中
+            if not self._opened:
+                return
+            # 没有序号或序号已被跳过的仓库直接写入
+            if seq is None or seq < self._next_seq:
+                self._write_repo(repo_url, findings)
+                return
+            
+            self._waiting[seq] = (repo_url, findings)
+            while self._waiting:
+                if self._next_seq not in self._waiting:
+                    # 前面的仓库迟迟未完成（或不会再出现，例如超时后未开始扫描）时跳过其序号
+                    if len(self._waiting) <= self.order_window:
+                        break
+                    self._next_seq = min(self._waiting)
+                self._write_repo(*self._waiting.pop(self._next_seq))
+                self._next_seq += 1
+    
+    def _write_repo(self, repo_url: str, findings: List[Dict]):
+        """
+        写入一个仓库的发现并更新统计计数（调用方持有锁）
+        
+        Args:
+            repo_url: 仓库URL
+            findings: 该仓库的发现列表（为空时不写入）
+        """
+        if not findings:
+            return
+        if self._file is not None:
+            self.generator._write_repo_findings(self._file, repo_url, findings)
+            self._file.flush()
+        
+        self.total += len(findings)
+        self._repo_urls.add(repo_url)
+        self.file_count += len(set(finding.get('file_path') for finding in findings))
+        for finding in findings:
+            confidence = finding.get('confidence', 'low')
+            self.confidence_counts[confidence] = self.confidence_counts.get(confidence, 0) + 1
+            self.secret_types[self.generator._identify_secret_type(finding.get('secret', ''))] += 1
+        
+        for output in self._outputs:
+            output.add_repo_findings(repo_url, findings)
+    
+    def add_findings(self, findings: List[Dict]):
+        """
+        按仓库分组追加多个仓库的发现
+        
+        Args:
+            findings: 发现列表
+        """
+        for repo_url, repo_findings in self.generator._group_by_repo(findings).items():
+            self.add_repo_findings(repo_url, repo_findings)
+    
+    def close(self, interrupted: Optional[Dict] = None) -> str:
+        """
+        写入扫描结果汇总、统计信息和报告尾并关闭文件
+        
+        Args:
+            interrupted: 扫描被中断时的进度信息 {"completed": [...], "pending": [...]}，
+                         报告中会列出已完成和待扫描的仓库
+                         
+        Returns:
+            报告文件路径（未输出文本报告时为第一种格式的文件路径）
+        """
+        with self._lock:
+            # 仍在等待前面仓库的发现按序号写入
+            for seq in sorted(self._waiting):
+                self._write_repo(*self._waiting[seq])
+            self._waiting.clear()
+            self._opened = False
+            f = self._file
+            self._file = None
+        report_time = datetime.now()
+        if f is not None:
+            self._close_text(f, report_time, interrupted)
+        for output in self._outputs:
+            output.close(report_time, interrupted)
+        return self.filepath
+    
+    def _close_text(self, f, report_time: datetime, interrupted: Optional[Dict]):
+        """
+        写入文本报告的扫描结果汇总、统计信息和报告尾并关闭文件
+        
+        Args:
+            f: 文本报告文件对象
+            report_time: 扫描结束时间
+            interrupted: 扫描被中断时的进度信息
+        """
+        filepath = self.paths['text']
+        
+        # 扫描耗时
+        duration = (report_time - self.scan_start_time).total_seconds()
+        duration_str = f"{int(duration // 60)}分{int(duration % 60)}秒" if duration >= 60 else f"{int(duration)}秒"
+        
+        # 快速总览
+        f.write("\n📋 扫描结果\n")
+        f.write("━" * 80 + "\n")
+        f.write(f"  ⏱️  结束时间:     {report_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"  ⏳ 扫描耗时:     {duration_str}\n")
+        status_emoji = "🔴" if self.high_count > 0 else "🟡" if self.medium_count > 0 else "✅"
+        f.write(f"  {status_emoji} 发现问题数:   {self.total} 个")
+        if self.total > 0:
+            f.write(f" (🔴 {self.high_count} 高危, 🟡 {self.medium_count} 中危)")
+        f.write("\n")
+        f.write(f"  📦 涉及仓库数:   {self.repo_count} 个\n")
+        f.write("\n")
+        
+        # 扫描被中断，这是一份部分报告
+        if interrupted is not None:
+            self.generator._write_interrupted_info(f, interrupted)
+        
+        # 如果没有发现问题
+        if self.total == 0:
+            f.write("✅ 未发现敏感信息泄露！\n")
+            f.write("\n扫描完成，一切正常。\n")
+        else:
+            # 写入统计信息
+            self.generator._write_statistics(f, self.confidence_counts, self.repo_count, self.file_count,
+                                             self.secret_types)
+        
+        # 写入报告尾
+        f.write("\n╔" + "═" * 78 + "╗\n")
+        f.write("║" + " " * 78 + "║\n")
+        f.write("║" + "                 ✅ 报告生成完成 - 请及时处理发现的问题".ljust(78) + "║\n")
+        f.write("║" + " " * 78 + "║\n")
+        f.write("║" + f"  生成时间: {report_time.strftime('%Y年%m月%d日 %H:%M:%S')}".ljust(78) + "║\n")
+        f.write("║" + f"  报告位置: {filepath}".ljust(78) + "║\n")
+        f.write("║" + " " * 78 + "║\n")
+        f.write("╚" + "═" * 78 + "╝\n")
+        f.close()
@@ -0,0 +1,245 @@
+"""
+扫描检查点模块 - 记录扫描任务的进度，支持超时或中断后继续扫描
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Iterable, Iterator
+from config import CHECKPOINT_DIR, CHECKPOINT_SAVE_INTERVAL_SECONDS
+
+# 仓库信息中需要在 JSON 中以字符串保存的时间字段
+_DATETIME_FIELDS = ('updated_at', 'pushed_at')
+
+
+def redact_finding(finding: Dict) -> Dict:
+    """
+    检查点和分片片段会写入磁盘（分片片段随扫描历史提交到仓库），保存前隐藏密钥明文
+    
+    Args:
+        finding: 发现
+        
+    Returns:
+        隐藏密钥后的发现副本
+    """
+    redacted = dict(finding)
+    secret = finding.get('secret', '')
+    masked = secret[:4] + '*' * (len(secret) - 8) + secret[-4:] if len(secret) > 8 else '*' * len(secret)
+    redacted['secret'] = masked
+    if secret and finding.get('line_content'):
+        redacted['line_content'] = finding['line_content'].replace(secret, masked)
+    return redacted
+
+
+class ScanCheckpoint:
+    """扫描任务检查点"""
+    
+    def __init__(self, scan_type: str, checkpoint_dir: str = CHECKPOINT_DIR):
+        """
+        初始化检查点
+        
+        Args:
+            scan_type: 扫描类型（同一扫描类型视为同一个扫描任务）
+            checkpoint_dir: 检查点目录
+        """
+        self.scan_type = scan_type
+        self.checkpoint_dir = Path(checkpoint_dir)
+        job_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', scan_type)
+        self.state_file = self.checkpoint_dir / f"{job_id}.json"
+        self.findings_file = self.checkpoint_dir / f"{job_id}.findings.jsonl"
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._yielded = set()
+        self.state = self._new_state()
+    
+    def _new_state(self) -> Dict:
+        """创建空的检查点状态"""
+        return {
+            "scan_type": self.scan_type,
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "updated_at": None,
+            "enumeration_complete": False,
+            "pending": {},
+            "done": [],
+        }
+    
+    def exists(self) -> bool:
+        """检查点文件是否存在"""
+        return self.state_file.exists()
+    
+    def load(self) -> bool:
+        """
+        从文件加载检查点
+        
+        Returns:
+            是否成功加载
+        """
+        if not self.exists():
+            return False
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            for repo in self.state["pending"].values():
+                self._decode_repo(repo)
+            return True
+        except Exception as e:
+            print(f"⚠️  加载检查点失败: {e}，将重新开始扫描")
+            self.state = self._new_state()
+            return False
+    
+    def reset(self):
+        """丢弃旧的检查点，开始新的扫描任务"""
+        with self._lock:
+            self.state = self._new_state()
+            self._yielded = set()
+            if self.findings_file.exists():
+                self.findings_file.unlink()
+    
+    def save(self):
+        """保存检查点到文件"""
+        with self._lock:
+            self._save_locked()
+    
+    def _save_locked(self):
+        """保存检查点到文件（调用方需持有锁）"""
+        try:
+            self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+            self.state["updated_at"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            tmp_file = self.state_file.with_suffix('.json.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2, ensure_ascii=False, default=str)
+            tmp_file.replace(self.state_file)
+            self._last_save = time.time()
+        except Exception as e:
+            print(f"⚠️  保存检查点失败: {e}")
+    
+    def _save_if_due(self):
+        """距离上次保存超过间隔时保存（调用方需持有锁）"""
+        if time.time() - self._last_save >= CHECKPOINT_SAVE_INTERVAL_SECONDS:
+            self._save_locked()
+    
+    def finish(self):
+        """扫描任务全部完成，删除检查点文件"""
+        with self._lock:
+            for path in (self.state_file, self.findings_file):
+                if path.exists():
+                    path.unlink()
+    
+    @property
+    def is_complete(self) -> bool:
+        """仓库已全部枚举且全部扫描完成"""
+        return self.state["enumeration_complete"] and not self.state["pending"]
+    
+    @property
+    def pending_count(self) -> int:
+        """待扫描的仓库数"""
+        return len(self.state["pending"])
+    
+    @property
+    def done_count(self) -> int:
+        """已完成的仓库数"""
+        return len(self.state["done"])
+    
+    def get_pending_repos(self) -> List[Dict]:
+        """
+        获取待扫描的仓库列表
+        
+        Returns:
+            仓库信息列表
+        """
+        return list(self.state["pending"].values())
+    
+    def resume_source(self, repos: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        恢复扫描时的数据源：先返回检查点中的待扫描仓库，
+        枚举未完成时再继续新的枚举
+        
+        Args:
+            repos: 新的仓库枚举
+            
+        Yields:
+            仓库信息
+        """
+        yield from self.get_pending_repos()
+        if not self.state["enumeration_complete"]:
+            yield from repos
+    
+    def track(self, repos: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        包装数据源，把枚举到的仓库登记为待扫描，并跳过已完成的仓库
+        
+        Args:
+            repos: 仓库信息迭代器
+            
+        Yields:
+            仓库信息
+        """
+        done = set(self.state["done"])
+        
+        # 一次性给出的仓库列表（例如搜索结果）直接全部登记
+        if isinstance(repos, list):
+            with self._lock:
+                for repo in repos:
+                    if repo['full_name'] not in done:
+                        self.state["pending"][repo['full_name']] = repo
+                self.state["enumeration_complete"] = True
+                self._save_locked()
+        
+        for repo in repos:
+            repo_name = repo['full_name']
+            if repo_name in done or repo_name in self._yielded:
+                continue
+            self._yielded.add(repo_name)
+            with self._lock:
+                self.state["pending"][repo_name] = repo
+            yield repo
+        
+        # 枚举正常结束（未因超时等原因中途停止）
+        with self._lock:
+            self.state["enumeration_complete"] = True
+            self._save_locked()
+    
+    def mark_done(self, repo_name: str, findings: List[Dict]):
+        """
+        标记仓库扫描完成，并把发现追加到检查点
+        
+        Args:
+            repo_name: 仓库全名
+            findings: 该仓库的发现列表
+        """
+        with self._lock:
+            if findings:
+                self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.findings_file, 'a', encoding='utf-8') as f:
+                    for finding in findings:
+                        f.write(json.dumps(redact_finding(finding), ensure_ascii=False) + '\n')
+            self.state["pending"].pop(repo_name, None)
+            self.state["done"].append(repo_name)
+            self._save_if_due()
+    
+    def load_findings(self) -> List[Dict]:
+        """
+        读取检查点中之前运行保存的发现
+        
+        Returns:
+            发现列表
+        """
+        findings = []
+        if self.findings_file.exists():
+            with open(self.findings_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        findings.append(json.loads(line))
+        return findings
+    
+    def _decode_repo(self, repo: Dict):
+        """把仓库信息中的时间字段从字符串还原为 datetime"""
+        for field in _DATETIME_FIELDS:
+            value = repo.get(field)
+            if isinstance(value, str):
+                try:
+                    repo[field] = datetime.fromisoformat(value)
+                except ValueError:
+                    pass
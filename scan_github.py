@@ -4,11 +4,21 @@ InCloud GitHub 云上扫描器 - 主程序
 用于扫描GitHub仓库中泄露的AI API密钥和敏感信息
 """
 import argparse
+import signal
 import sys
 import os
 from datetime import datetime
-from config import GITHUB_TOKEN
+from config import (
+    GITHUB_TOKEN, MAX_FILES_PER_REPO, MAX_BYTES_PER_REPO, SCAN_WORKERS, MAX_REPO_SECONDS, JOB_HTTP_PORT,
+    HISTORY_BACKEND, RESCAN_MAX_AGE_DAYS, REPORT_FORMAT
+)
 from scanner import CloudScanner
+from sharding import ShardSpec, parse_shard, merge_shards
+from history_backends import HISTORY_BACKENDS
+from job_queue import JobQueue
+from scan_service import ScanService
+from profiler import ScanProfiler
+from report_formats import REPORT_FORMATS, parse_report_formats
 
 
 def print_banner():
@@ -38,6 +48,71 @@ def validate_github_token() -> bool:
     return True
 
 
+def enqueue_job(args):
+    """根据命令行参数向任务队列添加一个扫描任务"""
+    options = None
+    if args.user:
+        kind, target = 'user', args.user
+    elif args.org:
+        kind, target = 'org', args.org
+    elif args.repo:
+        kind, target = 'repo', args.repo
+    else:
+        kind, target = 'auto', ''
+        options = {'max_repos': args.max_repos}
+    
+    job_queue = JobQueue()
+    job_id, created = job_queue.enqueue(kind, target, priority=args.priority, options=options)
+    job_queue.close()
+    if created:
+        print(f"✅ 已添加任务 #{job_id}: {kind} {target}")
+    else:
+        print(f"ℹ️  相同目标的任务 #{job_id} 已在队列中")
+
+
+def install_shutdown_handlers(on_shutdown) -> list:
+    """
+    安装 SIGTERM/SIGINT 处理函数：第一次收到信号时请求优雅关闭，再次收到时立即中断
+    
+    Args:
+        on_shutdown: 请求优雅关闭的回调函数
+        
+    Returns:
+        收到的信号列表（为空表示没有收到信号）
+    """
+    received = []
+    
+    def handler(signum, frame):
+        if received:
+            raise KeyboardInterrupt
+        received.append(signum)
+        print(f"\n\n🛑 收到 {signal.Signals(signum).name}，正在结束扫描并生成部分报告（再次按 Ctrl+C 立即退出）...")
+        on_shutdown()
+    
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+    return received
+
+
+def run_service(scanner: CloudScanner, http_port: int):
+    """运行常驻扫描服务，直到收到中断"""
+    job_queue = JobQueue()
+    service = ScanService(scanner, job_queue)
+    
+    def shutdown():
+        service.stop()
+        scanner.request_shutdown()
+    
+    install_shutdown_handlers(shutdown)
+    if http_port:
+        service.start_http(http_port)
+    try:
+        service.run()
+    finally:
+        service.stop()
+        job_queue.close()
+
+
 def main():
     """主函数"""
     print_banner()
@@ -62,10 +137,36 @@ def main():
   
   # 自动搜索并扫描指定数量的仓库
   python scan_github.py --auto --max-repos 100
+  
+  # 快速发现模式：每个仓库确认第一个高危问题后即转向下一个
+  python scan_github.py --auto --first-hit
+  
+  # 命中引导模式：只检查代码搜索命中的文件，确认泄露后才扫描整个仓库
+  python scan_github.py --auto --hit-guided
+  
+  # 从上次超时中断的位置继续扫描组织
+  python scan_github.py --org organization_name --resume
+  
+  # 分 4 个进程/机器并行扫描（各运行一个分片），全部结束后合并结果
+  python scan_github.py --auto --shard 0/4
+  python scan_github.py merge
+  
+  # 常驻服务模式：启动服务，再向队列添加任务
+  python scan_github.py serve --http-port 8765
+  python scan_github.py enqueue --org organization_name --priority 10
         """
     )
     
     # 添加参数
+    parser.add_argument(
+        'command',
+        nargs='?',
+        default='scan',
+        choices=['scan', 'merge', 'serve', 'enqueue'],
+        help='scan: 扫描仓库（默认）；merge: 合并各分片的扫描历史和发现并生成汇总报告；'
+             'serve: 常驻服务，从任务队列取任务扫描；enqueue: 向任务队列添加扫描任务'
+    )
+    
     parser.add_argument(
         '--user',
         type=str,
@@ -109,21 +210,151 @@ def main():
         help='报告输出目录 (可选，默认: ./scan_reports)'
     )
     
+    parser.add_argument(
+        '--format',
+        type=str,
+        default=REPORT_FORMAT,
+        help=f'报告格式，逗号分隔，可选 {",".join(REPORT_FORMATS)}：jsonl 为逐行的发现流，sarif 为 SARIF 2.1.0，'
+             f'summary 为与报告同名的 .summary.json 汇总 (默认: {REPORT_FORMAT})'
+    )
+    
     parser.add_argument(
         '--no-skip-scanned',
         action='store_true',
         help='不跳过已扫描的仓库，强制重新扫描所有仓库'
     )
     
+    parser.add_argument(
+        '--max-files-per-repo',
+        type=int,
+        default=MAX_FILES_PER_REPO,
+        help=f'单个仓库最多扫描的文件数，超出的低优先级文件跳过（仓库记为部分扫描），0 表示不限制 (默认: {MAX_FILES_PER_REPO})'
+    )
+    
+    parser.add_argument(
+        '--max-bytes-per-repo',
+        type=int,
+        default=MAX_BYTES_PER_REPO,
+        help=f'单个仓库最多扫描的字节数，超出的低优先级文件跳过（仓库记为部分扫描），0 表示不限制 (默认: {MAX_BYTES_PER_REPO})'
+    )
+    
+    parser.add_argument(
+        '--first-hit',
+        action='store_true',
+        help='发现第一个高危问题后立即停止扫描该仓库，转向下一个仓库（适合 --auto 快速发现）'
+    )
+    
+    parser.add_argument(
+        '--hit-guided',
+        action='store_true',
+        help='只检查代码搜索命中的文件，确认高危问题后才扫描整个仓库（适合 --auto，大幅减少 API 调用）'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=SCAN_WORKERS,
+        help=f'并发获取文件内容的线程数，同时进行的请求数在此上限内根据延迟和限流自动调整 (默认: {SCAN_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='从上次超时或中断的检查点继续扫描'
+    )
+    
+    parser.add_argument(
+        '--timeout-minutes',
+        type=int,
+        default=50,
+        help='整个扫描的时间预算（分钟），预计无法在剩余时间内完成的仓库推迟到下次扫描 (默认: 50)'
+    )
+    
+    parser.add_argument(
+        '--max-repo-seconds',
+        type=int,
+        default=MAX_REPO_SECONDS,
+        help=f'单个仓库的扫描时限（秒），0 表示只受整体时间预算限制 (默认: {MAX_REPO_SECONDS})'
+    )
+    
+    parser.add_argument(
+        '--shard',
+        type=str,
+        help='只扫描按仓库名哈希划分的第 i 个分片（格式 i/N，i 从 0 开始），结果写入分片片段'
+    )
+    
+    parser.add_argument(
+        '--history-backend',
+        choices=HISTORY_BACKENDS,
+        default=HISTORY_BACKEND,
+        help=f'扫描历史存储后端：sharded 为按仓库名哈希前缀分片的小文件（适合提交到仓库），sqlite 按仓库名索引并导出 JSON 副本，journal 为 JSON 快照加追加写入的日志，json 为旧版本格式 (默认: {HISTORY_BACKEND})'
+    )
+    
+    parser.add_argument(
+        '--rescan-max-age-days',
+        type=float,
+        default=RESCAN_MAX_AGE_DAYS,
+        help=f'已扫描的仓库只在有新推送时重新扫描，超过该天数未扫描的仓库强制重新扫描，0 表示不强制 (默认: {RESCAN_MAX_AGE_DAYS:g})'
+    )
+    
+    parser.add_argument(
+        '--report-known-secrets',
+        action='store_true',
+        help='报告所有发现，包括密钥指纹索引中已在其他仓库/文件报告过的密钥（默认只报告新密钥）'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='开启性能剖析（cProfile + 栈采样 + tracemalloc），输出各阶段耗时、火焰图折叠栈和内存分配热点'
+    )
+    
+    parser.add_argument(
+        '--priority',
+        type=int,
+        default=0,
+        help='enqueue 时的任务优先级，数值越大越先执行 (默认: 0)'
+    )
+    
+    parser.add_argument(
+        '--http-port',
+        type=int,
+        default=JOB_HTTP_PORT,
+        help='serve 时在本机启动 HTTP 入队接口的端口，0 表示不启动'
+    )
+    
     # 解析参数
     args = parser.parse_args()
     
+    try:
+        report_formats = parse_report_formats(args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # 合并分片结果
+    if args.command == 'merge':
+        report_path = merge_shards(history_backend=args.history_backend, report_formats=report_formats)
+        print(f"\n📄 汇总报告已保存至: {report_path}")
+        return
+    
+    shard = None
+    if args.shard:
+        try:
+            shard = ShardSpec(*parse_shard(args.shard))
+        except ValueError as e:
+            parser.error(str(e))
+    
     # 检查是否提供了至少一个扫描选项
-    if not any([args.user, args.org, args.repo, args.auto]):
+    if args.command != 'serve' and not any([args.user, args.org, args.repo, args.auto]):
         parser.print_help()
         print("\n❌ 错误: 请至少指定一个扫描选项 (--user, --org, --repo, 或 --auto)")
         sys.exit(1)
     
+    # 向任务队列添加任务，由常驻服务执行
+    if args.command == 'enqueue':
+        enqueue_job(args)
+        return
+    
     # 验证 GitHub Token
     token = args.token or GITHUB_TOKEN
     if not token:
@@ -134,10 +365,39 @@ def main():
     if args.output_dir:
         os.environ['OUTPUT_DIR'] = args.output_dir
     
+    # 性能剖析覆盖扫描器创建到报告生成的全过程
+    profiler = ScanProfiler() if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    
     try:
         # 创建扫描器实例
         skip_scanned = not args.no_skip_scanned
-        scanner = CloudScanner(token, skip_scanned=skip_scanned)
+        scanner = CloudScanner(
+            token,
+            skip_scanned=skip_scanned,
+            max_files_per_repo=args.max_files_per_repo,
+            max_bytes_per_repo=args.max_bytes_per_repo,
+            first_hit=args.first_hit,
+            hit_guided=args.hit_guided,
+            workers=args.workers,
+            resume=args.resume,
+            timeout_minutes=args.timeout_minutes,
+            max_repo_seconds=args.max_repo_seconds,
+            shard=shard,
+            history_backend=args.history_backend,
+            rescan_max_age_days=args.rescan_max_age_days,
+            report_known_secrets=args.report_known_secrets,
+            report_formats=report_formats
+        )
+        
+        # 常驻服务模式
+        if args.command == 'serve':
+            run_service(scanner, args.http_port)
+            return
+        
+        # 收到 SIGTERM（例如 CI 超时）或 Ctrl+C 时优雅关闭，保存进度并生成部分报告
+        received_signals = install_shutdown_handlers(scanner.request_shutdown)
         
         # 根据参数执行不同的扫描
         if args.user:
@@ -149,9 +409,13 @@ def main():
         elif args.auto:
             report_path = scanner.scan_ai_projects(max_repos=args.max_repos)
         
+        if scanner.interrupted:
+            print(f"\n⚠️  扫描被中断，部分报告已保存至: {report_path}")
+            sys.exit(128 + received_signals[0] if received_signals else 1)
+        
         print(f"\n✅ 扫描完成！")
         print(f"📄 报告已保存至: {report_path}")
-        
+    
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断扫描")
         sys.exit(0)
@@ -160,6 +424,9 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if profiler is not None:
+            profiler.stop()
 
 
 if __name__ == "__main__":
@@ -1,22 +1,162 @@
 """
-扫描历史管理模块 - 跟踪已扫描的仓库，避免重复扫描
+扫描历史管理模块 - 跟踪已扫描的仓库，避免重复扫描（上次扫描后有新推送的仓库会重新扫描），
+并增量维护扫描统计。多个扫描进程可以共用同一份历史：写入时持有跨进程的建议锁，并先合并其他进程的修改
 """
-import json
-import os
-from datetime import datetime
-from typing import Dict, List, Set
+import copy
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from history_backends import HistoryBackend, open_history_backend, backend_files
+from membership_index import MembershipIndex, file_stamp
+from config import HISTORY_BACKEND, HISTORY_JSON_EXPORT, HISTORY_STATS_DAYS
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只保证进程内的线程安全
+    fcntl = None
+
+# 需要解析整个文件才能查询的后端，判断是否已扫描时使用成员索引
+_FLAT_FILE_BACKENDS = ('json', 'journal')
+
+# 扫描失败时记录在 scan_type 最后一段的结果
+_FAILURE_OUTCOMES = ('no-access', 'forbidden', 'failed')
+
+
+def _empty_stats() -> Dict:
+    """空的扫描统计"""
+    return {
+        "total_scanned": 0,
+        "total_findings": 0,
+        "repos_with_findings": 0,
+        "by_scan_type": {},
+        "by_outcome": {},
+        "daily": {},
+    }
+
+
+def _classify(info: Dict) -> Tuple[str, str]:
+    """
+    扫描记录的扫描类型和结果
+    
+    Args:
+        info: 扫描信息字典
+        
+    Returns:
+        (扫描类型，不含扫描目标，例如 user/org/auto/single, 结果 ok/partial/no-access/forbidden/failed)
+    """
+    parts = info.get("scan_type", "unknown").split(":")
+    if len(parts) > 1 and parts[-1] in _FAILURE_OUTCOMES:
+        outcome = parts[-1]
+    else:
+        outcome = "partial" if info.get("partial") else "ok"
+    return parts[0], outcome
+
+
+def _count_repo(stats: Dict, info: Dict, sign: int):
+    """
+    把一条扫描记录计入（sign=1）或移出（sign=-1）统计
+    
+    Args:
+        stats: 扫描统计
+        info: 扫描信息字典
+        sign: 1 或 -1
+    """
+    findings_count = info.get("findings_count", 0)
+    stats["total_scanned"] += sign
+    stats["total_findings"] += sign * findings_count
+    if findings_count > 0:
+        stats["repos_with_findings"] += sign
+    
+    scan_type, outcome = _classify(info)
+    for key, name in (("by_scan_type", scan_type), ("by_outcome", outcome)):
+        counts = stats[key]
+        counts[name] = counts.get(name, 0) + sign
+        if counts[name] <= 0:
+            del counts[name]
+
+
+def _count_scan(stats: Dict, info: Dict, new_repo: bool):
+    """
+    把一次扫描计入按天统计（只保留最近 HISTORY_STATS_DAYS 天）
+    
+    Args:
+        stats: 扫描统计
+        info: 本次扫描的扫描信息字典
+        new_repo: 是否首次扫描该仓库
+    """
+    day = (info.get("last_scan") or "")[:10] or "unknown"
+    bucket = stats["daily"].setdefault(day, {"scans": 0, "new_repos": 0, "findings": 0})
+    bucket["scans"] += 1
+    bucket["findings"] += info.get("findings_count", 0)
+    if new_repo:
+        bucket["new_repos"] += 1
+    for old_day in sorted(stats["daily"])[:-HISTORY_STATS_DAYS]:
+        del stats["daily"][old_day]
+
+
+def _format_pushed_at(pushed_at) -> Optional[str]:
+    """
+    把仓库的推送时间格式化为 ISO 8601 字符串（UTC）
+    
+    Args:
+        pushed_at: datetime（没有时区的视为 UTC）或已格式化的字符串
+        
+    Returns:
+        ISO 8601 字符串，没有推送时间时返回 None
+    """
+    if not pushed_at:
+        return None
+    if isinstance(pushed_at, str):
+        return pushed_at
+    if pushed_at.tzinfo is None:
+        pushed_at = pushed_at.replace(tzinfo=timezone.utc)
+    return pushed_at.astimezone(timezone.utc).isoformat()
+
+
+def _scan_stamps(info: Dict) -> Tuple[int, int]:
+    """
+    从扫描记录中取出推送时间和扫描时间
+    
+    Args:
+        info: 扫描信息字典
+        
+    Returns:
+        (推送时间, 扫描时间) Unix 时间戳，旧记录没有推送时间或时间无法解析时为 0
+    """
+    pushed = scanned = 0
+    try:
+        if info.get("pushed_at"):
+            pushed_at = datetime.fromisoformat(info["pushed_at"])
+            if pushed_at.tzinfo is None:
+                pushed_at = pushed_at.replace(tzinfo=timezone.utc)
+            pushed = int(pushed_at.timestamp())
+    except ValueError:
+        pass
+    try:
+        if info.get("last_scan"):
+            scanned = int(datetime.strptime(info["last_scan"], '%Y-%m-%d %H:%M:%S').timestamp())
+    except ValueError:
+        pass
+    return pushed, scanned
 
 
 class ScanHistory:
     """扫描历史管理器"""
     
-    def __init__(self, history_file: str = None):
+    def __init__(self, history_file: str = None, backend: str = HISTORY_BACKEND,
+                 membership_index: bool = True):
         """
         初始化扫描历史管理器
         
         Args:
             history_file: 历史记录文件路径，默认为 scan_history/scanned_repos.json
+                          （sqlite 后端的数据库位于同一目录，该文件为导出的 JSON 副本；
+                          sharded 后端的分片位于同一目录的 shards 子目录）
+            backend: 存储后端 (sharded/sqlite/journal/json)
+            membership_index: json/journal 后端是否使用成员索引判断仓库是否已扫描
         """
         if history_file is None:
             history_dir = Path("scan_history")
@@ -26,32 +166,120 @@ class ScanHistory:
             self.history_file = Path(history_file)
             self.history_file.parent.mkdir(exist_ok=True, parents=True)
         
-        self.history = self._load_history()
+        # 多个扫描线程会并发更新历史记录
+        self._lock = threading.RLock()
+        self._backend_kind = backend
+        self._backend = None
+        self._stats = None
+        
+        # 多个扫描进程（例如按组织或分片并行扫描）共用同一份历史时，读-改-写期间持有跨进程的建议锁
+        self._lock_file = self.history_file.with_suffix('.lock')
+        self._lock_fd = None
+        self._lock_depth = 0
+        
+        # 完整历史只在需要读写记录时才加载；判断是否已扫描时使用 mmap 加载的成员索引，
+        # 索引与历史文件的状态戳不一致时视为过期，回退到完整历史
+        self._index_file = self.history_file.with_suffix('.idx')
+        self._use_index = membership_index and backend in _FLAT_FILE_BACKENDS
+        self._index = self._load_index() if self._use_index else None
+    
+    @property
+    def backend(self) -> HistoryBackend:
+        """存储后端（首次使用时加载完整历史）"""
+        if self._backend is None:
+            with self._exclusive():
+                if self._backend is None:
+                    self._backend = open_history_backend(self._backend_kind, self.history_file,
+                                                         export_json=HISTORY_JSON_EXPORT)
+        return self._backend
+    
+    @contextmanager
+    def _exclusive(self):
+        """
+        独占扫描历史：持有线程锁和跨进程的建议锁（fcntl.flock，同一线程可重入），
+        开始时加载其他进程的修改，结束时让本进程的写入对其他进程可见
+        """
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_fd = open(self._lock_file, 'a')
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1 and self._backend is not None and self._backend.reload_if_changed():
+                    # 其他进程维护的统计是准确的，重新读取；成员索引缺少其他进程的记录，停止使用
+                    self._stats = None
+                    self._drop_index()
+                yield
+            finally:
+                try:
+                    if self._lock_depth == 1 and self._backend is not None:
+                        self._backend.sync()
+                finally:
+                    self._lock_depth -= 1
+                    if self._lock_depth == 0 and self._lock_fd is not None:
+                        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                        self._lock_fd.close()
+                        self._lock_fd = None
     
-    def _load_history(self) -> Dict:
+    def _load_index(self) -> Optional[MembershipIndex]:
         """
-        从文件加载扫描历史
+        加载成员索引
         
         Returns:
-            历史记录字典
+            成员索引，不存在或已过期时返回 None
         """
-        if self.history_file.exists():
+        index = MembershipIndex.load(self._index_file)
+        if index is not None and index.stamp != file_stamp(*backend_files(self._backend_kind, self.history_file)):
+            index.close()
+            return None
+        return index
+    
+    def _drop_index(self):
+        """
+        删除或清空记录后成员索引不再准确，停止使用直到下次 flush 重建。
+        is_scanned/get_rescan_reason 不持锁读取索引，可能仍在使用旧索引，
+        因此只替换引用而不关闭，旧索引的内存映射在没有引用后随对象回收释放
+        """
+        self._index = None
+    
+    def flush(self):
+        """保存缓冲的写入（sqlite 后端同时更新 JSON 副本，journal 后端压缩为新快照），每次扫描结束时调用"""
+        if self._backend is None:
+            return
+        with self._exclusive():
             try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                self._backend.flush()
+                if self._use_index:
+                    self._rebuild_index()
             except Exception as e:
-                print(f"⚠️  加载扫描历史失败: {e}，将创建新历史记录")
-                return {"repos": {}, "total_scanned": 0, "last_updated": None}
-        else:
-            return {"repos": {}, "total_scanned": 0, "last_updated": None}
+                print(f"⚠️  保存扫描历史失败: {e}")
+    
+    def _rebuild_index(self):
+        """根据完整历史重建并保存成员索引"""
+        stamp = file_stamp(*backend_files(self._backend_kind, self.history_file))
+        entries = ((name, *_scan_stamps(info)) for name, info in self._backend.items())
+        MembershipIndex.build(entries, stamp).save(self._index_file)
+        # 索引文件是替换而不是原地改写的，旧索引的映射仍然有效；直接替换引用，不关闭仍可能被读取的旧索引
+        self._index = self._load_index()
     
-    def _save_history(self):
-        """保存扫描历史到文件"""
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"⚠️  保存扫描历史失败: {e}")
+    def _get_stats(self) -> Dict:
+        """
+        获取增量维护的扫描统计（保存在后端元数据中，不存在时根据完整历史统计一次）
+        
+        Returns:
+            扫描统计
+        """
+        with self._exclusive():
+            if self._stats is None:
+                stats = self.backend.get_meta("stats")
+                if not stats:
+                    stats = _empty_stats()
+                    for _, info in self.backend.items():
+                        _count_repo(stats, info, 1)
+                        _count_scan(stats, info, info.get("scan_count", 1) <= 1)
+                    self.backend.set_meta("stats", stats)
+                self._stats = stats
+            return self._stats
     
     def is_scanned(self, repo_full_name: str) -> bool:
         """
@@ -63,7 +291,10 @@ class ScanHistory:
         Returns:
             True 如果已扫描，False 如果未扫描
         """
-        return repo_full_name in self.history["repos"]
+        index = self._index
+        if index is not None:
+            return index.contains(repo_full_name)
+        return self.backend.contains(repo_full_name)
     
     def get_scan_info(self, repo_full_name: str) -> Dict:
         """
@@ -75,10 +306,42 @@ class ScanHistory:
         Returns:
             扫描信息字典，如果未扫描过则返回 None
         """
-        return self.history["repos"].get(repo_full_name)
+        return self.backend.get(repo_full_name)
+    
+    def get_rescan_reason(self, repo_full_name: str, pushed_at=None, max_age_days: float = 0) -> Optional[str]:
+        """
+        根据枚举/搜索时拿到的推送时间判断仓库是否需要（重新）扫描
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            pushed_at: 仓库当前的推送时间（datetime 或 ISO 8601 字符串，None 表示未知）
+            max_age_days: 距上次扫描超过该天数时强制重新扫描（0 表示不强制）
+            
+        Returns:
+            "new" 未扫描过，"pushed" 上次扫描后有新的推送，"max_age" 超过最长重新扫描间隔，
+            None 表示无需扫描（没有记录推送时间的旧记录在知道当前推送时间时视为有新的推送，
+            重新扫描一次后记录推送时间）
+        """
+        index = self._index
+        if index is not None:
+            stamps = index.lookup(repo_full_name)
+        else:
+            info = self.backend.get(repo_full_name)
+            stamps = None if info is None else _scan_stamps(info)
+        if stamps is None:
+            return "new"
+        
+        recorded_pushed, last_scan = stamps
+        current_pushed, _ = _scan_stamps({"pushed_at": _format_pushed_at(pushed_at)})
+        if current_pushed > recorded_pushed:
+            return "pushed"
+        if max_age_days > 0 and time.time() - last_scan > max_age_days * 86400:
+            return "max_age"
+        return None
     
     def mark_as_scanned(self, repo_full_name: str, findings_count: int = 0, 
-                        scan_type: str = "unknown"):
+                        scan_type: str = "unknown", partial: bool = False,
+                        pushed_at=None, tree_sha: Optional[str] = None):
         """
         标记仓库为已扫描
         
@@ -86,22 +349,74 @@ class ScanHistory:
             repo_full_name: 仓库全名 (owner/repo)
             findings_count: 发现的问题数量
             scan_type: 扫描类型
+            partial: 是否只扫描了部分文件（首次命中提前结束或超出预算）
+            pushed_at: 枚举/搜索时拿到的仓库推送时间（datetime 或 ISO 8601 字符串）
+            tree_sha: 扫描时默认分支的根目录树 SHA
         """
-        self.history["repos"][repo_full_name] = {
-            "first_scan": self.history["repos"].get(repo_full_name, {}).get(
-                "first_scan", 
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ),
-            "last_scan": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            "findings_count": findings_count,
-            "scan_type": scan_type,
-            "scan_count": self.history["repos"].get(repo_full_name, {}).get("scan_count", 0) + 1
-        }
-        
-        self.history["total_scanned"] = len(self.history["repos"])
-        self.history["last_updated"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._exclusive():
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            existing = self.backend.get(repo_full_name) or {}
+            info = {
+                "first_scan": existing.get("first_scan", now),
+                "last_scan": now,
+                "findings_count": findings_count,
+                "scan_type": scan_type,
+                "scan_count": existing.get("scan_count", 0) + 1
+            }
+            if partial:
+                info["partial"] = True
+            # 没有给出推送时间时（例如单仓库扫描）保留上次记录的推送时间
+            pushed_at = _format_pushed_at(pushed_at) or existing.get("pushed_at")
+            if pushed_at:
+                info["pushed_at"] = pushed_at
+            if tree_sha:
+                info["tree_sha"] = tree_sha
+            
+            stats = self._get_stats()
+            if existing:
+                _count_repo(stats, existing, -1)
+            _count_repo(stats, info, 1)
+            _count_scan(stats, info, not existing)
+            
+            self.backend.set_meta("stats", stats)
+            self.backend.set_meta("last_updated", now)
+            self.backend.put(repo_full_name, info)
+            if self._index is not None:
+                self._index.add(repo_full_name, *_scan_stamps(info))
+    
+    def merge_repos(self, repos: Dict[str, Dict]):
+        """
+        合并其他来源（例如分片扫描）的仓库记录，同一仓库以最后扫描时间较新的记录为准
         
-        self._save_history()
+        Args:
+            repos: 仓库全名到扫描信息的映射
+        """
+        with self._exclusive():
+            stats = self._get_stats()
+            merged_repos = []
+            for repo_full_name, info in repos.items():
+                existing = self.backend.get(repo_full_name)
+                if existing is None:
+                    merged_repos.append((repo_full_name, dict(info)))
+                    _count_repo(stats, info, 1)
+                    _count_scan(stats, info, True)
+                    continue
+                
+                newer, older = (info, existing) if info.get("last_scan", "") >= existing.get("last_scan", "") else (existing, info)
+                merged = dict(newer)
+                merged["first_scan"] = min(older.get("first_scan") or newer["first_scan"], newer["first_scan"])
+                merged["scan_count"] = existing.get("scan_count", 0) + info.get("scan_count", 0)
+                merged_repos.append((repo_full_name, merged))
+                _count_repo(stats, existing, -1)
+                _count_repo(stats, merged, 1)
+                _count_scan(stats, info, False)
+            
+            self.backend.set_meta("stats", stats)
+            self.backend.set_meta("last_updated", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self.backend.put_many(merged_repos)
+            if self._index is not None:
+                for repo_full_name, info in merged_repos:
+                    self._index.add(repo_full_name, *_scan_stamps(info))
     
     def get_scanned_repos(self) -> List[str]:
         """
@@ -110,7 +425,7 @@ class ScanHistory:
         Returns:
             仓库全名列表
         """
-        return list(self.history["repos"].keys())
+        return list(self.backend.names())
     
     def get_scanned_count(self) -> int:
         """
@@ -119,12 +434,17 @@ class ScanHistory:
         Returns:
             仓库数量
         """
-        return self.history["total_scanned"]
+        return self.backend.count()
     
     def clear_history(self):
         """清空扫描历史"""
-        self.history = {"repos": {}, "total_scanned": 0, "last_updated": None}
-        self._save_history()
+        with self._exclusive():
+            self._drop_index()
+            self.backend.set_meta("last_updated", None)
+            self.backend.clear()
+            self._stats = _empty_stats()
+            self.backend.set_meta("stats", self._stats)
+            self.flush()
         print("✅ 扫描历史已清空")
     
     def remove_repo(self, repo_full_name: str):
@@ -134,38 +454,30 @@ class ScanHistory:
         Args:
             repo_full_name: 仓库全名 (owner/repo)
         """
-        if repo_full_name in self.history["repos"]:
-            del self.history["repos"][repo_full_name]
-            self.history["total_scanned"] = len(self.history["repos"])
-            self.history["last_updated"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self._save_history()
-            print(f"✅ 已从历史记录中移除: {repo_full_name}")
-        else:
-            print(f"⚠️  仓库不在历史记录中: {repo_full_name}")
+        with self._exclusive():
+            self._drop_index()
+            stats = self._get_stats()
+            existing = self.backend.get(repo_full_name)
+            self.backend.set_meta("last_updated", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            if self.backend.delete(repo_full_name):
+                _count_repo(stats, existing, -1)
+                self.backend.set_meta("stats", stats)
+                print(f"✅ 已从历史记录中移除: {repo_full_name}")
+            else:
+                print(f"⚠️  仓库不在历史记录中: {repo_full_name}")
     
     def get_statistics(self) -> Dict:
         """
-        获取扫描统计信息
+        获取扫描统计信息（增量维护，与历史规模无关）
         
         Returns:
-            统计信息字典
+            统计信息字典: 仓库总数、发现总数、有问题的仓库数、按扫描类型和结果的仓库数、
+            按天的扫描次数/新仓库数/发现数 (daily) 以及最后更新时间
         """
-        total_findings = sum(
-            repo_info.get("findings_count", 0) 
-            for repo_info in self.history["repos"].values()
-        )
-        
-        repos_with_findings = sum(
-            1 for repo_info in self.history["repos"].values() 
-            if repo_info.get("findings_count", 0) > 0
-        )
-        
-        return {
-            "total_scanned": self.history["total_scanned"],
-            "total_findings": total_findings,
-            "repos_with_findings": repos_with_findings,
-            "last_updated": self.history["last_updated"]
-        }
+        with self._exclusive():
+            stats = copy.deepcopy(self._get_stats())
+            stats["last_updated"] = self.backend.get_meta("last_updated")
+        return stats
     
     def print_statistics(self):
         """打印扫描统计信息"""
@@ -174,6 +486,10 @@ class ScanHistory:
         print(f"   总扫描仓库数: {stats['total_scanned']}")
         print(f"   发现问题总数: {stats['total_findings']}")
         print(f"   有问题的仓库: {stats['repos_with_findings']}")
+        if stats['by_outcome']:
+            print(f"   扫描结果: " + ", ".join(f"{name} {count}" for name, count in sorted(stats['by_outcome'].items())))
+        if stats['by_scan_type']:
+            print(f"   扫描类型: " + ", ".join(f"{name} {count}" for name, count in sorted(stats['by_scan_type'].items())))
         if stats['last_updated']:
             print(f"   最后更新时间: {stats['last_updated']}")
 
@@ -0,0 +1,285 @@
+"""
+扫描流水线模块 - 由有界队列连接的多阶段并发流水线
+
+数据流: 枚举 → 准入/排序 → 获取 → 检测 → 去重/过滤 → 输出
+每个阶段有独立的并发数和有界输入队列，下游处理不过来时上游会被阻塞（背压），
+因此内存占用不会随仓库数量增长。
+"""
+import queue
+import threading
+import time
+from typing import List, Dict, Iterable, Callable, Optional
+from config import PIPELINE_QUEUE_SIZE
+
+# 阶段结束信号
+_STOP = object()
+
+
+class RepoTask:
+    """单个仓库的扫描任务，在各阶段之间传递并记录进度"""
+    
+    def __init__(self, repo: Dict, scan_type: str, seq: int):
+        """
+        初始化仓库扫描任务
+        
+        Args:
+            repo: 仓库信息字典
+            scan_type: 扫描类型
+            seq: 仓库序号（用于确定性排序）
+        """
+        self.repo = repo
+        self.repo_name = repo.get('full_name', 'unknown')
+        self.scan_type = scan_type
+        self.seq = seq
+        self.scan_time = None
+        self.start_time = None        # 开始扫描的时间戳（用于统计单仓库耗时）
+        self.status = None            # None 表示正常完成，否则为 no-access/forbidden/failed/deferred
+        self.findings = []
+        self.known_count = 0          # 已报告过（指纹索引中已有）而不再报告的发现数
+        self.file_count = 0
+        self.over_budget_count = 0
+        self.skipped_count = 0        # 因提前结束而未获取的文件数
+        self.error = None
+        self.budget_cost = None       # 时间预算中为该仓库预留的工作量
+        self.deadline = None          # 单仓库硬性截止时间戳
+        self.deadline_hit = False     # 是否因达到截止时间而跳过了剩余文件
+        self.interrupted = False      # 是否因进程关闭而中途停止
+        self.hit_only = False         # 是否只检查了代码搜索命中的文件（命中引导模式）
+        self.tree_sha = None          # 扫描时默认分支的根目录树 SHA
+        self.previous_scan = None     # 默认分支内容与上次完整扫描时相同时为上次的扫描记录（沿用其结果）
+        self.reported = False         # 是否已向报告提交了该仓库的序号
+        self.cancelled = threading.Event()
+        self._pending = 0
+        self._listing_done = False
+        self._lock = threading.Lock()
+    
+    @property
+    def partial(self) -> bool:
+        """是否只扫描了部分文件"""
+        return self.over_budget_count > 0 or self.skipped_count > 0 or self.hit_only
+    
+    def add_file(self):
+        """登记一个待获取的文件"""
+        with self._lock:
+            self._pending += 1
+            self.file_count += 1
+    
+    def skip_file(self):
+        """登记一个因提前结束而未获取的文件"""
+        with self._lock:
+            self.skipped_count += 1
+    
+    def add_findings(self, findings: List[Dict]):
+        """添加检测结果"""
+        with self._lock:
+            self.findings.extend(findings)
+    
+    def file_done(self) -> bool:
+        """
+        标记一个文件处理完成
+        
+        Returns:
+            仓库的所有文件是否都已处理完成
+        """
+        with self._lock:
+            self._pending -= 1
+            return self._listing_done and self._pending == 0
+    
+    def listing_done(self) -> bool:
+        """
+        标记文件列表已全部下发
+        
+        Returns:
+            仓库的所有文件是否都已处理完成
+        """
+        with self._lock:
+            self._listing_done = True
+            return self._pending == 0
+
+
+class FileItem:
+    """待获取/检测的单个文件"""
+    
+    def __init__(self, task: RepoTask, file_info: Dict):
+        self.task = task
+        self.file_info = file_info
+        self.content = None
+
+
+class RepoEndMarker:
+    """仓库文件列表结束标记"""
+    
+    def __init__(self, task: RepoTask):
+        self.task = task
+
+
+class PipelineStage:
+    """流水线阶段"""
+    
+    def __init__(self, name: str, handler: Callable, workers: int = 1,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        """
+        初始化流水线阶段
+        
+        Args:
+            name: 阶段名称
+            handler: 处理函数，接受一个输入，返回（或生成）零个或多个输出
+            workers: 并发数
+            queue_size: 输入队列容量
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+        self._active_workers = self.workers
+        self._lock = threading.Lock()
+    
+    def put(self, item):
+        """放入一个输入（队列满时阻塞）"""
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            with self._lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+    
+    def get_metrics(self) -> Dict:
+        """
+        获取阶段运行指标
+        
+        Returns:
+            指标字典
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'errors': self.errors,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'busy_seconds': round(self.busy_seconds, 3),
+            }
+
+
+class ScanPipeline:
+    """多阶段并发扫描流水线"""
+    
+    def __init__(self, stages: List[PipelineStage], on_worker_exit: Optional[Callable] = None):
+        """
+        初始化流水线
+        
+        Args:
+            stages: 按顺序排列的阶段列表
+            on_worker_exit: 工作线程退出前在该线程中调用的清理函数（例如归还线程持有的连接）
+        """
+        self.stages = stages
+        self.on_worker_exit = on_worker_exit
+        self._stop_event = threading.Event()
+        self._deadline = None
+    
+    @property
+    def stopped(self) -> bool:
+        """是否已请求停止接收新输入"""
+        return self._stop_event.is_set()
+    
+    def stop(self, deadline: Optional[float] = None):
+        """
+        停止从数据源读取新输入，已进入流水线的数据继续处理完
+        
+        Args:
+            deadline: 等待已有数据处理完的截止时间戳，超过后 run() 不再等待工作线程直接返回
+        """
+        if deadline is not None:
+            self._deadline = deadline
+        self._stop_event.set()
+    
+    def run(self, source: Iterable):
+        """
+        运行流水线直到数据源耗尽（或被停止）且所有阶段处理完毕
+        
+        Args:
+            source: 数据源，在调用线程中迭代，每个元素送入第一个阶段
+        """
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            next_stage = self.stages[idx + 1] if idx + 1 < len(self.stages) else None
+            for worker_idx in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, next_stage),
+                    name=f"{stage.name}-{worker_idx}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        
+        first_stage = self.stages[0]
+        try:
+            for item in source:
+                if self.stopped:
+                    break
+                first_stage.put(item)
+        finally:
+            for _ in range(first_stage.workers):
+                first_stage.put(_STOP)
+            self._join(threads)
+    
+    def _join(self, threads: List[threading.Thread]):
+        """等待所有工作线程结束；设置了截止时间时最多等到截止时间"""
+        for thread in threads:
+            # 分段等待，使关闭过程中设置的截止时间能及时生效
+            while thread.is_alive():
+                thread.join(0.5)
+                if self._deadline is not None and time.time() >= self._deadline and thread.is_alive():
+                    # 仍未结束的工作线程是守护线程，随进程退出
+                    print(f"⚠️  等待流水线结束超时，放弃仍在处理中的数据")
+                    return
+    
+    def _worker(self, stage: PipelineStage, next_stage: Optional[PipelineStage]):
+        """阶段工作线程"""
+        try:
+            self._process(stage, next_stage)
+        finally:
+            if self.on_worker_exit is not None:
+                self.on_worker_exit()
+    
+    def _process(self, stage: PipelineStage, next_stage: Optional[PipelineStage]):
+        """阶段工作线程主循环，收到结束信号后返回"""
+        while True:
+            item = stage.queue.get()
+            
+            if item is _STOP:
+                with stage._lock:
+                    stage._active_workers -= 1
+                    is_last = stage._active_workers == 0
+                # 本阶段最后一个线程退出时，通知下一阶段结束
+                if is_last and next_stage is not None:
+                    for _ in range(next_stage.workers):
+                        next_stage.put(_STOP)
+                return
+            
+            start = time.time()
+            try:
+                for output in stage.handler(item) or ():
+                    if next_stage is not None:
+                        next_stage.put(output)
+            except Exception as e:
+                with stage._lock:
+                    stage.errors += 1
+                print(f"⚠️  流水线阶段 {stage.name} 处理失败: {e}")
+            finally:
+                with stage._lock:
+                    stage.processed += 1
+                    stage.busy_seconds += time.time() - start
+    
+    def get_metrics(self) -> Dict[str, Dict]:
+        """
+        获取所有阶段的运行指标
+        
+        Returns:
+            阶段名到指标字典的映射
+        """
+        return {stage.name: stage.get_metrics() for stage in self.stages}
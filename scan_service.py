@@ -0,0 +1,153 @@
+"""
+扫描服务模块 - 常驻进程从任务队列中取出扫描任务依次执行，
+多个任务之间复用 GitHub 客户端连接、扫描历史和已编译的检测规则
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from job_queue import JobQueue
+from scanner import CloudScanner
+from config import JOB_POLL_INTERVAL_SECONDS
+
+
+class ScanService:
+    """常驻扫描服务"""
+    
+    def __init__(self, scanner: CloudScanner, job_queue: JobQueue,
+                 poll_interval: float = JOB_POLL_INTERVAL_SECONDS):
+        """
+        初始化扫描服务
+        
+        Args:
+            scanner: 在所有任务间复用的扫描器
+            job_queue: 任务队列
+            poll_interval: 队列为空时的轮询间隔（秒）
+        """
+        self.scanner = scanner
+        self.job_queue = job_queue
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._http_server = None
+    
+    def stop(self):
+        """处理完当前任务后停止服务"""
+        self._stop_event.set()
+        if self._http_server is not None:
+            self._http_server.shutdown()
+    
+    def run(self):
+        """运行服务主循环，直到调用 stop() 或收到中断"""
+        requeued = self.job_queue.requeue_stale()
+        if requeued > 0:
+            print(f"♻️  重新排队 {requeued} 个上次未完成的任务")
+        print(f"🟢 扫描服务已启动，等待任务（队列: {self.job_queue.db_path}）")
+        
+        while not self._stop_event.is_set():
+            job = self.job_queue.claim()
+            if job is None:
+                self._stop_event.wait(self.poll_interval)
+                continue
+            self._run_job(job)
+        
+        print(f"🛑 扫描服务已停止")
+    
+    def _run_job(self, job: Dict):
+        """
+        执行一个扫描任务
+        
+        Args:
+            job: 任务信息
+        """
+        print(f"\n📋 任务 #{job['id']}: {job['kind']} {job['target']} "
+              f"(优先级 {job['priority']}, 第 {job['attempts']} 次尝试)")
+        start = time.time()
+        
+        try:
+            if job['kind'] == 'user':
+                report_path = self.scanner.scan_user(job['target'])
+            elif job['kind'] == 'org':
+                report_path = self.scanner.scan_organization(job['target'])
+            elif job['kind'] == 'repo':
+                report_path = self.scanner.scan_single_repo(job['target'])
+            else:
+                report_path = self.scanner.scan_ai_projects(max_repos=job['options'].get('max_repos', 50))
+        except Exception as e:
+            if self.job_queue.fail(job['id'], str(e)):
+                print(f"❌ 任务 #{job['id']} 失败，稍后重试: {e}")
+            else:
+                print(f"❌ 任务 #{job['id']} 失败，已达到最多尝试次数: {e}")
+            return
+        
+        # 服务关闭（SIGTERM）时扫描提前结束，任务放回队列，服务下次启动时重新执行（--resume 时从检查点继续）
+        if self.scanner.interrupted:
+            self.job_queue.release(job['id'])
+            print(f"⏸️  任务 #{job['id']} 被中断，已放回队列（部分报告: {report_path}）")
+            return
+        
+        self.job_queue.complete(job['id'], report_path)
+        print(f"✅ 任务 #{job['id']} 完成，耗时 {time.time() - start:.1f} 秒，报告: {report_path}")
+    
+    def start_http(self, port: int, host: str = "127.0.0.1"):
+        """
+        在后台线程中启动本地 HTTP 入队接口
+        
+        POST /jobs  {"kind": "user", "target": "name", "priority": 0, "max_repos": 50}
+        GET  /jobs  列出最近的任务
+        
+        Args:
+            port: 监听端口
+            host: 监听地址（默认只监听本机）
+        """
+        handler = type('JobRequestHandler', (_JobRequestHandler,), {'job_queue': self.job_queue})
+        self._http_server = ThreadingHTTPServer((host, port), handler)
+        thread = threading.Thread(target=self._http_server.serve_forever, name="job-http", daemon=True)
+        thread.start()
+        print(f"🌐 入队接口: http://{host}:{port}/jobs")
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    """任务队列 HTTP 接口"""
+    
+    job_queue: Optional[JobQueue] = None
+    
+    def do_GET(self):
+        """列出最近的任务"""
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {"error": "not found"})
+            return
+        self._send_json(200, {"jobs": self.job_queue.list_jobs()})
+    
+    def do_POST(self):
+        """添加任务"""
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            options = {"max_repos": int(body["max_repos"])} if "max_repos" in body else None
+            job_id, created = self.job_queue.enqueue(
+                body.get("kind", ""),
+                body.get("target", ""),
+                priority=int(body.get("priority", 0)),
+                options=options
+            )
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(201 if created else 200, {"id": job_id, "created": created})
+    
+    def _send_json(self, status: int, data: Dict):
+        """发送 JSON 响应"""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        """不打印每个请求的访问日志"""
+        pass
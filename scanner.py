@@ -2,18 +2,43 @@
 主扫描器模块 - 整合所有功能
 """
 import time
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
-from github_scanner import GitHubScanner
+from typing import List, Dict, Optional, Iterable, Iterator
+from github_scanner import GitHubScanner, GitHubThrottledError
 from secret_detector import SecretDetector
-from report_generator import ReportGenerator
+from report_generator import ReportGenerator, StreamingReportWriter
 from scan_history import ScanHistory
+from fingerprint_index import SecretFingerprintIndex
+from prioritizer import FilePrioritizer, RepoPrioritizer
+from scan_pipeline import ScanPipeline, PipelineStage, RepoTask, FileItem, RepoEndMarker
+from scan_checkpoint import ScanCheckpoint
+from time_budget import TimeBudgetScheduler
+from sharding import ShardSpec
+from metrics import metrics
+from config import (
+    MAX_FILES_PER_REPO, MAX_BYTES_PER_REPO, SCAN_WORKERS,
+    ADMIT_WORKERS, DETECT_WORKERS, MAX_REPO_SECONDS, SHUTDOWN_GRACE_SECONDS, HISTORY_BACKEND,
+    RESCAN_MAX_AGE_DAYS, ADAPTIVE_MAX_CONCURRENCY
+)
 
 
 class CloudScanner:
     """云上扫描器 - 主要扫描逻辑"""
     
-    def __init__(self, github_token: str, skip_scanned: bool = True, timeout_minutes: int = 50):
+    def __init__(self, github_token: str, skip_scanned: bool = True, timeout_minutes: int = 50,
+                 max_files_per_repo: int = MAX_FILES_PER_REPO,
+                 max_bytes_per_repo: int = MAX_BYTES_PER_REPO,
+                 first_hit: bool = False,
+                 hit_guided: bool = False,
+                 workers: int = SCAN_WORKERS,
+                 resume: bool = False,
+                 max_repo_seconds: int = MAX_REPO_SECONDS,
+                 shard: Optional[ShardSpec] = None,
+                 history_backend: str = HISTORY_BACKEND,
+                 rescan_max_age_days: float = RESCAN_MAX_AGE_DAYS,
+                 report_known_secrets: bool = False,
+                 report_formats: Optional[List[str]] = None):
         """
         初始化扫描器
         
@@ -21,14 +46,96 @@ class CloudScanner:
             github_token: GitHub Personal Access Token
             skip_scanned: 是否跳过已扫描的仓库 (默认: True)
             timeout_minutes: 扫描超时时间（分钟），默认50分钟
+            max_files_per_repo: 单仓库最多扫描的文件数（0 表示不限制）
+            max_bytes_per_repo: 单仓库最多扫描的字节数（0 表示不限制）
+            first_hit: 发现第一个高危问题后立即停止扫描该仓库 (默认: False)
+            hit_guided: 只检查代码搜索命中的文件，确认高危问题后才扫描整个仓库 (默认: False)
+            workers: 并发获取文件内容的线程数（同时进行的请求数自适应调整，上限见 ADAPTIVE_MAX_CONCURRENCY）
+            resume: 是否从上次中断的检查点继续扫描 (默认: False)
+            max_repo_seconds: 单个仓库的硬性时限（秒，0 表示只受整体超时限制）
+            shard: 分片扫描时本进程负责的分片（None 表示扫描全部仓库）
+            history_backend: 扫描历史存储后端 (sharded/sqlite/journal/json)
+            rescan_max_age_days: 已扫描且没有新推送的仓库超过该天数后强制重新扫描（0 表示不强制）
+            report_known_secrets: 是否报告指纹索引中已报告过的密钥 (默认: False，只报告新密钥)
+            report_formats: 输出的报告格式 (text/jsonl/sarif/summary，默认为配置的 REPORT_FORMAT)
         """
-        self.github_scanner = GitHubScanner(github_token)
+        # 获取类请求由获取阶段和准入阶段（列出文件树）的线程发起，默认以两者的线程数为并发上限
+        self.github_scanner = GitHubScanner(
+            github_token,
+            max_concurrency=ADAPTIVE_MAX_CONCURRENCY or max(1, workers) + ADMIT_WORKERS
+        )
         self.secret_detector = SecretDetector()
-        self.report_generator = ReportGenerator()
-        self.scan_history = ScanHistory()
+        self.file_prioritizer = FilePrioritizer(
+            max_files=max_files_per_repo,
+            max_bytes=max_bytes_per_repo
+        )
+        self.repo_prioritizer = RepoPrioritizer()
+        self.report_generator = ReportGenerator(formats=report_formats)
+        # 分片扫描时只写入本分片的历史片段，主历史只用于判断是否已扫描
+        self.shard = shard
+        if shard is not None:
+            self.scan_history = ScanHistory(str(shard.history_file), backend='json', membership_index=False)
+            self._base_history = ScanHistory(backend=history_backend)
+        else:
+            self.scan_history = ScanHistory(backend=history_backend)
+            self._base_history = None
+        # 跨仓库的密钥指纹索引：同一密钥只在第一次发现时报告
+        self.fingerprint_index = None if report_known_secrets else SecretFingerprintIndex()
         self.skip_scanned = skip_scanned
+        self.rescan_max_age_days = rescan_max_age_days
+        self.first_hit = first_hit
+        self.hit_guided = hit_guided
+        self.workers = max(1, workers)
+        self.resume = resume
         self.timeout_seconds = timeout_minutes * 60
         self.scan_start_time = None
+        self.time_budget = TimeBudgetScheduler(
+            self.timeout_seconds,
+            workers=self.workers,
+            max_repo_seconds=max_repo_seconds
+        )
+        self._print_lock = threading.Lock()
+        self._pipeline = None
+        self._checkpoint = None
+        self._total_repos = None
+        self._timeout_reported = False
+        self._completed_count = 0
+        self._completed_repos = []
+        self._report = None
+        # 收到关闭请求后不再开始新仓库，正在扫描的仓库尽快结束
+        self._shutdown_event = threading.Event()
+        self._active_tasks = set()
+        self._active_lock = threading.RLock()
+    
+    @property
+    def interrupted(self) -> bool:
+        """是否收到了关闭请求"""
+        return self._shutdown_event.is_set()
+    
+    def request_shutdown(self, grace_seconds: float = SHUTDOWN_GRACE_SECONDS):
+        """
+        请求尽快结束扫描（可在信号处理函数中调用）：停止接收新仓库，
+        取消正在扫描的仓库的剩余文件，最多等待 grace_seconds 秒后生成部分报告
+        
+        Args:
+            grace_seconds: 等待流水线中已有数据处理完的最长时间（秒）
+        """
+        with self._active_lock:
+            if self._shutdown_event.is_set():
+                return
+            self._shutdown_event.set()
+            active_tasks = list(self._active_tasks)
+        for task in active_tasks:
+            task.interrupted = True
+            task.cancelled.set()
+        
+        if self._pipeline is not None:
+            self._pipeline.stop(deadline=time.time() + grace_seconds)
+    
+    def _log(self, message: str):
+        """线程安全地打印进度信息"""
+        with self._print_lock:
+            print(message)
     
     def _is_timeout(self) -> bool:
         """检查是否超时"""
@@ -37,22 +144,30 @@ class CloudScanner:
         elapsed = time.time() - self.scan_start_time
         return elapsed >= self.timeout_seconds
     
-    def _check_timeout(self, current_idx: int, total_repos: int) -> bool:
+    def _check_timeout(self, current_idx: int, total_repos: Optional[int] = None) -> bool:
         """
-        检查是否超时，如果超时则打印信息并返回True
+        检查是否超时，如果超时则打印信息（仅打印一次）并返回True
         
         Args:
-            current_idx: 当前扫描的仓库索引
-            total_repos: 总仓库数
+            current_idx: 已完成扫描的仓库数
+            total_repos: 总仓库数（惰性枚举时未知，为 None）
             
         Returns:
             是否超时
         """
         if self._is_timeout():
-            elapsed_minutes = (time.time() - self.scan_start_time) / 60
-            print(f"\n⏰ 扫描超时（已运行 {elapsed_minutes:.1f} 分钟）")
-            print(f"✅ 已完成 {current_idx}/{total_repos} 个仓库的扫描")
-            print(f"💾 已保存前面的扫描数据，剩余 {total_repos - current_idx} 个仓库将在下次扫描时处理")
+            with self._print_lock:
+                if self._timeout_reported:
+                    return True
+                self._timeout_reported = True
+                elapsed_minutes = (time.time() - self.scan_start_time) / 60
+                print(f"\n⏰ 扫描超时（已运行 {elapsed_minutes:.1f} 分钟）")
+                if total_repos is None:
+                    print(f"✅ 已完成 {current_idx} 个仓库的扫描")
+                    print(f"💾 已保存前面的扫描数据，剩余仓库将在下次扫描时处理")
+                else:
+                    print(f"✅ 已完成 {current_idx}/{total_repos} 个仓库的扫描")
+                    print(f"💾 已保存前面的扫描数据，剩余 {total_repos - current_idx} 个仓库将在下次扫描时处理")
             return True
         return False
     
@@ -67,43 +182,12 @@ class CloudScanner:
             报告文件路径
         """
         print(f"🚀 开始扫描用户: {username}")
-        scan_start_time = datetime.now()
-        self.scan_start_time = time.time()  # 开始计时
         
         # 获取用户的所有仓库
-        repos = self.github_scanner.get_user_repos(username)
-        print(f"📦 找到 {len(repos)} 个公开仓库")
-        
-        # 过滤已扫描的仓库
-        repos_to_scan, skipped_count = self._filter_scanned_repos(repos)
-        if skipped_count > 0:
-            print(f"⏭️  跳过 {skipped_count} 个已扫描的仓库")
-            print(f"📦 需要扫描 {len(repos_to_scan)} 个新仓库")
-        
-        # 扫描所有仓库
-        all_findings = []
-        for idx, repo in enumerate(repos_to_scan, 1):
-            # 检查超时
-            if self._check_timeout(idx - 1, len(repos_to_scan)):
-                break
-            
-            print(f"🔍 [{idx}/{len(repos_to_scan)}] 扫描仓库: {repo['full_name']}")
-            findings = self._scan_repository(repo, scan_type=f"user:{username}")
-            all_findings.extend(findings)
-        
-        # 生成报告
-        print(f"\n📝 生成报告...")
-        report_path = self.report_generator.generate_report(
-            all_findings, 
-            scan_start_time,
-            scan_type=f"user:{username}"
-        )
-        
-        # 打印摘要
-        summary = self.report_generator.generate_summary(report_path, len(all_findings))
-        print(summary)
+        # 仓库按页惰性获取，fork、归档、空仓库和已扫描的仓库在枚举时即被过滤
+        repos = self.github_scanner.get_user_repos(username, skip_filter=self._get_skip_filter())
         
-        return report_path
+        return self._run_scan(repos, scan_type=f"user:{username}")
     
     def scan_organization(self, org_name: str) -> str:
         """
@@ -116,43 +200,12 @@ class CloudScanner:
             报告文件路径
         """
         print(f"🚀 开始扫描组织: {org_name}")
-        scan_start_time = datetime.now()
-        self.scan_start_time = time.time()  # 开始计时
         
         # 获取组织的所有仓库
-        repos = self.github_scanner.get_org_repos(org_name)
-        print(f"📦 找到 {len(repos)} 个公开仓库")
-        
-        # 过滤已扫描的仓库
-        repos_to_scan, skipped_count = self._filter_scanned_repos(repos)
-        if skipped_count > 0:
-            print(f"⏭️  跳过 {skipped_count} 个已扫描的仓库")
-            print(f"📦 需要扫描 {len(repos_to_scan)} 个新仓库")
-        
-        # 扫描所有仓库
-        all_findings = []
-        for idx, repo in enumerate(repos_to_scan, 1):
-            # 检查超时
-            if self._check_timeout(idx - 1, len(repos_to_scan)):
-                break
-            
-            print(f"🔍 [{idx}/{len(repos_to_scan)}] 扫描仓库: {repo['full_name']}")
-            findings = self._scan_repository(repo, scan_type=f"org:{org_name}")
-            all_findings.extend(findings)
-        
-        # 生成报告
-        print(f"\n📝 生成报告...")
-        report_path = self.report_generator.generate_report(
-            all_findings,
-            scan_start_time,
-            scan_type=f"org:{org_name}"
-        )
-        
-        # 打印摘要
-        summary = self.report_generator.generate_summary(report_path, len(all_findings))
-        print(summary)
+        # 仓库按页惰性获取，fork、归档、空仓库和已扫描的仓库在枚举时即被过滤
+        repos = self.github_scanner.get_org_repos(org_name, skip_filter=self._get_skip_filter())
         
-        return report_path
+        return self._run_scan(repos, scan_type=f"org:{org_name}")
     
     def scan_ai_projects(self, max_repos: int = 50) -> str:
         """
@@ -169,43 +222,27 @@ class CloudScanner:
         scan_start_time = datetime.now()
         self.scan_start_time = time.time()  # 开始计时
         
-        # 定义过滤函数：检查仓库是否已扫描
-        def is_scanned(repo_full_name: str) -> bool:
-            return self.scan_history.is_scanned(repo_full_name)
-        
-        # 搜索仓库，实时过滤已扫描的
-        # 搜索过程会自动跳过已扫描的仓库，直到找到足够数量的新仓库
-        repos_to_scan = self.github_scanner.search_ai_repos(
-            max_repos=max_repos,
-            skip_filter=is_scanned if self.skip_scanned else None
-        )
-        
-        print(f"📦 找到 {len(repos_to_scan)} 个待扫描的仓库")
-        
-        # 扫描所有仓库
-        all_findings = []
-        for idx, repo in enumerate(repos_to_scan, 1):
-            # 检查超时
-            if self._check_timeout(idx - 1, len(repos_to_scan)):
-                break
+        # 检查点中已有完整的搜索结果时，直接继续扫描，不再重新搜索
+        checkpoint = ScanCheckpoint(self._get_job_name("auto:ai-projects"))
+        if self.resume and checkpoint.load() and checkpoint.state["enumeration_complete"]:
+            print(f"♻️  检查点中还有 {checkpoint.pending_count} 个待扫描的仓库，跳过搜索")
+            repos_to_scan = []
+        else:
+            # 搜索仓库，实时过滤已扫描的
+            # 搜索过程会自动跳过已扫描的仓库，直到找到足够数量的新仓库
+            repos_to_scan = self.github_scanner.search_ai_repos(
+                max_repos=max_repos,
+                skip_filter=self._get_skip_filter()
+            )
             
-            print(f"🔍 [{idx}/{len(repos_to_scan)}] 扫描仓库: {repo['full_name']}")
-            findings = self._scan_repository(repo, scan_type="auto:ai-projects")
-            all_findings.extend(findings)
+            print(f"📦 找到 {len(repos_to_scan)} 个待扫描的仓库")
         
-        # 生成报告
-        print(f"\n📝 生成报告...")
-        report_path = self.report_generator.generate_report(
-            all_findings,
-            scan_start_time,
-            scan_type="auto:ai-projects"
+        return self._run_scan(
+            repos_to_scan,
+            scan_type="auto:ai-projects",
+            total=len(repos_to_scan) or None,
+            scan_start_time=scan_start_time
         )
-        
-        # 打印摘要
-        summary = self.report_generator.generate_summary(report_path, len(all_findings))
-        print(summary)
-        
-        return report_path
     
     def scan_single_repo(self, repo_full_name: str) -> str:
         """
@@ -218,7 +255,6 @@ class CloudScanner:
             报告文件路径
         """
         print(f"🚀 开始扫描仓库: {repo_full_name}")
-        scan_start_time = datetime.now()
         
         # 构建仓库信息
         repo_info = {
@@ -227,120 +263,665 @@ class CloudScanner:
             'clone_url': f"https://github.com/{repo_full_name}.git",
         }
         
-        # 扫描仓库
-        findings = self._scan_repository(repo_info)
+        return self._run_scan([repo_info], scan_type=f"single:{repo_full_name}", total=1)
+    
+    def _run_scan(self, repos: Iterable[Dict], scan_type: str, total: Optional[int] = None,
+                  scan_start_time: Optional[datetime] = None) -> str:
+        """
+        通过扫描流水线扫描一批仓库并生成报告，各扫描模式只是数据源不同
         
-        # 生成报告
+        Args:
+            repos: 仓库信息迭代器（可以是惰性枚举）
+            scan_type: 扫描类型
+            total: 仓库总数（未知时为 None）
+            scan_start_time: 扫描开始时间，默认为当前时间
+            
+        Returns:
+            报告文件路径
+            
+        Raises:
+            Exception: 枚举仓库失败（已完成的仓库和部分报告已保存）
+        """
+        if scan_start_time is None:
+            scan_start_time = datetime.now()
+            self.scan_start_time = time.time()  # 开始计时
+        self._total_repos = total
+        self._timeout_reported = False
+        self._completed_count = 0
+        self._completed_repos = []
+        self.time_budget.start(self.scan_start_time)
+        metrics.reset()
+        
+        # 检查点：记录待扫描/已完成的仓库，发现随扫描进度写入磁盘
+        self._checkpoint = ScanCheckpoint(self._get_job_name(scan_type))
+        resumed_findings = []
+        if self.resume and self._checkpoint.load():
+            resumed_findings = self._checkpoint.load_findings()
+            print(f"♻️  从检查点继续: 已完成 {self._checkpoint.done_count} 个仓库，"
+                  f"待扫描 {self._checkpoint.pending_count} 个，已有 {len(resumed_findings)} 个发现")
+            repos = self._checkpoint.resume_source(repos)
+            self._total_repos = None
+        else:
+            self._checkpoint.reset()
+        
+        # 报告随扫描进度写入：每完成一个仓库追加一段，检查点中已有的发现先写入
+        self._report = self.report_generator.create_writer(scan_start_time, scan_type)
+        self._report.open()
+        self._report.add_findings(resumed_findings)
+        
+        self._pipeline = self._build_pipeline()
+        if self.interrupted:
+            self._pipeline.stop(deadline=time.time())
+        # 按新鲜度和泄露可能性排序，时间预算优先留给最可能仍有有效密钥的仓库
+        repos = self.repo_prioritizer.order(self._checkpoint.track(repos))
+        # 枚举仓库失败（例如 API 错误）时先保存已完成仓库的历史、检查点和报告，最后再抛出，
+        # 由调用方决定失败或重试，而不是当作枚举完毕
+        enumeration_error = None
+        try:
+            self._pipeline.run(self._iter_tasks(repos, scan_type))
+        except Exception as e:
+            enumeration_error = e
+            print(f"\n❌ 枚举仓库失败: {e}")
+        self._print_pipeline_metrics()
+        
+        if self.time_budget.deferred_count > 0:
+            print(f"\n⏳ {self.time_budget.deferred_count} 个仓库预计无法在剩余时间内完成，已推迟到下次扫描")
+        
+        self.scan_history.flush()
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.flush()
+        
+        if self._checkpoint.is_complete:
+            self._checkpoint.finish()
+        else:
+            self._checkpoint.save()
+            print(f"\n💾 检查点已保存: 待扫描 {self._checkpoint.pending_count} 个仓库，"
+                  f"使用 --resume 继续本次扫描")
+        
+        # 分片扫描：本次运行的发现已随扫描进度写入分片片段，由 merge 命令汇总
+        if self.shard is not None:
+            print(f"\n🧩 分片 {self.shard.index}/{self.shard.count}: 历史和发现已写入 {self.shard.fragment_dir}")
+        
+        # 扫描被中断时在报告中列出已完成和待扫描的仓库
+        interrupted_info = None
+        if self.interrupted:
+            interrupted_info = {
+                "completed": list(self._completed_repos),
+                "pending": [repo['full_name'] for repo in self._checkpoint.get_pending_repos()],
+            }
+            print(f"\n⚠️  扫描被中断: 已完成 {len(interrupted_info['completed'])} 个仓库，"
+                  f"{len(interrupted_info['pending'])} 个仓库待下次扫描，生成部分报告")
+        
+        # 写入报告的汇总和统计信息
         print(f"\n📝 生成报告...")
-        report_path = self.report_generator.generate_report(
-            findings,
-            scan_start_time,
-            scan_type=f"single:{repo_full_name}"
-        )
+        report = self._report
+        report_path = report.close(interrupted=interrupted_info)
         
         # 打印摘要
-        summary = self.report_generator.generate_summary(report_path, len(findings))
+        summary = self.report_generator.generate_summary(report_path, report.total)
         print(summary)
+        # CI 按这一行找到本次扫描的结果汇总
+        if 'summary' in report.paths:
+            print(f"📊 结果汇总已保存至: {report.paths['summary']}")
+        
+        self._write_metrics(scan_type, report_path, report)
         
+        if enumeration_error is not None:
+            raise enumeration_error
         return report_path
     
-    def _filter_scanned_repos(self, repos: List[Dict]) -> tuple:
+    def _build_pipeline(self) -> ScanPipeline:
         """
-        过滤已扫描的仓库
+        构建扫描流水线: 准入 → 获取 → 检测 → 去重/过滤 → 输出
         
-        Args:
-            repos: 仓库列表
-            
         Returns:
-            (需要扫描的仓库列表, 跳过的仓库数量)
+            扫描流水线
         """
-        if not self.skip_scanned:
-            return repos, 0
-        
-        repos_to_scan = []
-        skipped_count = 0
-        
-        for repo in repos:
-            repo_name = repo.get('full_name', '')
-            if self.scan_history.is_scanned(repo_name):
-                skipped_count += 1
-            else:
-                repos_to_scan.append(repo)
-        
-        return repos_to_scan, skipped_count
+        return ScanPipeline([
+            PipelineStage('admit', self._admit_stage, workers=ADMIT_WORKERS),
+            PipelineStage('fetch', self._fetch_stage, workers=self.workers),
+            PipelineStage('detect', self._detect_stage, workers=DETECT_WORKERS),
+            PipelineStage('dedup', self._dedup_stage, workers=1),
+            PipelineStage('sink', self._sink_stage, workers=1),
+        ], on_worker_exit=self.github_scanner.release_client)
     
-    def _scan_repository(self, repo: Dict, scan_type: str = "unknown") -> List[Dict]:
+    def _iter_tasks(self, repos: Iterable[Dict], scan_type: str) -> Iterator[RepoTask]:
         """
-        扫描单个仓库
+        数据源：将仓库信息包装为扫描任务
         
         Args:
-            repo: 仓库信息字典
+            repos: 仓库信息迭代器
             scan_type: 扫描类型
             
-        Returns:
-            发现的敏感信息列表
+        Yields:
+            仓库扫描任务
+        """
+        for seq, repo in enumerate(repos, 1):
+            if self.interrupted:
+                break
+            # 超时后不再枚举新仓库
+            if self._check_timeout(self._completed_count, self._total_repos):
+                self._pipeline.stop()
+                break
+            yield RepoTask(repo, scan_type, seq)
+    
+    def _admit_stage(self, task: RepoTask):
         """
-        findings = []
-        scan_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        repo_name = repo.get('full_name', 'unknown')
+        准入阶段：获取文件树，过滤、排序并应用单仓库预算，逐个下发文件
         
-        try:
-            # 获取仓库文件列表
-            files = self.github_scanner.get_repo_files(repo['full_name'])
+        Args:
+            task: 仓库扫描任务
             
-            # 如果获取文件列表失败（例如403错误），直接返回
-            if not files:
-                # 记录到扫描历史，避免下次再扫
-                self.scan_history.mark_as_scanned(repo_name, 0, f"{scan_type}:no-access")
-                return findings
+        Yields:
+            待获取的文件，最后是仓库结束标记
+        """
+        # 关闭或超时后已排队的仓库不再扫描，留给下次处理
+        if self._check_timeout(self._completed_count, self._total_repos):
+            self._pipeline.stop()
+            return
+        with self._active_lock:
+            if self.interrupted:
+                return
+            self._active_tasks.add(task)
+        
+        progress = f"{task.seq}/{self._total_repos}" if self._total_repos is not None else f"{task.seq}"
+        self._log(f"🔍 [{progress}] 扫描仓库: {task.repo_name}")
+        task.scan_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        task.start_time = time.time()
+        
+        try:
+            self.github_scanner.wait_for_rate_limit()
+            hit_paths = {hit['path'] for hit in task.repo.get('search_hits', [])}
             
-            # 扫描每个文件
-            for file_info in files:
-                # 检查是否应该扫描该文件
-                if not self.secret_detector.should_scan_file(file_info['path']):
-                    continue
-                
-                # 获取文件内容
-                content = self.github_scanner.get_file_content(
-                    repo['full_name'],
-                    file_info['path']
-                )
-                
-                if content:
-                    # 检测敏感信息
-                    secrets = self.secret_detector.detect_secrets_in_text(
-                        content,
-                        file_info['path']
-                    )
-                    
-                    # 添加仓库信息
-                    for secret in secrets:
-                        secret['repo_url'] = repo.get('url', f"https://github.com/{repo_name}")
-                        secret['repo_name'] = repo['full_name']
-                        secret['scan_time'] = scan_time
-                        findings.append(secret)
+            # 命中引导模式：先只检查代码搜索命中的文件，确认高危问题后才扫描整个仓库
+            if self.hit_guided and hit_paths:
+                confirmed = self._probe_search_hits(task)
+                if not confirmed or self.first_hit:
+                    task.hit_only = True
+                    yield RepoEndMarker(task)
+                    return
+                self._log(f"  🎯 {task.repo_name}: 搜索命中的文件确认存在高危问题，扩展为全仓库扫描")
             
-            # 去重和过滤
-            findings = self.secret_detector.deduplicate_findings(findings)
-            findings = self.secret_detector.filter_high_confidence(findings)
+            # 获取仓库文件列表
+            listing_start = time.time()
+            files, task.tree_sha = self.github_scanner.get_repo_tree(task.repo_name)
+            self.time_budget.observe_listing(time.time() - listing_start)
             
-            if findings:
-                print(f"  ⚠️  发现 {len(findings)} 个潜在问题")
-            else:
-                print(f"  ✅ 未发现明显问题")
+            # 有新推送但默认分支内容没有变化（例如只推送了其他分支）时沿用上次的扫描结果
+            if files:
+                task.previous_scan = self._get_unchanged_scan(task)
             
-            # 记录到扫描历史
-            self.scan_history.mark_as_scanned(repo_name, len(findings), scan_type)
+            # 如果获取文件列表失败（例如403错误），直接结束
+            if not files:
+                task.status = "no-access"
+            elif task.previous_scan is None:
+                # 过滤不需要扫描的文件，按泄露可能性排序并应用单仓库预算
+                listed_count = len(files)
+                files = [f for f in files if self.secret_detector.should_scan_file(f['path'])]
+                metrics.inc('files_listed_total', listed_count)
+                metrics.inc('files_rejected_total', listed_count - len(files), reason='excluded')
+                if self.hit_guided:
+                    # 命中的文件已经检查过
+                    files = [f for f in files if f['path'] not in hit_paths]
+                # 代码搜索命中的文件最先扫描
+                files = self.file_prioritizer.prioritize(files, first_paths=hit_paths)
+                files, task.over_budget_count, oversized_count = self.file_prioritizer.apply_budget(files)
+                metrics.inc('files_rejected_total', task.over_budget_count, reason='over_budget')
+                metrics.inc('files_rejected_total', oversized_count, reason='oversized')
+                
+                # 按文件数和实测吞吐估算耗时，放不进剩余时间的仓库推迟到下次扫描
+                task.budget_cost = self.time_budget.admit(len(files))
+                if task.budget_cost is None:
+                    task.status = "deferred"
+                    files = []
+                else:
+                    task.deadline = self.time_budget.get_deadline()
+                    if task.over_budget_count > 0:
+                        self._log(f"  ✂️  {task.repo_name}: 达到单仓库预算，跳过 {task.over_budget_count} 个低优先级文件")
                 
+                for file_info in files:
+                    # 首次命中后不再下发剩余文件
+                    if task.cancelled.is_set():
+                        task.skip_file()
+                        metrics.inc('files_skipped_total', reason=self._skip_reason(task))
+                        continue
+                    task.add_file()
+                    metrics.inc('files_admitted_total')
+                    yield FileItem(task, file_info)
+        except GitHubThrottledError:
+            # 被限流不代表无权访问，推迟到下次扫描
+            task.status = "throttled"
         except Exception as e:
             error_msg = str(e)
             # 403错误静默处理
             if "403" in error_msg or "Forbidden" in error_msg:
-                print(f"  ⏭️  跳过: 无权访问")
-                self.scan_history.mark_as_scanned(repo_name, 0, f"{scan_type}:forbidden")
+                task.status = "forbidden"
             else:
-                print(f"  ❌ 扫描失败: {e}")
-                # 即使扫描失败，也记录以避免反复尝试
-                self.scan_history.mark_as_scanned(repo_name, 0, f"{scan_type}:failed")
+                task.status = "failed"
+                task.error = e
+        
+        yield RepoEndMarker(task)
+    
+    def _fetch_stage(self, item):
+        """
+        获取阶段：下载文件内容
+        
+        Args:
+            item: 待获取的文件或仓库结束标记
+            
+        Yields:
+            带内容的文件或原样传递的结束标记
+        """
+        if isinstance(item, FileItem):
+            task = item.task
+            # 达到单仓库时限后不再获取剩余文件
+            if task.deadline is not None and time.time() > task.deadline:
+                task.deadline_hit = True
+                task.cancelled.set()
+            
+            # 仓库已提前结束（首次命中或达到时限），取消剩余文件的获取
+            if task.cancelled.is_set():
+                task.skip_file()
+                metrics.inc('files_skipped_total', reason=self._skip_reason(task))
+            else:
+                try:
+                    fetch_start = time.time()
+                    # 文件树给出了 blob SHA，按 SHA 获取只需一次请求；没有 SHA 时按路径获取
+                    if item.file_info.get('sha'):
+                        item.content = self.github_scanner.get_blob_content(task.repo_name, item.file_info['sha'])
+                    else:
+                        item.content = self.github_scanner.get_file_content(task.repo_name, item.file_info['path'])
+                    self.time_budget.observe_file(time.time() - fetch_start)
+                except GitHubThrottledError:
+                    # 限流时不再获取该仓库的剩余文件，整个仓库推迟到下次扫描
+                    task.status = "throttled"
+                    task.cancelled.set()
+                except Exception as e:
+                    task.status = "failed"
+                    task.error = e
+        yield item
+    
+    def _detect_stage(self, item):
+        """
+        检测阶段：检测文件中的敏感信息，仓库所有文件处理完后下发仓库任务
         
-        return findings
+        Args:
+            item: 带内容的文件或仓库结束标记
+            
+        Yields:
+            所有文件都已检测完成的仓库任务
+        """
+        task = item.task
+        
+        if isinstance(item, RepoEndMarker):
+            done = task.listing_done()
+        else:
+            try:
+                # 关闭过程中不再检测被中断仓库的剩余文件
+                if item.content and task.interrupted:
+                    task.skip_file()
+                elif item.content:
+                    secrets = self._detect_file(task, item.file_info['path'], item.content)
+                    
+                    # 首次命中模式：确认高危问题后取消该仓库剩余文件的获取
+                    if self.first_hit and any(secret['confidence'] == 'high' for secret in secrets):
+                        task.cancelled.set()
+            except Exception as e:
+                task.status = "failed"
+                task.error = e
+            finally:
+                # 检测失败也要完成计数，否则仓库永远不会进入后续阶段
+                done = task.file_done()
+        
+        if done:
+            yield task
+    
+    def _detect_file(self, task: RepoTask, file_path: str, content: str) -> List[Dict]:
+        """
+        检测单个文件中的敏感信息并记录到仓库任务
+        
+        Args:
+            task: 仓库扫描任务
+            file_path: 文件路径
+            content: 文件内容
+            
+        Returns:
+            该文件中的发现列表
+        """
+        with metrics.timer('detect_seconds'):
+            secrets = self.secret_detector.detect_secrets_in_text(content, file_path)
+        
+        # 添加仓库信息
+        for secret in secrets:
+            secret['repo_url'] = task.repo.get('url', f"https://github.com/{task.repo_name}")
+            secret['repo_name'] = task.repo_name
+            secret['scan_time'] = task.scan_time
+        task.add_findings(secrets)
+        return secrets
+    
+    def _probe_search_hits(self, task: RepoTask) -> bool:
+        """
+        按 blob SHA 直接获取并检测代码搜索命中的文件（无需列出文件树）
+        
+        Args:
+            task: 仓库扫描任务（repo 中包含 search_hits）
+            
+        Returns:
+            命中的文件中是否确认存在高危问题
+        """
+        confirmed = False
+        for hit in task.repo['search_hits']:
+            if task.cancelled.is_set():
+                break
+            if not self.secret_detector.should_scan_file(hit['path']):
+                continue
+            fetch_start = time.time()
+            content = self.github_scanner.get_blob_content(task.repo_name, hit['sha'])
+            self.time_budget.observe_file(time.time() - fetch_start)
+            metrics.inc('files_probed_total')
+            if content:
+                secrets = self._detect_file(task, hit['path'], content)
+                confirmed = confirmed or any(secret['confidence'] == 'high' for secret in secrets)
+        return confirmed
+    
+    def _dedup_stage(self, task: RepoTask):
+        """
+        去重/过滤阶段
+        
+        Args:
+            task: 已检测完成的仓库任务
+            
+        Yields:
+            处理后的仓库任务
+        """
+        try:
+            findings = self.secret_detector.deduplicate_findings(task.findings)
+            findings = self.secret_detector.filter_high_confidence(findings)
+            if self.fingerprint_index is not None:
+                # 记录所有出现位置，已在其他仓库/文件报告过的密钥不再重复报告
+                new_findings = [finding for finding in findings if self.fingerprint_index.record(finding, task.tree_sha)]
+                task.known_count = len(findings) - len(new_findings)
+                findings = new_findings
+            task.findings = findings
+        except Exception as e:
+            # 去重失败时仓库仍送到输出阶段（保留未去重的发现），不能在流水线中丢失
+            task.status = "failed"
+            task.error = f"去重失败: {e}"
+        yield task
+    
+    def _sink_stage(self, task: RepoTask):
+        """
+        输出阶段：打印结果、记录扫描历史并收集报告数据
+        
+        Args:
+            task: 处理完成的仓库任务
+        """
+        try:
+            self._finish_task(task)
+        except Exception as e:
+            # 记录历史或写入报告失败：仓库留在检查点中等待下次扫描，
+            # 并提交它的报告序号，报告中后面的仓库不必等待它
+            self._log(f"  ❌ {task.repo_name}: 保存扫描结果失败，保留在检查点中等待下次扫描: {e}")
+            metrics.inc('repos_total', status="sink_failed")
+            if not task.reported:
+                try:
+                    self._report.add_repo_findings(task.repo.get('url', ''), [], seq=task.seq)
+                    task.reported = True
+                except Exception as report_error:
+                    self._log(f"  ❌ {task.repo_name}: 提交报告序号失败: {report_error}")
+    
+    def _finish_task(self, task: RepoTask):
+        """
+        打印仓库的扫描结果，记录扫描历史、检查点和报告
+        
+        Args:
+            task: 处理完成的仓库任务
+        """
+        repo_name = task.repo_name
+        if task.budget_cost:
+            self.time_budget.release(task.budget_cost)
+        with self._active_lock:
+            self._active_tasks.discard(task)
+        
+        # 被中断（有文件未扫描）的仓库：已有的发现写入部分报告，
+        # 但不记录历史，保留在检查点中等待下次完整扫描
+        if task.interrupted and task.skipped_count > 0:
+            self._log(f"  ⏸️  {repo_name}: 扫描被中断，保留已有的 {len(task.findings)} 个发现")
+            self._write_findings(task)
+            return
+        
+        # 推迟的仓库不记录历史，保留在检查点中等待下次扫描
+        if task.status == "deferred":
+            self._log(f"  ⏳ {repo_name}: 预计无法在剩余时间内完成，推迟到下次扫描")
+            # 不写入发现，但提交序号，报告中后面的仓库不必等待它
+            self._report.add_repo_findings(task.repo.get('url', ''), [], seq=task.seq)
+            task.reported = True
+            return
+        
+        # 被限流的仓库：已有的发现写入报告，但不记录历史（不是无权访问），等待下次扫描
+        if task.status == "throttled":
+            self._log(f"  🚦 {repo_name}: 请求被限流，推迟到下次扫描")
+            self._write_findings(task)
+            metrics.inc('repos_total', status="throttled")
+            return
+        
+        if task.status == "forbidden":
+            self._log(f"  ⏭️  跳过 {repo_name}: 无权访问")
+        elif task.status == "failed":
+            self._log(f"  ❌ {repo_name}: 扫描失败: {task.error}")
+        elif task.previous_scan is not None:
+            self._log(f"  ♻️  {repo_name}: 有新的推送但默认分支内容未变化，沿用上次的扫描结果")
+        elif task.status is None:
+            if task.hit_only:
+                self._log(f"  🔎 {repo_name}: 只检查了代码搜索命中的文件")
+            elif task.deadline_hit:
+                self._log(f"  ⏱️  {repo_name}: 达到单仓库时限，跳过剩余 {task.skipped_count} 个文件")
+            elif task.skipped_count > 0:
+                self._log(f"  🎯 {repo_name}: 已确认高危问题，跳过剩余 {task.skipped_count} 个文件")
+            if task.known_count:
+                self._log(f"  🔁 {repo_name}: {task.known_count} 个密钥已报告过，不再重复报告")
+            if task.findings:
+                self._log(f"  ⚠️  {repo_name}: 发现 {len(task.findings)} 个潜在问题")
+            elif not task.known_count:
+                self._log(f"  ✅ {repo_name}: 未发现明显问题")
+        
+        # 记录到扫描历史（失败/无权访问的仓库也记录，避免反复尝试，直到仓库有新的推送）
+        # 只有完整扫描的仓库记录根目录树 SHA，下次有新推送时据此判断内容是否变化
+        pushed_at = task.repo.get('pushed_at')
+        if task.previous_scan is not None:
+            self.scan_history.mark_as_scanned(repo_name, task.previous_scan.get("findings_count", 0),
+                                              task.scan_type, pushed_at=pushed_at, tree_sha=task.tree_sha)
+        elif task.status is None:
+            self.scan_history.mark_as_scanned(repo_name, len(task.findings) + task.known_count, task.scan_type,
+                                              partial=task.partial, pushed_at=pushed_at,
+                                              tree_sha=None if task.partial else task.tree_sha)
+        else:
+            self.scan_history.mark_as_scanned(repo_name, 0, f"{task.scan_type}:{task.status}",
+                                              pushed_at=pushed_at)
+        
+        self._checkpoint.mark_done(repo_name, task.findings)
+        self._write_findings(task)
+        self._completed_count += 1
+        self._completed_repos.append(repo_name)
+        
+        if task.status is not None:
+            status = task.status
+        elif task.previous_scan is not None:
+            status = "unchanged"
+        else:
+            status = "partial" if task.partial else "ok"
+        metrics.inc('repos_total', status=status)
+        if task.start_time is not None:
+            metrics.observe('repo_scan_seconds', time.time() - task.start_time, status=status)
+        for finding in task.findings:
+            metrics.inc('findings_total', rule=finding['pattern'], confidence=finding['confidence'])
+        if task.known_count:
+            metrics.inc('findings_known_total', task.known_count)
+    
+    def _write_findings(self, task: RepoTask):
+        """
+        把仓库的发现按仓库序号追加到报告（没有发现时也提交序号），分片扫描时同时追加到分片的发现片段
+        
+        Args:
+            task: 处理完成的仓库任务
+        """
+        repo_url = task.repo.get('url', f"https://github.com/{task.repo_name}")
+        self._report.add_repo_findings(repo_url, task.findings, seq=task.seq)
+        task.reported = True
+        if self.shard is not None and task.findings:
+            self.shard.write_findings(task.findings)
+    
+    def _skip_reason(self, task: RepoTask) -> str:
+        """仓库剩余文件被跳过的原因（用于指标标签）"""
+        if task.interrupted:
+            return "shutdown"
+        if task.status == "throttled":
+            return "throttled"
+        return "deadline" if task.deadline_hit else "first_hit"
+    
+    def _write_metrics(self, scan_type: str, report_path: str, report: StreamingReportWriter):
+        """
+        记录本次扫描的汇总指标并输出指标文件
+        
+        Args:
+            scan_type: 扫描类型
+            report_path: 报告文件路径
+            report: 已关闭的报告写入器（提供发现数统计）
+        """
+        for name, stage_metrics in self._pipeline.get_metrics().items():
+            metrics.set_gauge('pipeline_workers', stage_metrics['workers'], stage=name)
+            metrics.set_gauge('pipeline_processed', stage_metrics['processed'], stage=name)
+            metrics.set_gauge('pipeline_errors', stage_metrics['errors'], stage=name)
+            metrics.set_gauge('pipeline_queue_max_depth', stage_metrics['max_queue_depth'], stage=name)
+            metrics.set_gauge('pipeline_busy_seconds', stage_metrics['busy_seconds'], stage=name)
+        metrics.set_gauge('scan_duration_seconds', round(time.time() - self.scan_start_time, 3))
+        metrics.set_gauge('repos_pending', self._checkpoint.pending_count)
+        
+        # 扫描历史的统计是增量维护的，输出到指标中供趋势看板使用
+        history_stats = self.scan_history.get_statistics()
+        metrics.set_gauge('history_repos_total', history_stats['total_scanned'])
+        metrics.set_gauge('history_repos_with_findings', history_stats['repos_with_findings'])
+        for outcome, count in history_stats['by_outcome'].items():
+            metrics.set_gauge('history_repos', count, outcome=outcome)
+        
+        summary = {
+            "scan_type": scan_type,
+            "report_path": report_path,
+            "repos_scanned": self._completed_count,
+            "repos_pending": self._checkpoint.pending_count,
+            "repos_deferred": self.time_budget.deferred_count,
+            "total_findings": report.total,
+            "high_confidence": report.high_count,
+            "medium_confidence": report.medium_count,
+            "history": history_stats,
+        }
+        try:
+            json_path, prom_path = metrics.write(summary=summary)
+            print(f"📈 运行指标已保存至: {json_path}, {prom_path}")
+        except Exception as e:
+            print(f"⚠️  保存运行指标失败: {e}")
+    
+    def _print_pipeline_metrics(self):
+        """打印流水线各阶段的运行统计"""
+        print(f"\n📊 流水线统计:")
+        for name, stage_metrics in self._pipeline.get_metrics().items():
+            print(f"   {name:<7} 并发 {stage_metrics['workers']:>2}  处理 {stage_metrics['processed']:>6}  "
+                  f"最大队列 {stage_metrics['max_queue_depth']:>4}  耗时 {stage_metrics['busy_seconds']:.1f}s")
+        concurrency = self.github_scanner.concurrency
+        print(f"   请求并发上限 {concurrency.current_limit}/{concurrency.max_limit}，"
+              f"限流 {concurrency.throttle_count} 次")
+    
+    def _get_job_name(self, scan_type: str) -> str:
+        """检查点任务名（分片扫描时每个分片独立保存进度）"""
+        if self.shard is None:
+            return scan_type
+        return f"{scan_type}@{self.shard.label}"
+    
+    def _get_skip_filter(self):
+        """
+        获取枚举/搜索时的过滤函数
+        
+        Returns:
+            过滤函数，不需要过滤时返回 None
+        """
+        if self.shard is not None:
+            return self._should_skip_in_shard
+        return self._is_unchanged if self.skip_scanned else None
+    
+    def _should_skip_in_shard(self, repo: Dict) -> bool:
+        """
+        分片扫描时的过滤函数：跳过不属于本分片的仓库和已扫描且没有变化的仓库
+        
+        Args:
+            repo: 枚举/搜索得到的仓库信息
+            
+        Returns:
+            True 如果应跳过
+        """
+        if not self.shard.contains(repo['full_name']):
+            return True
+        return self.skip_scanned and self._is_unchanged(repo)
+    
+    def _is_unchanged(self, repo: Dict) -> bool:
+        """
+        检查仓库是否已扫描且之后没有变化（用作枚举/搜索时的过滤函数），
+        上次扫描后有新推送或超过最长重新扫描间隔的仓库重新排队
+        
+        Args:
+            repo: 枚举/搜索得到的仓库信息（pushed_at 为当前的推送时间）
+            
+        Returns:
+            True 如果应跳过
+        """
+        repo_full_name = repo['full_name']
+        reasons = [
+            history.get_rescan_reason(repo_full_name, repo.get('pushed_at'), self.rescan_max_age_days)
+            for history in (self._base_history, self.scan_history)
+            if history is not None
+        ]
+        if None in reasons:
+            return True
+        
+        reason = next((reason for reason in reasons if reason != "new"), None)
+        if reason is not None:
+            metrics.inc('repos_rescanned_total', reason=reason)
+            message = "上次扫描后有新的推送" if reason == "pushed" else f"超过 {self.rescan_max_age_days:g} 天未扫描"
+            self._log(f"  🔄 {repo_full_name}: {message}，重新扫描")
+        return False
+    
+    def _get_scan_info(self, repo_full_name: str) -> Optional[Dict]:
+        """
+        获取仓库最近一次的扫描记录（分片扫描时先查本分片的历史片段，再查主历史）
+        
+        Args:
+            repo_full_name: 仓库全名 (owner/repo)
+            
+        Returns:
+            扫描信息字典，未扫描过时返回 None
+        """
+        info = self.scan_history.get_scan_info(repo_full_name)
+        if info is None and self._base_history is not None:
+            info = self._base_history.get_scan_info(repo_full_name)
+        return info
+    
+    def _get_unchanged_scan(self, task: RepoTask) -> Optional[Dict]:
+        """
+        默认分支的根目录树 SHA 与上次完整扫描时相同时，返回上次的扫描记录
+        
+        Args:
+            task: 仓库扫描任务（tree_sha 为本次列出文件时的树 SHA）
+            
+        Returns:
+            上次的扫描信息字典，内容有变化或无法判断时返回 None
+        """
+        if task.tree_sha is None or not self.skip_scanned:
+            return None
+        info = self._get_scan_info(task.repo_name)
+        if info is None or info.get("tree_sha") != task.tree_sha:
+            return None
+        # 超过最长重新扫描间隔的仓库强制完整扫描（例如检测规则有更新）
+        if self.rescan_max_age_days > 0:
+            last_scan = datetime.strptime(info["last_scan"], '%Y-%m-%d %H:%M:%S')
+            if (datetime.now() - last_scan).total_seconds() > self.rescan_max_age_days * 86400:
+                return None
+        return info
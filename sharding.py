@@ -0,0 +1,172 @@
+"""
+分片扫描模块 - 按仓库全名的稳定哈希把仓库划分到多个分片，
+各分片独立写入扫描历史和发现片段，最后由 merge 命令合并
+"""
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config import SHARD_FRAGMENT_DIR, HISTORY_BACKEND
+from scan_checkpoint import redact_finding
+from scan_history import ScanHistory
+from report_generator import ReportGenerator
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    解析分片参数
+    
+    Args:
+        spec: 分片参数，格式为 i/N（i 从 0 开始）
+        
+    Returns:
+        (分片序号, 分片总数)
+        
+    Raises:
+        ValueError: 格式不正确或序号超出范围
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数格式应为 i/N，例如 0/4: {spec}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片序号应满足 0 <= i < N: {spec}")
+    return index, count
+
+
+def shard_of(repo_full_name: str, shard_count: int) -> int:
+    """
+    计算仓库所属的分片（与进程、机器和 Python 哈希随机化无关）
+    
+    Args:
+        repo_full_name: 仓库全名 (owner/repo)
+        shard_count: 分片总数
+        
+    Returns:
+        分片序号
+    """
+    digest = hashlib.sha1(repo_full_name.lower().encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+class ShardSpec:
+    """单个分片的扫描范围和输出片段"""
+    
+    def __init__(self, index: int, count: int, fragment_dir: str = SHARD_FRAGMENT_DIR):
+        """
+        初始化分片
+        
+        Args:
+            index: 分片序号（从 0 开始）
+            count: 分片总数
+            fragment_dir: 片段输出目录
+        """
+        self.index = index
+        self.count = count
+        self.fragment_dir = Path(fragment_dir)
+        self.label = f"shard{index}of{count}"
+        self.history_file = self.fragment_dir / f"history_{self.label}.json"
+        self.findings_file = self.fragment_dir / f"findings_{self.label}.jsonl"
+    
+    def contains(self, repo_full_name: str) -> bool:
+        """仓库是否属于本分片"""
+        return shard_of(repo_full_name, self.count) == self.index
+    
+    def write_findings(self, findings: List[Dict]):
+        """
+        把本次运行的发现追加到分片的发现片段（隐藏密钥明文）
+        
+        Args:
+            findings: 发现列表
+        """
+        self.fragment_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.findings_file, 'a', encoding='utf-8') as f:
+            for finding in findings:
+                f.write(json.dumps(redact_finding(finding), ensure_ascii=False) + '\n')
+
+
+def merge_fragments(scan_history: ScanHistory, fragment_dir: str = SHARD_FRAGMENT_DIR) -> Tuple[int, List[Dict], List[Path]]:
+    """
+    把各分片的历史片段合并到主扫描历史，并收集各分片的发现
+    
+    片段先全部读取和校验，再合并到扫描历史；片段本身不在这里删除，
+    由调用方在扫描历史落盘、汇总报告写入之后再删除，避免中途失败丢失数据
+    
+    Args:
+        scan_history: 主扫描历史
+        fragment_dir: 片段目录
+        
+    Returns:
+        (合并的仓库记录数, 所有分片的发现列表, 已合并、可以删除的片段文件)
+    """
+    fragment_dir = Path(fragment_dir)
+    if not fragment_dir.exists():
+        return 0, [], []
+    
+    fragments = []
+    for history_file in sorted(fragment_dir.glob('history_*.json')):
+        try:
+            with open(history_file, 'r', encoding='utf-8') as f:
+                fragment = json.load(f)
+            repos = fragment.get("repos", {})
+            if not isinstance(repos, dict):
+                raise ValueError("repos 字段不是对象")
+        except Exception as e:
+            print(f"⚠️  读取历史片段失败 {history_file.name}: {e}，已跳过")
+            continue
+        fragments.append((history_file, repos))
+    
+    findings = []
+    merged_files = []
+    for findings_file in sorted(fragment_dir.glob('findings_*.jsonl')):
+        with open(findings_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    findings.append(json.loads(line))
+                except ValueError as e:
+                    print(f"⚠️  发现片段 {findings_file.name} 第 {line_number} 行无法解析: {e}，已跳过")
+        merged_files.append(findings_file)
+    
+    merged_count = 0
+    for history_file, repos in fragments:
+        scan_history.merge_repos(repos)
+        merged_count += len(repos)
+        print(f"  📥 {history_file.name}: {len(repos)} 个仓库")
+        merged_files.append(history_file)
+    
+    return merged_count, findings, merged_files
+
+
+def merge_shards(fragment_dir: str = SHARD_FRAGMENT_DIR, history_backend: str = HISTORY_BACKEND,
+                 report_formats: Optional[List[str]] = None) -> str:
+    """
+    merge 命令：合并所有分片的历史和发现，生成一份汇总报告
+    
+    Args:
+        fragment_dir: 片段目录
+        history_backend: 主扫描历史的存储后端 (sharded/sqlite/journal/json)
+        report_formats: 输出的报告格式（默认为配置的 REPORT_FORMAT）
+        
+    Returns:
+        报告文件路径
+    """
+    merge_start_time = datetime.now()
+    print(f"🔗 合并分片扫描结果: {fragment_dir}")
+    
+    scan_history = ScanHistory(backend=history_backend)
+    merged_count, findings, merged_files = merge_fragments(scan_history, fragment_dir)
+    scan_history.flush()
+    print(f"✅ 已合并 {merged_count} 条仓库记录，{len(findings)} 个发现")
+    scan_history.print_statistics()
+    
+    report_generator = ReportGenerator(formats=report_formats)
+    report_path = report_generator.generate_report(findings, merge_start_time, scan_type="merge")
+    print(report_generator.generate_summary(report_path, len(findings)))
+    
+    # 扫描历史和报告都已写入，片段才可以删除；中途失败时片段保留，可以重新运行 merge
+    for fragment_file in merged_files:
+        fragment_file.unlink()
+    return report_path
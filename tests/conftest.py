@@ -0,0 +1,7 @@
+"""
+测试公共配置 - 项目模块位于仓库根目录（平铺结构），测试时加入导入路径
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,135 @@
+"""
+密钥指纹索引的测试
+"""
+import pytest
+
+from fingerprint_index import SecretFingerprintIndex
+
+SECRET = "sk-ant-" + "a1b2c3d4" * 5
+
+
+@pytest.fixture(autouse=True)
+def no_ci(monkeypatch):
+    monkeypatch.delenv("GITHUB_ACTIONS", raising=False)
+
+
+def _index(tmp_path, salt="test-salt", **kwargs):
+    return SecretFingerprintIndex(index_file=str(tmp_path / "secret_fingerprints.jsonl"), salt=salt,
+                                  salt_file=str(tmp_path / "salt"), **kwargs)
+
+
+def _finding(repo, path="config.py", secret=SECRET):
+    return {"secret": secret, "repo_name": repo, "file_path": path, "line_number": 1, "pattern": "anthropic"}
+
+
+def _entry(first_seen_at, last_seen_at, locations):
+    return {
+        "pattern": "anthropic",
+        "first_seen_repo": locations[0]["repo"],
+        "first_seen_commit": None,
+        "first_seen_at": first_seen_at,
+        "last_seen_at": last_seen_at,
+        "last_reported_at": first_seen_at,
+        "location_count": len(locations),
+        "locations": locations,
+    }
+
+
+def _location(repo, seen_at, path="config.py"):
+    return {"repo": repo, "file_path": path, "line_number": 1, "commit": None, "seen_at": seen_at}
+
+
+def test_same_secret_in_another_repo_is_reported_once(tmp_path):
+    index = _index(tmp_path)
+    
+    assert index.record(_finding("a/one"), commit="sha1") is True
+    assert index.record(_finding("b/two")) is False
+    index.flush()
+    
+    reloaded = _index(tmp_path)
+    assert reloaded.count == 1
+    entry = next(iter(reloaded._entries.values()))
+    assert entry["first_seen_repo"] == "a/one"
+    assert entry["first_seen_commit"] == "sha1"
+    assert [location["repo"] for location in entry["locations"]] == ["a/one", "b/two"]
+    assert reloaded.record(_finding("c/three")) is False
+    assert SECRET not in (tmp_path / "secret_fingerprints.jsonl").read_text(encoding='utf-8')
+
+
+def test_merge_entries_keeps_earliest_first_seen_and_unions_locations(tmp_path):
+    index = _index(tmp_path, max_locations=10)
+    other = _entry("2025-01-01 00:00:00", "2025-01-05 00:00:00", [
+        _location("a/one", "2025-01-01 00:00:00"),
+        _location("b/two", "2025-01-05 00:00:00"),
+    ])
+    entry = _entry("2025-01-03 00:00:00", "2025-01-04 00:00:00", [
+        _location("c/three", "2025-01-03 00:00:00"),
+        _location("a/one", "2025-01-04 00:00:00"),
+    ])
+    
+    merged = index._merge_entries(other, entry)
+    
+    assert merged["first_seen_repo"] == "a/one"
+    assert merged["first_seen_at"] == "2025-01-01 00:00:00"
+    assert merged["last_seen_at"] == "2025-01-05 00:00:00"
+    assert merged["location_count"] == 3
+    assert [(location["repo"], location["seen_at"]) for location in merged["locations"]] == [
+        ("c/three", "2025-01-03 00:00:00"),
+        ("a/one", "2025-01-04 00:00:00"),
+        ("b/two", "2025-01-05 00:00:00"),
+    ]
+
+
+def test_union_merged_file_with_duplicate_lines_loads_as_one_entry(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    index_a = _index(first)
+    index_a.record(_finding("a/one"))
+    index_a.flush()
+    index_b = _index(second)
+    index_b.record(_finding("b/two"))
+    index_b.record(_finding("b/two", secret="sk-" + "z" * 48))
+    index_b.flush()
+    
+    # git 的 merge=union 保留两边的所有行：盐校验行相同，同一指纹出现两行
+    lines_a = (first / "secret_fingerprints.jsonl").read_text(encoding='utf-8').splitlines()
+    lines_b = (second / "secret_fingerprints.jsonl").read_text(encoding='utf-8').splitlines()
+    union = lines_a + [line for line in lines_b if line not in lines_a]
+    (tmp_path / "secret_fingerprints.jsonl").write_text('\n'.join(union) + '\n', encoding='utf-8')
+    
+    merged = _index(tmp_path)
+    
+    assert merged.enabled
+    assert merged.count == 2
+    entry = merged._entries[merged.fingerprint(SECRET)]
+    assert sorted(location["repo"] for location in entry["locations"]) == ["a/one", "b/two"]
+
+
+def test_flush_merges_fingerprints_written_by_another_process(tmp_path):
+    first = _index(tmp_path)
+    second = _index(tmp_path)
+    first.record(_finding("a/one"))
+    second.record(_finding("b/two", secret="sk-" + "z" * 48))
+    first.flush()
+    second.flush()
+    
+    assert _index(tmp_path).count == 2
+
+
+def test_index_written_with_another_salt_is_disabled(tmp_path):
+    index = _index(tmp_path)
+    index.record(_finding("a/one"))
+    index.flush()
+    
+    other = _index(tmp_path, salt="another-salt")
+    
+    assert not other.enabled
+    assert other.record(_finding("a/one")) is True
+
+
+def test_missing_salt_in_ci_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITHUB_ACTIONS", "true")
+    
+    with pytest.raises(ValueError):
+        _index(tmp_path, salt="")
@@ -0,0 +1,80 @@
+"""
+扫描历史存储后端的测试
+"""
+import json
+
+from history_backends import JournalHistoryBackend
+
+
+def _info(last_scan="2025-01-01 00:00:00"):
+    return {"first_scan": last_scan, "last_scan": last_scan, "findings_count": 0,
+            "scan_type": "auto", "scan_count": 1}
+
+
+def test_journal_replays_records_on_top_of_the_snapshot(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    backend = JournalHistoryBackend(history_file, flush_every=1)
+    backend.put("owner/one", _info())
+    backend.put("owner/two", _info())
+    backend.delete("owner/one")
+    
+    assert not history_file.exists()
+    reopened = JournalHistoryBackend(history_file)
+    assert reopened.get("owner/one") is None
+    assert reopened.get("owner/two") == _info()
+
+
+def test_journal_ignores_a_torn_last_line(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    backend = JournalHistoryBackend(history_file, flush_every=1)
+    backend.put("owner/one", _info())
+    journal_file = history_file.with_suffix('.journal')
+    with open(journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"put": "owner/two", "inf')
+    
+    reopened = JournalHistoryBackend(history_file)
+    
+    assert reopened.get("owner/one") == _info()
+    assert reopened.get("owner/two") is None
+    assert journal_file.read_bytes().endswith(b'\n')
+
+
+def test_compaction_writes_a_snapshot_and_clears_the_journal(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    backend = JournalHistoryBackend(history_file, flush_every=1, compact_bytes=10 ** 9)
+    for i in range(5):
+        backend.put(f"owner/repo{i}", _info())
+    journal_file = history_file.with_suffix('.journal')
+    assert journal_file.exists()
+    
+    backend.flush()
+    
+    assert not journal_file.exists()
+    snapshot = json.loads(history_file.read_text(encoding='utf-8'))
+    assert sorted(snapshot["repos"]) == [f"owner/repo{i}" for i in range(5)]
+    assert snapshot["total_scanned"] == 5
+    assert JournalHistoryBackend(history_file).get("owner/repo3") == _info()
+
+
+def test_journal_is_compacted_once_it_exceeds_the_size_limit(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    backend = JournalHistoryBackend(history_file, flush_every=1, compact_bytes=200)
+    for i in range(5):
+        backend.put(f"owner/repo{i}", _info())
+    
+    assert history_file.exists()
+    journal_file = history_file.with_suffix('.journal')
+    assert not journal_file.exists() or journal_file.stat().st_size < 200
+    assert sorted(JournalHistoryBackend(history_file).items()) == \
+        sorted((f"owner/repo{i}", _info()) for i in range(5))
+
+
+def test_journal_reloads_changes_from_another_process(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    backend = JournalHistoryBackend(history_file, flush_every=1)
+    other = JournalHistoryBackend(history_file, flush_every=1)
+    other.put("owner/other", _info())
+    
+    assert backend.reload_if_changed()
+    assert backend.get("owner/other") == _info()
+    assert not backend.reload_if_changed()
@@ -0,0 +1,102 @@
+"""
+扫描任务队列和扫描服务的测试
+"""
+import time
+
+import pytest
+
+import job_queue as job_queue_module
+from job_queue import JobQueue
+from scan_service import ScanService
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(db_path=str(tmp_path / "jobs.db"), max_attempts=2)
+    yield job_queue
+    job_queue.close()
+
+
+def _status(queue, job_id):
+    return next(job for job in queue.list_jobs() if job['id'] == job_id)
+
+
+def test_enqueue_deduplicates_active_target_and_keeps_higher_priority(queue):
+    job_id, created = queue.enqueue('user', 'alice', priority=1)
+    same_id, created_again = queue.enqueue('user', 'alice', priority=5)
+    other_id, _ = queue.enqueue('org', 'alice')
+    
+    assert created and not created_again
+    assert same_id == job_id
+    assert other_id != job_id
+    assert _status(queue, job_id)['priority'] == 5
+
+
+def test_finished_target_can_be_enqueued_again(queue):
+    job_id, _ = queue.enqueue('repo', 'a/b')
+    queue.claim()
+    queue.complete(job_id, 'report.txt')
+    
+    new_id, created = queue.enqueue('repo', 'a/b')
+    
+    assert created and new_id != job_id
+
+
+def test_fail_retries_with_backoff_until_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(job_queue_module, 'JOB_RETRY_BACKOFF_SECONDS', 0)
+    job_id, _ = queue.enqueue('user', 'alice')
+    
+    assert queue.claim()['attempts'] == 1
+    assert queue.fail(job_id, 'boom') is True
+    assert _status(queue, job_id)['status'] == 'queued'
+    
+    assert queue.claim()['attempts'] == 2
+    assert queue.fail(job_id, 'boom again') is False
+    job = _status(queue, job_id)
+    assert job['status'] == 'failed'
+    assert job['last_error'] == 'boom again'
+    assert queue.claim() is None
+
+
+def test_retry_waits_for_backoff(queue, monkeypatch):
+    monkeypatch.setattr(job_queue_module, 'JOB_RETRY_BACKOFF_SECONDS', 3600)
+    job_id, _ = queue.enqueue('user', 'alice')
+    queue.claim()
+    queue.fail(job_id, 'boom')
+    
+    assert queue.claim() is None
+    assert _status(queue, job_id)['not_before'] > time.time()
+
+
+class _FakeScanner:
+    def __init__(self, error=None, interrupted=False):
+        self.error = error
+        self.interrupted = interrupted
+    
+    def scan_user(self, username):
+        if self.error is not None:
+            raise self.error
+        return 'report.txt'
+
+
+def test_service_fails_job_when_enumeration_raises(queue, monkeypatch):
+    monkeypatch.setattr(job_queue_module, 'JOB_RETRY_BACKOFF_SECONDS', 0)
+    job_id, _ = queue.enqueue('user', 'alice')
+    service = ScanService(_FakeScanner(error=RuntimeError('403 rate limited')), queue)
+    
+    service._run_job(queue.claim())
+    
+    job = _status(queue, job_id)
+    assert job['status'] == 'queued'
+    assert job['last_error'] == '403 rate limited'
+
+
+def test_service_requeues_interrupted_job_without_using_an_attempt(queue):
+    job_id, _ = queue.enqueue('user', 'alice')
+    service = ScanService(_FakeScanner(interrupted=True), queue)
+    
+    service._run_job(queue.claim())
+    
+    job = _status(queue, job_id)
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 0
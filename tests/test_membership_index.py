@@ -0,0 +1,95 @@
+"""
+已扫描仓库成员索引的测试
+"""
+from membership_index import MembershipIndex, file_stamp
+from scan_history import ScanHistory
+
+
+STAMP = (1, 2, 3, 4)
+
+
+def _build(count):
+    return MembershipIndex.build(((f"owner/repo{i}", 1000 + i, 2000 + i) for i in range(count)), STAMP)
+
+
+def test_lookup_returns_stamps_for_indexed_repos():
+    index = _build(500)
+    
+    assert index.count == 500
+    for i in (0, 123, 499):
+        assert index.contains(f"owner/repo{i}")
+        assert index.lookup(f"owner/repo{i}") == (1000 + i, 2000 + i)
+
+
+def test_unindexed_repos_are_not_found_despite_bloom_false_positives():
+    index = _build(500)
+    
+    # 布隆过滤器约 1% 误判，误判必须由排序哈希数组排除
+    assert not any(index.contains(f"other/repo{i}") for i in range(5000))
+
+
+def test_saved_index_is_loaded_through_mmap(tmp_path):
+    index_file = tmp_path / "scanned_repos.idx"
+    _build(100).save(index_file)
+    
+    loaded = MembershipIndex.load(index_file)
+    try:
+        assert loaded.stamp == STAMP
+        assert loaded.lookup("owner/repo42") == (1042, 2042)
+        assert loaded.lookup("owner/missing") is None
+        loaded.add("owner/new", 5, 6)
+        assert loaded.lookup("owner/new") == (5, 6)
+        assert loaded.count == 101
+    finally:
+        loaded.close()
+
+
+def test_empty_index_contains_nothing(tmp_path):
+    index_file = tmp_path / "scanned_repos.idx"
+    MembershipIndex.build([], STAMP).save(index_file)
+    
+    loaded = MembershipIndex.load(index_file)
+    try:
+        assert not loaded.contains("owner/repo")
+    finally:
+        loaded.close()
+
+
+def test_corrupt_index_is_ignored(tmp_path):
+    index_file = tmp_path / "scanned_repos.idx"
+    index_file.write_bytes(b"not an index")
+    
+    assert MembershipIndex.load(index_file) is None
+
+
+def test_file_stamp_of_missing_files_is_zero(tmp_path):
+    assert file_stamp(tmp_path / "missing") == (0, 0, 0, 0)
+
+
+def test_history_uses_index_after_flush_and_ignores_stale_index(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    history = ScanHistory(str(history_file), backend="json")
+    history.mark_as_scanned("owner/repo")
+    history.flush()
+    
+    reopened = ScanHistory(str(history_file), backend="json")
+    assert reopened._index is not None
+    assert reopened.is_scanned("owner/repo")
+    
+    # 其他进程改写历史文件后，状态戳不一致的索引不再使用
+    other = ScanHistory(str(history_file), backend="json", membership_index=False)
+    other.mark_as_scanned("owner/other")
+    other.flush()
+    stale = ScanHistory(str(history_file), backend="json")
+    assert stale._index is None
+    assert stale.is_scanned("owner/other")
+
+
+def test_sharded_history_does_not_build_an_index(tmp_path):
+    history_file = tmp_path / "scanned_repos.json"
+    history = ScanHistory(str(history_file), backend="sharded")
+    history.mark_as_scanned("owner/repo")
+    history.flush()
+    
+    assert not history_file.with_suffix('.idx').exists()
+    assert ScanHistory(str(history_file), backend="sharded").is_scanned("owner/repo")
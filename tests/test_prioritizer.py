@@ -0,0 +1,82 @@
+"""
+文件优先级与单仓库预算的测试
+"""
+from prioritizer import FilePrioritizer, RepoPrioritizer
+
+
+def _files(*sizes):
+    return [{'path': f'src/file{i}.py', 'size': size} for i, size in enumerate(sizes)]
+
+
+def test_oversized_files_are_not_counted_as_over_budget():
+    prioritizer = FilePrioritizer(max_files=0, max_bytes=0, max_file_size=100)
+    
+    selected, over_budget, oversized = prioritizer.apply_budget(_files(10, 500, 20))
+    
+    assert [f['size'] for f in selected] == [10, 20]
+    assert over_budget == 0
+    assert oversized == 1
+
+
+def test_file_budget_stops_after_limit():
+    prioritizer = FilePrioritizer(max_files=2, max_bytes=0, max_file_size=100)
+    
+    selected, over_budget, oversized = prioritizer.apply_budget(_files(10, 500, 20, 30))
+    
+    assert [f['size'] for f in selected] == [10, 20]
+    assert over_budget == 1
+    assert oversized == 1
+
+
+def test_byte_budget_stops_before_exceeding_limit():
+    prioritizer = FilePrioritizer(max_files=0, max_bytes=50, max_file_size=0)
+    
+    selected, over_budget, oversized = prioritizer.apply_budget(_files(20, 20, 20))
+    
+    assert len(selected) == 2
+    assert over_budget == 1
+    assert oversized == 0
+
+
+def test_high_priority_files_come_first():
+    prioritizer = FilePrioritizer()
+    files = [
+        {'path': 'tests/fixtures/.env', 'size': 1},
+        {'path': 'README', 'size': 1},
+        {'path': 'app/main.py', 'size': 1},
+        {'path': '.env', 'size': 1},
+    ]
+    
+    ordered = [f['path'] for f in prioritizer.prioritize(files)]
+    
+    assert ordered == ['.env', 'app/main.py', 'README', 'tests/fixtures/.env']
+
+
+def _lazy_repos(count, consumed):
+    for i in range(count):
+        consumed.append(i)
+        yield {'full_name': f'owner/repo{i}', 'size': i}
+
+
+def test_repo_order_starts_before_the_full_window_is_enumerated():
+    consumed = []
+    ordered = RepoPrioritizer(window=200, initial_window=5).order(_lazy_repos(1000, consumed))
+    
+    first = next(ordered)
+    
+    assert len(consumed) == 5
+    # 体积最小的仓库得分最高
+    assert first['full_name'] == 'owner/repo0'
+
+
+def test_repo_order_window_grows_to_the_limit_and_yields_every_repo():
+    consumed = []
+    prioritizer = RepoPrioritizer(window=20, initial_window=5)
+    ordered = prioritizer.order(_lazy_repos(100, consumed))
+    
+    yielded = [next(ordered) for _ in range(50)]
+    
+    # 窗口增大到 20 之后，每枚举一个仓库输出一个
+    assert len(consumed) == 50 + 19
+    assert sorted(repo['full_name'] for repo in yielded + list(ordered)) == \
+        sorted(f'owner/repo{i}' for i in range(100))
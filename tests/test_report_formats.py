@@ -0,0 +1,111 @@
+"""
+流式报告和机器可读报告格式（JSONL/SARIF/summary）的测试
+"""
+import json
+from datetime import datetime
+
+from report_generator import ReportGenerator
+
+PATTERN = r'sk-ant-[a-zA-Z0-9_-]{32,}'
+
+
+def _finding(repo, confidence='high', line=3):
+    secret = "sk-ant-" + repo.replace('/', '') * 8
+    return {
+        "secret": secret,
+        "pattern": PATTERN,
+        "confidence": confidence,
+        "repo_name": repo,
+        "repo_url": f"https://github.com/{repo}",
+        "file_path": "src/app config.py",
+        "line_number": line,
+        "line_content": f'API_KEY = "{secret}"',
+        "scan_time": "2025-01-01 00:00:00",
+    }
+
+
+def _writer(tmp_path, formats=('text', 'jsonl', 'sarif', 'summary'), order_window=50):
+    generator = ReportGenerator(output_dir=str(tmp_path), formats=list(formats))
+    writer = generator.create_writer(datetime(2025, 1, 1, 2, 0, 0), scan_type="auto:ai-projects")
+    writer.order_window = order_window
+    writer.open()
+    return writer
+
+
+def _url(repo):
+    return f"https://github.com/{repo}"
+
+
+def test_sarif_results_are_streamed_and_completed_on_close(tmp_path):
+    writer = _writer(tmp_path)
+    writer.add_repo_findings(_url("a/one"), [_finding("a/one"), _finding("a/one", 'medium', 7)], seq=1)
+    
+    # 扫描过程中结果已写入文件，结束时才补上规则和运行信息
+    partial = open(writer.paths['sarif'], encoding='utf-8').read()
+    assert partial.count('"ruleId"') == 2
+    
+    writer.add_repo_findings(_url("b/two"), [], seq=2)
+    writer.add_repo_findings(_url("c/three"), [_finding("c/three")], seq=3)
+    writer.close()
+    
+    sarif = json.load(open(writer.paths['sarif'], encoding='utf-8'))
+    run = sarif["runs"][0]
+    assert sarif["version"] == "2.1.0"
+    assert [result["level"] for result in run["results"]] == ["error", "warning", "error"]
+    assert run["results"][0]["locations"][0]["physicalLocation"]["artifactLocation"]["uri"] == \
+        "https://github.com/a/one/blob/HEAD/src/app%20config.py"
+    assert len(run["tool"]["driver"]["rules"]) == 1
+    assert run["invocations"][0]["executionSuccessful"] is True
+    # 报告中不出现密钥明文
+    assert _finding("a/one")["secret"] not in open(writer.paths['sarif'], encoding='utf-8').read()
+
+
+def test_sarif_without_findings_is_valid_and_marks_interrupted_runs(tmp_path):
+    writer = _writer(tmp_path)
+    writer.close(interrupted={"completed": [], "pending": ["a/one"]})
+    
+    run = json.load(open(writer.paths['sarif'], encoding='utf-8'))["runs"][0]
+    assert run["results"] == []
+    assert run["invocations"][0]["executionSuccessful"] is False
+
+
+def test_repos_are_written_in_seq_order_regardless_of_completion_order(tmp_path):
+    writer = _writer(tmp_path)
+    writer.add_repo_findings(_url("c/three"), [_finding("c/three")], seq=3)
+    writer.add_repo_findings(_url("b/two"), [_finding("b/two")], seq=2)
+    
+    assert open(writer.paths['jsonl'], encoding='utf-8').read() == ""
+    
+    writer.add_repo_findings(_url("a/one"), [_finding("a/one")], seq=1)
+    writer.close()
+    
+    lines = [json.loads(line) for line in open(writer.paths['jsonl'], encoding='utf-8')]
+    assert [line["repo_name"] for line in lines] == ["a/one", "b/two", "c/three"]
+
+
+def test_late_seq_after_the_window_skipped_it_is_still_written(tmp_path):
+    writer = _writer(tmp_path, order_window=1)
+    writer.add_repo_findings(_url("b/two"), [_finding("b/two")], seq=2)
+    writer.add_repo_findings(_url("c/three"), [_finding("c/three")], seq=3)
+    writer.add_repo_findings(_url("a/one"), [_finding("a/one")], seq=1)
+    writer.close()
+    
+    lines = [json.loads(line) for line in open(writer.paths['jsonl'], encoding='utf-8')]
+    assert sorted(line["repo_name"] for line in lines) == ["a/one", "b/two", "c/three"]
+
+
+def test_summary_counts_distinct_repos(tmp_path):
+    writer = _writer(tmp_path)
+    # 命中引导模式下同一仓库分两次写入
+    writer.add_repo_findings(_url("a/one"), [_finding("a/one")])
+    writer.add_repo_findings(_url("a/one"), [_finding("a/one", 'medium', 9)])
+    writer.add_repo_findings(_url("b/two"), [_finding("b/two", 'low')])
+    writer.close()
+    
+    summary = json.load(open(writer.paths['summary'], encoding='utf-8'))
+    assert summary["total_findings"] == 3
+    assert summary["high_confidence"] == 1
+    assert summary["medium_confidence"] == 1
+    assert summary["repos_with_findings"] == 2
+    assert summary["by_repo"][0] == {"repo": "a/one", "repo_url": _url("a/one"), "findings": 2, "high": 1, "medium": 1}
+    assert summary["reports"]["sarif"] == writer.paths['sarif']
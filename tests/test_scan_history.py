@@ -0,0 +1,81 @@
+"""
+扫描历史的测试
+"""
+import pytest
+
+from scan_history import ScanHistory
+
+
+@pytest.fixture(params=["sharded", "json"])
+def history(request, tmp_path):
+    return ScanHistory(str(tmp_path / "scanned_repos.json"), backend=request.param)
+
+
+def test_rescan_reason_follows_pushed_at(history):
+    assert history.get_rescan_reason("owner/repo", "2025-01-01T00:00:00Z") == "new"
+    
+    history.mark_as_scanned("owner/repo", pushed_at="2025-01-01T00:00:00Z")
+    
+    assert history.get_rescan_reason("owner/repo", "2025-01-01T00:00:00Z") is None
+    assert history.get_rescan_reason("owner/repo", "2025-02-01T00:00:00Z") == "pushed"
+    # 不知道当前推送时间（例如单仓库扫描）时不重新扫描
+    assert history.get_rescan_reason("owner/repo", None) is None
+
+
+def test_legacy_record_without_pushed_at_is_rescanned_once(history):
+    history.merge_repos({"owner/legacy": {
+        "first_scan": "2024-01-01 00:00:00", "last_scan": "2024-01-01 00:00:00",
+        "findings_count": 0, "scan_type": "auto", "scan_count": 1,
+    }})
+    
+    assert history.get_rescan_reason("owner/legacy", "2025-01-01T00:00:00Z") == "pushed"
+    assert history.get_rescan_reason("owner/legacy", None) is None
+    
+    history.mark_as_scanned("owner/legacy", pushed_at="2025-01-01T00:00:00Z")
+    
+    assert history.get_rescan_reason("owner/legacy", "2025-01-01T00:00:00Z") is None
+
+
+@pytest.mark.parametrize("backend", ["sharded", "sqlite", "journal", "json"])
+def test_writers_sharing_a_history_merge_instead_of_overwriting(tmp_path, backend):
+    history_file = str(tmp_path / "scanned_repos.json")
+    first = ScanHistory(history_file, backend=backend)
+    second = ScanHistory(history_file, backend=backend)
+    
+    first.mark_as_scanned("owner/first", findings_count=1)
+    second.mark_as_scanned("owner/second")
+    first.mark_as_scanned("owner/third")
+    first.flush()
+    second.flush()
+    
+    reopened = ScanHistory(history_file, backend=backend)
+    assert all(reopened.is_scanned(name) for name in ("owner/first", "owner/second", "owner/third"))
+    stats = reopened.get_statistics()
+    assert stats["total_scanned"] == 3
+    assert stats["repos_with_findings"] == 1
+
+
+def _mark_repos(history_file, backend, worker, count):
+    history = ScanHistory(history_file, backend=backend)
+    for i in range(count):
+        history.mark_as_scanned(f"worker{worker}/repo{i}")
+    history.flush()
+
+
+@pytest.mark.parametrize("backend", ["sharded", "journal"])
+def test_concurrent_processes_keep_every_record(tmp_path, backend):
+    multiprocessing = pytest.importorskip("multiprocessing")
+    pytest.importorskip("fcntl")
+    history_file = str(tmp_path / "scanned_repos.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_mark_repos, args=(history_file, backend, worker, 20))
+                 for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    
+    assert all(process.exitcode == 0 for process in processes)
+    history = ScanHistory(history_file, backend=backend)
+    assert history.get_statistics()["total_scanned"] == 80
+    assert all(history.is_scanned(f"worker{worker}/repo{i}") for worker in range(4) for i in range(20))
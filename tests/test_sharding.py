@@ -0,0 +1,66 @@
+"""
+分片片段合并的测试
+"""
+import json
+
+import pytest
+
+import sharding
+from scan_history import ScanHistory
+from sharding import merge_fragments, merge_shards
+
+
+def _write_history_fragment(fragment_dir, label, repos):
+    (fragment_dir / f"history_{label}.json").write_text(
+        json.dumps({"repos": repos}), encoding='utf-8')
+
+
+def _repo_info(last_scan):
+    return {"first_scan": last_scan, "last_scan": last_scan, "findings_count": 1,
+            "scan_type": "auto", "scan_count": 1}
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ScanHistory(history_file=str(tmp_path / "history" / "scanned_repos.json"), backend="json")
+
+
+def test_merge_skips_bad_findings_lines_and_keeps_fragments(tmp_path, history, capsys):
+    fragment_dir = tmp_path / "fragments"
+    fragment_dir.mkdir()
+    _write_history_fragment(fragment_dir, "shard0of2", {"a/one": _repo_info("2025-01-01 00:00:00")})
+    (fragment_dir / "history_shard1of2.json").write_text("{not json", encoding='utf-8')
+    (fragment_dir / "findings_shard0of2.jsonl").write_text(
+        '{"repo_url": "https://github.com/a/one"}\n{truncated\n\n', encoding='utf-8')
+    
+    merged_count, findings, merged_files = merge_fragments(history, str(fragment_dir))
+    
+    assert merged_count == 1
+    assert findings == [{"repo_url": "https://github.com/a/one"}]
+    assert history.is_scanned("a/one")
+    assert "第 2 行无法解析" in capsys.readouterr().out
+    # 合并本身不删除片段；无法读取的历史片段不在可删除列表中
+    assert all(path.exists() for path in merged_files)
+    assert sorted(path.name for path in merged_files) == ["findings_shard0of2.jsonl", "history_shard0of2.json"]
+
+
+def test_merge_shards_keeps_fragments_when_report_fails(tmp_path, monkeypatch):
+    fragment_dir = tmp_path / "fragments"
+    fragment_dir.mkdir()
+    _write_history_fragment(fragment_dir, "shard0of1", {"a/one": _repo_info("2025-01-01 00:00:00")})
+    monkeypatch.setattr(sharding, "ScanHistory", lambda backend: ScanHistory(
+        history_file=str(tmp_path / "history" / "scanned_repos.json"), backend="json"))
+    
+    class FailingReportGenerator:
+        def __init__(self, formats=None):
+            pass
+        
+        def generate_report(self, *args, **kwargs):
+            raise OSError("disk full")
+    
+    monkeypatch.setattr(sharding, "ReportGenerator", FailingReportGenerator)
+    
+    with pytest.raises(OSError):
+        merge_shards(fragment_dir=str(fragment_dir), history_backend="json")
+    
+    assert (fragment_dir / "history_shard0of1.json").exists()
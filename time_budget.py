@@ -0,0 +1,137 @@
+"""
+时间预算调度模块 - 根据仓库元数据和实测吞吐估算扫描耗时，
+把仓库装入剩余的时间窗口，放不下的推迟到下次扫描
+"""
+import threading
+import time
+from typing import Optional
+from config import MAX_REPO_SECONDS, TIME_BUDGET_RESERVE_SECONDS
+
+
+class TimeBudgetScheduler:
+    """时间预算调度器"""
+    
+    # 没有实测数据时的初始估计值
+    DEFAULT_SECONDS_PER_FILE = 0.5
+    DEFAULT_LISTING_SECONDS = 2.0
+    
+    # 指数加权移动平均的平滑系数
+    EWMA_ALPHA = 0.2
+    
+    def __init__(self, timeout_seconds: float, workers: int = 1,
+                 max_repo_seconds: float = MAX_REPO_SECONDS,
+                 reserve_seconds: float = TIME_BUDGET_RESERVE_SECONDS):
+        """
+        初始化时间预算调度器
+        
+        Args:
+            timeout_seconds: 整个扫描的时间预算（秒）
+            workers: 并发获取文件的线程数
+            max_repo_seconds: 单个仓库的硬性时限（秒，0 表示只受整体预算限制）
+            reserve_seconds: 为生成报告等收尾工作预留的时间（秒）
+        """
+        self.timeout_seconds = timeout_seconds
+        self.workers = max(1, workers)
+        self.max_repo_seconds = max_repo_seconds
+        self.reserve_seconds = reserve_seconds
+        self.start_time = None
+        self.seconds_per_file = self.DEFAULT_SECONDS_PER_FILE
+        self.listing_seconds = self.DEFAULT_LISTING_SECONDS
+        self.deferred_count = 0
+        self._reserved = 0.0
+        self._lock = threading.Lock()
+    
+    def start(self, start_time: Optional[float] = None):
+        """
+        开始计时
+        
+        Args:
+            start_time: 开始时间戳，默认为当前时间
+        """
+        self.start_time = start_time if start_time is not None else time.time()
+        self.deferred_count = 0
+        self._reserved = 0.0
+    
+    def remaining_seconds(self) -> float:
+        """剩余可用于扫描的时间（秒，已扣除收尾预留）"""
+        if self.start_time is None:
+            return float('inf')
+        elapsed = time.time() - self.start_time
+        return self.timeout_seconds - self.reserve_seconds - elapsed
+    
+    def estimate_cost(self, file_count: int) -> float:
+        """
+        估算扫描一个仓库需要的工作量（线程·秒）
+        
+        Args:
+            file_count: 需要获取的文件数（来自文件树）
+            
+        Returns:
+            估算的工作量
+        """
+        return self.listing_seconds + file_count * self.seconds_per_file
+    
+    def admit(self, file_count: int) -> Optional[float]:
+        """
+        判断仓库能否放入剩余的时间预算，能放入则预留相应的工作量
+        
+        Args:
+            file_count: 需要获取的文件数
+            
+        Returns:
+            预留的工作量，None 表示放不下、应推迟到下次扫描
+        """
+        cost = self.estimate_cost(file_count)
+        # 文件在多个线程间并行获取，单个仓库的墙钟耗时约为 工作量 / 并发数
+        wall_seconds = self.listing_seconds + file_count * self.seconds_per_file / min(self.workers, max(1, file_count))
+        
+        with self._lock:
+            remaining = self.remaining_seconds()
+            capacity = remaining * self.workers - self._reserved
+            if cost > capacity or wall_seconds > remaining:
+                self.deferred_count += 1
+                return None
+            self._reserved += cost
+        return cost
+    
+    def release(self, cost: float):
+        """
+        仓库扫描结束，释放预留的工作量
+        
+        Args:
+            cost: admit 返回的工作量
+        """
+        with self._lock:
+            self._reserved = max(0.0, self._reserved - cost)
+    
+    def get_deadline(self) -> float:
+        """
+        计算一个刚开始扫描的仓库的硬性截止时间
+        
+        Returns:
+            截止时间戳
+        """
+        remaining = max(0.0, self.remaining_seconds())
+        if self.max_repo_seconds:
+            remaining = min(remaining, self.max_repo_seconds)
+        return time.time() + remaining
+    
+    def observe_listing(self, seconds: float):
+        """
+        记录一次文件树获取的耗时
+        
+        Args:
+            seconds: 耗时（秒）
+        """
+        with self._lock:
+            self.listing_seconds += self.EWMA_ALPHA * (seconds - self.listing_seconds)
+    
+    def observe_file(self, seconds: float):
+        """
+        记录一次文件获取的耗时
+        
+        Args:
+            seconds: 耗时（秒）
+        """
+        with self._lock:
+            self.seconds_per_file += self.EWMA_ALPHA * (seconds - self.seconds_per_file)